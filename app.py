@@ -7,7 +7,7 @@
 
 # app.py 파일 맨 위에 추가
 import json
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, send_file, session
+from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, send_file, session, g, stream_with_context
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 import os
@@ -17,7 +17,8 @@ from config import Config    # ← 이거 추가
 from collections import defaultdict
 import pandas as pd
 import io
-from sqlalchemy import func
+from sqlalchemy import func, case, update
+from sqlalchemy.orm import joinedload, aliased
 from functools import wraps
 
 app = Flask(__name__)
@@ -28,7 +29,82 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret-key-for-development')
 db.init_app(app)
 
-from models import User, Student, Class, TimeSlot, Vehicle, DispatchResult, Branch
+from utils import applog
+applog.init_app(app)
+log = applog.get_logger('app')
+
+from models import User, Student, Class, TimeSlot, Vehicle, DispatchResult, Branch, BranchCounter, ImportJob, StudentLocation, BranchLocation
+from utils import branch_counters, dispatch_events, dispatch_runs, exports, geofence, gps_ingest, gsheet_route, import_jobs, live_positions, notifications, password_hashing, roster_validation, route_payloads, sheet_sync, stop_events, template_cache
+password_hashing.init_app(app)
+template_cache.init_app(app)
+gps_ingest.init_app(app)
+live_positions.init_app(app)
+route_payloads.init_app(app)
+stop_events.init_app(app)
+geofence.init_app(app)
+
+# ----------------------------------------------------
+# 🔹 요청 단위 현재 사용자 컨텍스트
+# ----------------------------------------------------
+class BranchScope:
+    """현재 사용자가 접근 가능한 지점 범위 (마스터는 branch_id=None → 전체)"""
+
+    def __init__(self, user):
+        self.role = user.role if user else None
+        self.branch_id = None
+        self._vehicle_ids = None
+
+        if user is None:
+            self._vehicle_ids = set()
+        elif user.role == 'admin':
+            self.branch_id = user.branch_id
+        elif user.role == 'driver':
+            # 기사는 자신의 차량만
+            if user.vehicle:
+                self.branch_id = user.vehicle.branch_id
+                self._vehicle_ids = {user.vehicle.id}
+            else:
+                self.branch_id = user.driver_branch_id
+                self._vehicle_ids = set()
+
+    @property
+    def is_master(self):
+        return self.role == 'master'
+
+    @property
+    def vehicle_ids(self):
+        """지점 차량 ID 집합 (처음 사용할 때 한 번만 조회)"""
+        if self._vehicle_ids is None:
+            if self.is_master:
+                self._vehicle_ids = {v_id for (v_id,) in db.session.query(Vehicle.id)}
+            else:
+                self._vehicle_ids = {v_id for (v_id,) in db.session.query(Vehicle.id).filter(
+                    Vehicle.branch_id == self.branch_id
+                )}
+        return self._vehicle_ids
+
+
+@app.before_request
+def load_current_user():
+    """요청마다 사용자를 한 번만 조회 (관리 지점/차량 즉시 로딩)"""
+    g.current_user = None
+    g.branch_scope = BranchScope(None)
+    user_id = session.get('user_id')
+    if user_id is None:
+        return
+    g.current_user = User.query.options(
+        joinedload(User.managed_branch),
+        joinedload(User.vehicle)
+    ).filter_by(id=user_id).first()
+    g.branch_scope = BranchScope(g.current_user)
+
+
+def get_branch_scope(current_user):
+    """요청 컨텍스트의 지점 범위 반환 (다른 사용자면 새로 계산)"""
+    if g.get('current_user') is current_user and 'branch_scope' in g:
+        return g.branch_scope
+    return BranchScope(current_user)
+
 # --- 로그인 확인 데코레이터 ---
 def login_required(f):
     @wraps(f)
@@ -62,47 +138,50 @@ def admin_required(f):
 # 🔹 여기에 새로운 권한 체크 함수들 추가
 def check_user_permission_for_student(current_user, student):
     """사용자가 해당 학생에 대한 권한이 있는지 확인"""
-    if current_user.role == 'master':
+    scope = get_branch_scope(current_user)
+    if scope.is_master:
         return True
-    elif current_user.role == 'admin':
+    elif scope.role == 'admin':
         # branch_id 우선, branch_name 백업
-        if student.branch_id == current_user.branch_id:
+        if student.branch_id == scope.branch_id:
             return True
-        elif (hasattr(current_user, 'managed_branch') and 
-              current_user.managed_branch and 
+        elif (current_user.managed_branch and
               student.branch_name == current_user.managed_branch.name):
             return True
-    elif current_user.role == 'driver':
+    elif scope.role == 'driver':
         # 기사는 자신의 차량에 배정된 학생만
-        if hasattr(current_user, 'vehicle') and current_user.vehicle:
-            return student.branch_id == current_user.vehicle.branch_id
+        if scope.vehicle_ids:
+            return student.branch_id == scope.branch_id
     return False
 
 def check_user_permission_for_vehicle(current_user, vehicle):
     """사용자가 해당 차량에 대한 권한이 있는지 확인"""
-    if current_user.role == 'master':
+    scope = get_branch_scope(current_user)
+    if scope.is_master:
         return True
-    elif current_user.role == 'admin':
-        return vehicle.branch_id == current_user.branch_id
-    elif current_user.role == 'driver':
+    elif scope.role == 'admin':
+        return vehicle.branch_id == scope.branch_id
+    elif scope.role == 'driver':
         # 기사는 자신의 차량만
-        return hasattr(current_user, 'vehicle') and current_user.vehicle.id == vehicle.id
+        return vehicle.id in scope.vehicle_ids
     return False
 
 def check_user_permission_for_class(current_user, class_item):
     """사용자가 해당 클래스에 대한 권한이 있는지 확인"""
-    if current_user.role == 'master':
+    scope = get_branch_scope(current_user)
+    if scope.is_master:
         return True
-    elif current_user.role == 'admin':
-        return class_item.branch_id == current_user.branch_id
+    elif scope.role == 'admin':
+        return class_item.branch_id == scope.branch_id
     return False
 
 def check_user_permission_for_branch(current_user, branch_id):
     """사용자가 해당 지점에 대한 권한이 있는지 확인"""
-    if current_user.role == 'master':
+    scope = get_branch_scope(current_user)
+    if scope.is_master:
         return True
-    elif current_user.role == 'admin':
-        return current_user.branch_id == int(branch_id)
+    elif scope.role == 'admin':
+        return scope.branch_id == int(branch_id)
     return False
 def setup_initial_accounts():
     with app.app_context():
@@ -118,7 +197,7 @@ def setup_initial_accounts():
             db.session.commit()
         except Exception as e:
             db.session.rollback()
-            print(f"초기 계정 설정 오류: {e}")
+            log.exception('initial_accounts.error', '초기 계정 설정 오류: %s', e)
 
 @app.route('/')
 def index():
@@ -201,7 +280,7 @@ def signup_member():
 
             # 사용자 생성
             new_user = User(email=email, name=name, phone=phone, role='student')
-            new_user.set_password(password)
+            new_user.password_hash = password_hashing.hash_password(password)
             db.session.add(new_user)
             db.session.flush()  # ID 생성을 위해 flush
 
@@ -259,7 +338,7 @@ def add_branch():
             flash("지점 이름과 비밀번호를 모두 입력해주세요.", "danger")
             return redirect(url_for('manage_branches'))
             
-        master_user = User.query.get(session['user_id'])
+        master_user = g.current_user
         if not master_user or not master_user.check_password(password):
             flash("마스터 비밀번호가 일치하지 않습니다.", "danger")
             return redirect(url_for('manage_branches'))
@@ -289,30 +368,33 @@ def delete_branch(branch_id):
             flash("비밀번호를 입력해주세요.", "danger")
             return redirect(url_for('manage_branches'))
             
-        master_user = User.query.get(session['user_id'])
+        master_user = g.current_user
         if not master_user.check_password(password):
             flash("마스터 비밀번호가 일치하지 않습니다.", "danger")
             return redirect(url_for('manage_branches'))
             
         branch = Branch.query.get_or_404(branch_id)
         
-        # 🔹 개선: 삭제 가능 여부 상세 체크
+        # 🔹 삭제 가능 여부는 실제 테이블 EXISTS 로 확인 (카운터가 어긋나도 데이터가 남은 지점을 지우지 않도록)
+        #    건수는 막힐 때 안내 문구용으로만 셈
+        def branch_has(query):
+            return db.session.query(query.exists()).scalar()
+        
         # 1. 등록된 학생 확인
-        students_count = Student.query.filter_by(branch_id=branch_id).count()
-        if students_count > 0:
-            flash(f"'{branch.name}' 지점에 등록된 학생({students_count}명)이 있어 삭제할 수 없습니다. 먼저 학생들을 다른 지점으로 이전하거나 삭제해주세요.", "danger")
+        students_query = Student.query.filter_by(branch_id=branch_id)
+        if branch_has(students_query):
+            flash(f"'{branch.name}' 지점에 등록된 학생({students_query.count()}명)이 있어 삭제할 수 없습니다. 먼저 학생들을 다른 지점으로 이전하거나 삭제해주세요.", "danger")
             return redirect(url_for('manage_branches'))
         
         # 2. 차량 확인
-        vehicles_count = Vehicle.query.filter_by(branch_id=branch_id).count()
-        if vehicles_count > 0:
-            flash(f"'{branch.name}' 지점에 등록된 차량({vehicles_count}대)이 있어 삭제할 수 없습니다. 먼저 차량을 삭제해주세요.", "danger")
+        vehicles_query = Vehicle.query.filter_by(branch_id=branch_id)
+        if branch_has(vehicles_query):
+            flash(f"'{branch.name}' 지점에 등록된 차량({vehicles_query.count()}대)이 있어 삭제할 수 없습니다. 먼저 차량을 삭제해주세요.", "danger")
             return redirect(url_for('manage_branches'))
         
         # 3. 배차 기록 확인
-        branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=branch_id).all()]
-        dispatch_count = DispatchResult.query.filter(DispatchResult.vehicle_id.in_(branch_vehicle_ids)).count()
-        if dispatch_count > 0:
+        if branch_has(DispatchResult.query.join(Vehicle, Vehicle.id == DispatchResult.vehicle_id)
+                      .filter(Vehicle.branch_id == branch_id)):
             flash(f"'{branch.name}' 지점에 배차 기록이 있어 삭제할 수 없습니다.", "danger")
             return redirect(url_for('manage_branches'))
         
@@ -356,7 +438,7 @@ def delete_admin(admin_id):
             flash("비밀번호를 입력해주세요.", "danger")
             return redirect(url_for('manage_branches'))
             
-        master_user = User.query.get(session['user_id'])
+        master_user = g.current_user
         if not master_user.check_password(password):
             flash("마스터 비밀번호가 일치하지 않습니다.", "danger")
             return redirect(url_for('manage_branches'))
@@ -389,16 +471,14 @@ def get_branch_info(branch_id):
     try:
         branch = Branch.query.get_or_404(branch_id)
         
-        # 관련 데이터 개수 조회
-        students_count = Student.query.filter_by(branch_id=branch_id).count()
-        vehicles_count = Vehicle.query.filter_by(branch_id=branch_id).count()
-        classes_count = Class.query.filter_by(branch_id=branch_id).count()
-        admins_count = User.query.filter_by(branch_id=branch_id, role='admin').count()
-        drivers_count = User.query.filter_by(driver_branch_id=branch_id, role='driver').count()
-        
-        # 배차 기록 확인
-        branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=branch_id).all()]
-        dispatch_count = DispatchResult.query.filter(DispatchResult.vehicle_id.in_(branch_vehicle_ids)).count()
+        # 관련 데이터 개수 조회 (지점 카운터 한 행)
+        counts = branch_counters.counter_dict(branch_counters.get_counters(branch_id))
+        students_count = counts['students']
+        vehicles_count = counts['vehicles']
+        classes_count = counts['classes']
+        admins_count = counts['admins']
+        drivers_count = counts['drivers']
+        dispatch_count = counts['dispatches']
         
         # 삭제 가능 여부 판단
         can_delete = (students_count == 0 and vehicles_count == 0 and dispatch_count == 0)
@@ -456,7 +536,7 @@ def add_admin():
             role='admin',
             branch_id=int(branch_id)
         )
-        new_admin.set_password(password)
+        new_admin.password_hash = password_hashing.hash_password(password)
         db.session.add(new_admin)
         db.session.commit()
         flash(f"관리자 '{new_admin.name}' 계정이 생성되었습니다.", "success")
@@ -470,491 +550,311 @@ def add_admin():
 # ----------------------------------------------------
 # 🔹 엑셀 관련 기능 라우트
 # ----------------------------------------------------
+def template_catalog(scope):
+    """양식 드롭다운 목록 (클래스명, 시간대) — 한 번의 조인 쿼리, 지점별 목록 버전 단위로 캐시"""
+    branch_id = None if scope.is_master else scope.branch_id
+
+    def load():
+        catalog = db.session.query(Class.name, TimeSlot.time).join(TimeSlot, TimeSlot.class_id == Class.id)
+        if branch_id is not None:
+            catalog = catalog.filter(Class.branch_id == branch_id)
+        catalog = catalog.all()
+        return sorted({name for name, _ in catalog}), sorted({time for _, time in catalog})
+
+    return template_cache.get_or_build('catalog', branch_id, load)
+
 @app.route('/admin/download_template')
 @admin_required
 def download_dynamic_template():
+    """빈 업로드 양식 다운로드 (지점/목록 버전이 같으면 캐시된 파일을 그대로 전송)"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
+        scope = g.branch_scope
         
-        # 지점별 클래스 조회
-        if current_user.role == 'master':
-            classes = Class.query.all()
+        if scope.is_master:
             branch_name = "전체지점"
         else:
-            classes = Class.query.filter_by(branch_id=current_user.branch_id).all()
             branch_name = current_user.managed_branch.name if current_user.managed_branch else "미설정"
         
-        # 새 워크북 생성
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "회원명부"
-        
-        # 헤더 설정
-        headers = ['번호', '이름', '이메일', '초기비밀번호', '연락처', '비상연락망', 
-                  '주소', '지점명', '클래스명', '시간대', '수강시작일(YYYY-MM-DD)']
-        ws.append(headers)
-        
-        # 클래스명 목록 생성 (시간대 포함)
-        class_options = []
-        for c in classes:
-            for time_slot in c.time_slots:
-                class_options.append(c.name)
-        
-        # 중복 제거
-        unique_classes = list(set(class_options))
-        
-        if unique_classes:
-            # 클래스명 드롭다운 설정
-            dv_class = DataValidation(
-                type="list", 
-                formula1=f'"{",".join(unique_classes)}"',
-                showErrorMessage=True,
-                errorTitle="잘못된 클래스명",
-                error="목록에서 선택해주세요"
-            )
-            ws.add_data_validation(dv_class)
-            dv_class.add('I2:I1000')  # 클래스명 컬럼 (I열)
-        
-        # 지점명 드롭다운 설정
-        dv_branch = DataValidation(
-            type="list", 
-            formula1=f'"{branch_name}"',
-            showErrorMessage=True,
-            errorTitle="잘못된 지점명", 
-            error="해당 지점명만 사용 가능합니다"
+        def build():
+            class_names, _ = template_catalog(scope)
+            return exports.xlsx_bytes(lambda wb: exports.write_upload_template(wb, branch_name, class_names))
+        
+        content = template_cache.get_or_build(
+            'upload_template', None if scope.is_master else scope.branch_id, build, extra=(branch_name,)
         )
-        ws.add_data_validation(dv_branch)
-        dv_branch.add('H2:H1000')  # 지점명 컬럼 (H열)
-        
-        # 샘플 데이터 1줄 추가
-        if unique_classes:
-            sample_row = [
-                1, "홍길동", "sample@example.com", 12345, 
-                "010-1234-5678", "010-9876-5432", 
-                f"경기도 용인시 기흥구 동천동 123-45", 
-                branch_name, unique_classes[0], "07:00", "2025-08-07"
-            ]
-            ws.append(sample_row)
-        
-        # 컬럼 너비 자동 조정
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # 메모리에 파일 저장
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
         
         # 파일명 생성
         filename = f"{branch_name}_회원명부_양식_{date.today().strftime('%Y%m%d')}.xlsx"
         
         return send_file(
-            output, 
+            io.BytesIO(content), 
             as_attachment=True, 
             download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=exports.XLSX_MIMETYPE
         )
         
     except Exception as e:
         flash(f"양식 생성 중 오류가 발생했습니다: {str(e)}", "danger")
         return redirect(url_for('manage_students'))
 
-# app.py의 upload_students 함수 개선 버전
-
 @app.route('/admin/upload_students', methods=['POST'])
 @admin_required
 def upload_students():
+    """회원명부 업로드 접수 (실제 처리는 utils/import_jobs.py 워커가 백그라운드에서 수행)"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         file = request.files.get('student_file')
         
-        print(f"🔹 업로드 시작 - 사용자: {current_user.name}, 지점: {current_user.branch_id}")
-        
         if not file or file.filename == '':
             flash("파일이 선택되지 않았습니다.", "danger")
             return redirect(url_for('manage_students'))
 
-        df = pd.read_excel(file)
-        new_students_count = 0
-        error_count = 0
-        
-        print(f"📊 엑셀 데이터: {len(df)}행")
-        
-        for index, row in df.iterrows():
-            try:
-                # 필수 데이터 확인
-                if pd.isna(row['이메일']) or pd.isna(row['이름']):
-                    print(f"❌ {index+1}행: 필수 데이터 누락")
-                    error_count += 1
-                    continue
-                    
-                if User.query.filter_by(email=row['이메일']).first():
-                    print(f"⚠️ {index+1}행: 이미 존재하는 이메일 ({row['이메일']})")
-                    continue
-
-                # 사용자 생성
-                new_user = User(
-                    name=str(row['이름']),
-                    email=str(row['이메일']),
-                    phone=str(row['연락처']) if pd.notna(row['연락처']) else '',
-                    role='student'
-                )
-                new_user.set_password(str(row['초기비밀번호']))
-                db.session.add(new_user)
-                db.session.flush()
-                
-                print(f"✅ 사용자 생성: {new_user.name} (ID: {new_user.id})")
-
-                # 수강 시작일 처리
-                start_date = None
-                end_date = None
-                if pd.notna(row.get('수강시작일(YYYY-MM-DD)')):
-                    try:
-                        start_date = pd.to_datetime(row['수강시작일(YYYY-MM-DD)']).date()
-                        # 수강 기간이 있으면 종료일 계산
-                        if pd.notna(row.get('수강기간(개월)')):
-                            duration_months = int(row['수강기간(개월)'])
-                            end_date = start_date + relativedelta(months=duration_months)
-                        print(f"📅 기간: {start_date} ~ {end_date}")
-                    except Exception as e:
-                        print(f"⚠️ 날짜 변환 실패: {e}")
-                
-                # 🔹 핵심 개선: 지점명 매칭 로직 강화
-                branch_name = str(row['지점명']).strip() if pd.notna(row['지점명']) else ''
-                branch_id = None
-                
-                if branch_name:
-                    # 1차: 정확한 매칭 시도
-                    branch_item = Branch.query.filter_by(name=branch_name).first()
-                    
-                    if not branch_item:
-                        # 2차: 부분 매칭 시도 (공백, 대소문자 무시)
-                        all_branches = Branch.query.all()
-                        for b in all_branches:
-                            if branch_name.replace(' ', '').lower() in b.name.replace(' ', '').lower() or \
-                               b.name.replace(' ', '').lower() in branch_name.replace(' ', '').lower():
-                                branch_item = b
-                                print(f"🔍 부분 매칭 성공: '{branch_name}' → '{b.name}'")
-                                break
-                    
-                    if branch_item:
-                        branch_id = branch_item.id
-                        # 🔹 추가: 권한 체크 (일반 관리자는 자신의 지점만)
-                        if current_user.role != 'master' and branch_id != current_user.branch_id:
-                            print(f"❌ {index+1}행: 권한 없음 - 다른 지점 학생")
-                            error_count += 1
-                            continue
-                    else:
-                        # 3차: 관리자의 기본 지점 사용
-                        if current_user.role != 'master' and current_user.branch_id:
-                            branch_id = current_user.branch_id
-                            managed_branch = Branch.query.get(current_user.branch_id)
-                            branch_name = managed_branch.name if managed_branch else branch_name
-                            print(f"🔄 기본 지점 사용: {branch_name} (ID: {branch_id})")
-                        else:
-                            print(f"❌ {index+1}행: 지점 '{branch_name}'을 찾을 수 없고 기본 지점도 없음")
-                            error_count += 1
-                            continue
-                else:
-                    # 지점명이 없으면 관리자의 기본 지점 사용
-                    if current_user.role != 'master' and current_user.branch_id:
-                        branch_id = current_user.branch_id
-                        managed_branch = Branch.query.get(current_user.branch_id)
-                        branch_name = managed_branch.name if managed_branch else f"지점{current_user.branch_id}"
-                        print(f"🔄 기본 지점 사용: {branch_name} (ID: {branch_id})")
-                    else:
-                        print(f"❌ {index+1}행: 지점명이 없고 기본 지점도 설정되지 않음")
-                        error_count += 1
-                        continue
-                
-                print(f"🏢 최종 지점: '{branch_name}' (ID: {branch_id})")
-                
-                # 학생 정보 생성 (이제 반드시 실행됨)
-                new_student = Student(
-                    user_id=new_user.id,
-                    branch_id=branch_id,
-                    branch_name=branch_name,
-                    class_name=str(row.get('클래스명', '')),
-                    time_slot=str(row.get('시간대', '')),
-                    address=str(row.get('주소', '')),
-                    emergency_contact=str(row.get('비상연락망', '')),
-                    start_date=start_date,
-                    end_date=end_date,
-                    status='approved'
-                )
-                db.session.add(new_student)
-                print(f"✅ 학생 정보 생성: {new_user.name}")
-                
-                new_students_count += 1
-                
-            except Exception as e:
-                print(f"❌ {index+1}행 처리 중 오류: {str(e)}")
-                error_count += 1
-                continue
-        
-        # 🔹 개선: 부분 성공도 커밋
-        if new_students_count > 0:
-            try:
-                db.session.commit()
-                print(f"💾 데이터베이스 커밋 완료")
-            except Exception as e:
-                print(f"❌ 커밋 실패: {e}")
-                db.session.rollback()
-                flash(f"데이터베이스 저장 중 오류가 발생했습니다: {e}", "danger")
-                return redirect(url_for('manage_students'))
-        
-        # 결과 확인 및 메시지
-        total_students = Student.query.count()
-        if current_user.role == 'master':
-            branch_students = total_students
-        else:
-            branch_students = Student.query.filter_by(branch_id=current_user.branch_id).count()
-        
-        print(f"📊 등록 후 현황: 전체 {total_students}명, 내 지점 {branch_students}명")
-        
-        if new_students_count > 0:
-            message = f"✅ {new_students_count}명의 학생이 성공적으로 등록되었습니다!"
-            if error_count > 0:
-                message += f" ({error_count}건의 오류가 있었습니다.)"
-            flash(message, "success")
-        else:
-            flash(f"등록된 학생이 없습니다. {error_count}건의 오류가 발생했습니다.", "warning")
+        mode = request.form.get('mode', 'insert')
+        job = import_jobs.enqueue(file, current_user, app.config['IMPORT_JOB_DIR'], mode=mode)
+        flash(f"📥 '{job.filename}' 업로드가 접수되었습니다. 아래 업로드 작업 목록에서 진행 상황을 확인하세요.", "success")
         
+    except ValueError as e:
+        flash(str(e), "danger")
     except Exception as e:
         db.session.rollback()
-        print(f"❌ 전체 업로드 실패: {str(e)}")
+        log.exception('upload.failed', '업로드 접수 실패: %s', e)
         flash(f"파일 처리 중 치명적인 오류가 발생했습니다: {e}", "danger")
     
     return redirect(url_for('manage_students'))
 
+@app.route('/admin/upload_students/validate', methods=['POST'])
+@admin_required
+def validate_students():
+    """회원명부 사전 검증 (dry-run): 오류가 있으면 오류 표시 워크북을 내려줌, 저장은 하지 않음"""
+    try:
+        file = request.files.get('student_file')
+        if not file or file.filename == '':
+            flash("파일이 선택되지 않았습니다.", "danger")
+            return redirect(url_for('manage_students'))
+
+        report = roster_validation.validate_roster(
+            file.stream, file.filename, g.current_user, mode=request.form.get('mode', 'insert')
+        )
+        log.info('upload.validated', rows=report.total, error_rows=report.error_rows)
+
+        if not report.error_rows:
+            flash(f"✅ {report.total}행 모두 검증을 통과했습니다. 파일을 업로드하면 등록됩니다.", "success")
+            return redirect(url_for('manage_students'))
+
+        base_name = os.path.splitext(file.filename)[0]
+        return send_file(
+            io.BytesIO(report.workbook_bytes()),
+            as_attachment=True,
+            download_name=f"{base_name}_검증결과.xlsx",
+            mimetype=exports.XLSX_MIMETYPE
+        )
+
+    except ValueError as e:
+        flash(str(e), "danger")
+    except Exception as e:
+        db.session.rollback()
+        log.exception('upload.validate_failed', '업로드 검증 실패: %s', e)
+        flash(f"파일 검증 중 오류가 발생했습니다: {e}", "danger")
+
+    return redirect(url_for('manage_students'))
+
+def check_user_permission_for_import_job(current_user, job):
+    """사용자가 해당 업로드 작업을 볼 수 있는지 확인"""
+    scope = get_branch_scope(current_user)
+    if scope.is_master:
+        return True
+    elif scope.role == 'admin':
+        return job.user_id == current_user.id or (job.branch_id is not None and job.branch_id == scope.branch_id)
+    return False
+
+@app.route('/api/import_jobs')
+@admin_required
+def list_import_jobs():
+    """최근 업로드 작업 목록 (관리자는 자기 지점 작업만)"""
+    scope = g.branch_scope
+    query = ImportJob.query
+    if not scope.is_master:
+        query = query.filter((ImportJob.branch_id == scope.branch_id) | (ImportJob.user_id == g.current_user.id))
+    jobs = query.order_by(ImportJob.id.desc()).limit(10).all()
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/import_jobs/<int:job_id>')
+@admin_required
+def get_import_job(job_id):
+    """업로드 작업 상태/진행률"""
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '작업을 찾을 수 없습니다.'}), 404
+    if not check_user_permission_for_import_job(g.current_user, job):
+        return jsonify({'success': False, 'error': '권한이 없습니다.'}), 403
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/admin/import_jobs/<int:job_id>/report')
+@admin_required
+def download_import_report(job_id):
+    """업로드 작업의 행별 결과 리포트 다운로드"""
+    job = db.session.get(ImportJob, job_id)
+    if not job or not check_user_permission_for_import_job(g.current_user, job):
+        flash("업로드 작업을 찾을 수 없거나 권한이 없습니다.", "danger")
+        return redirect(url_for('manage_students'))
+    if not job.report_path or not os.path.exists(job.report_path):
+        flash("아직 결과 리포트가 없습니다.", "warning")
+        return redirect(url_for('manage_students'))
+
+    base_name = os.path.splitext(job.filename)[0]
+    return send_file(
+        job.report_path,
+        as_attachment=True,
+        download_name=f"{base_name}_업로드결과.xlsx",
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+STUDENT_EXPORT_FIELDS = ['name', 'email', 'phone', 'emergency_contact', 'address', 'branch_name',
+                         'class_name', 'time_slot', 'status', 'start_date', 'created_at']
+STUDENT_EXPORT_CHUNK = 1000
+
+
+def student_export_query(scope):
+    """엑셀 내보내기용 학생 프로젝션 (지점 범위 적용, 최근 가입 순, yield_per 스트리밍)"""
+    return (student_projection_query(scope, STUDENT_EXPORT_FIELDS, status=None)
+            .order_by(None).order_by(User.created_at.desc())
+            .yield_per(STUDENT_EXPORT_CHUNK))
+
+
+def xlsx_stream_response(build, filename):
+    """write_only 워크북을 제너레이터로 전송"""
+    return app.response_class(
+        stream_with_context(exports.stream_xlsx(build)),
+        mimetype=exports.XLSX_MIMETYPE,
+        headers=exports.attachment_headers(filename)
+    )
+
+
+def export_response(export_format, filename_base, columns, rows, build_xlsx):
+    """format 별 스트리밍 응답 (xlsx / csv / parquet)"""
+    if export_format == 'csv':
+        body, mimetype = exports.stream_csv(columns, rows), exports.CSV_MIMETYPE
+    elif export_format == 'parquet':
+        body, mimetype = exports.stream_parquet(columns, rows), exports.PARQUET_MIMETYPE
+    else:
+        return xlsx_stream_response(build_xlsx, f"{filename_base}.xlsx")
+    return app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers=exports.attachment_headers(f"{filename_base}.{export_format}")
+    )
+
+
+def requested_export_format():
+    """?format= 값 확인 (지원하지 않거나 pyarrow 가 없으면 ValueError)"""
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in exports.EXPORT_FORMATS:
+        raise ValueError(f"지원하지 않는 형식입니다: {export_format}")
+    if export_format == 'parquet' and not exports.parquet_available():
+        raise ValueError("Parquet 내보내기를 사용하려면 서버에 pyarrow 패키지를 설치해야 합니다.")
+    return export_format
+
 @app.route('/admin/download_students')
 @admin_required
 def download_students():
-    """지점별 등록된 회원 명부 다운로드"""
+    """지점별 등록된 회원 명부 다운로드 (?format=xlsx|csv|parquet, 스트리밍)"""
     try:
-        current_user = User.query.get(session['user_id'])
-        
-        # 현재 지점의 학생들만 조회
-        if current_user.role == 'master':
-            # 마스터는 모든 학생
-            students = Student.query.join(User).order_by(User.created_at.desc()).all()
-        else:
-            # 지점 관리자는 자기 지점만
-            students = Student.query.filter_by(branch_id=current_user.branch_id).join(User).order_by(User.created_at.desc()).all()
-        
-        # 엑셀 데이터 생성
-        data = []
-        for student in students:
-            row = {
-                '이름': student.user.name,
-                '이메일': student.user.email,
-                '연락처': student.user.phone or '',
-                '비상연락망': student.emergency_contact or '',
-                '주소': student.address or '',
-                '지점명': student.branch_name,
-                '클래스명': student.class_name or '',
-                '시간대': student.time_slot or '',
-                '승인상태': '승인완료' if student.is_approved else '승인대기',
-                '수강시작일': student.enrollment_date.strftime('%Y-%m-%d') if student.enrollment_date else '',
-                '등록일': student.user.created_at.strftime('%Y-%m-%d')
-            }
-            data.append(row)
-        
-        # DataFrame 생성 및 엑셀로 변환
-        df = pd.DataFrame(data)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='회원명부')
-        output.seek(0)
+        current_user = g.current_user
+        export_format = requested_export_format()
+        rows = student_export_query(g.branch_scope)
         
         # 파일명 생성
         branch_name = current_user.managed_branch.name if current_user.role == 'admin' else '전체'
-        filename = f"{branch_name}_회원명부_{date.today().strftime('%Y%m%d')}.xlsx"
+        filename_base = f"{branch_name}_회원명부_{date.today().strftime('%Y%m%d')}"
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return export_response(export_format, filename_base, exports.STUDENT_ROSTER_COLUMNS, rows,
+                               lambda wb: exports.write_student_roster(wb, rows))
         
     except Exception as e:
         flash(f"회원 명부 다운로드 중 오류가 발생했습니다: {str(e)}", "danger")
         return redirect(url_for('manage_students'))
 
+def dispatch_export_query(scope, from_date=None, to_date=None):
+    """배차 이력 내보내기용 프로젝션 (차량 지점 기준 범위 적용, yield_per 스트리밍)"""
+    driver = aliased(User)
+    student_user = aliased(User)
+    query = db.session.query(
+        DispatchResult.dispatch_date,
+        Vehicle.vehicle_number,
+        driver.name.label('driver_name'),
+        student_user.name.label('student_name'),
+        Student.class_name,
+        Student.time_slot,
+        Student.address,
+        DispatchResult.stop_order,
+        DispatchResult.status,
+        DispatchResult.pickup_time,
+        DispatchResult.arrival_time,
+        DispatchResult.notes
+    ).select_from(DispatchResult) \
+        .join(Vehicle, DispatchResult.vehicle_id == Vehicle.id) \
+        .join(Student, DispatchResult.student_id == Student.id) \
+        .join(student_user, Student.user_id == student_user.id) \
+        .outerjoin(driver, Vehicle.driver_id == driver.id)
+
+    if not scope.is_master:
+        query = query.filter(Vehicle.branch_id == scope.branch_id)
+    if from_date:
+        query = query.filter(DispatchResult.dispatch_date >= from_date)
+    if to_date:
+        query = query.filter(DispatchResult.dispatch_date <= to_date)
+
+    return (query.order_by(DispatchResult.dispatch_date.desc(), Vehicle.vehicle_number, DispatchResult.stop_order)
+            .yield_per(STUDENT_EXPORT_CHUNK))
+
+@app.route('/admin/download_dispatch_history')
+@admin_required
+def download_dispatch_history():
+    """배차 이력 다운로드 (?format=xlsx|csv|parquet&from_date=&to_date=, 스트리밍)"""
+    try:
+        current_user = g.current_user
+        export_format = requested_export_format()
+        from_date = request.args.get('from_date')
+        to_date = request.args.get('to_date')
+        from_date = datetime.strptime(from_date, '%Y-%m-%d').date() if from_date else None
+        to_date = datetime.strptime(to_date, '%Y-%m-%d').date() if to_date else None
+        
+        rows = dispatch_export_query(g.branch_scope, from_date, to_date)
+        
+        branch_name = current_user.managed_branch.name if current_user.role == 'admin' and current_user.managed_branch else '전체'
+        period = f"{from_date or '처음'}~{to_date or date.today()}"
+        filename_base = f"{branch_name}_배차이력_{period}"
+        
+        return export_response(export_format, filename_base, exports.DISPATCH_HISTORY_COLUMNS, rows,
+                               lambda wb: exports.write_dispatch_history(wb, rows))
+        
+    except Exception as e:
+        flash(f"배차 이력 다운로드 중 오류가 발생했습니다: {str(e)}", "danger")
+        return redirect(url_for('manage_dispatch'))
+
 @app.route('/download_template')
 @admin_required
 def download_template():
-    """기존 회원명단 + 업로드 양식 통합 다운로드"""
+    """기존 회원명단 + 업로드 양식 통합 다운로드 (write_only 스트리밍)"""
     try:
-        import openpyxl
-        from openpyxl.worksheet.datavalidation import DataValidation
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
+        scope = g.branch_scope
         
-        # 🔹 수정: 지점별 정확한 처리
-        if current_user.role == 'master':
-            # 마스터는 모든 지점 데이터
-            classes = Class.query.all()
-            students = Student.query.join(User).order_by(User.created_at.desc()).all()
+        # 🔹 드롭다운 목록: 클래스명/시간대 (목록 버전 단위 캐시)
+        # 기존 회원 목록은 매번 달라지므로 파일 자체는 캐시하지 않고 스트리밍
+        if scope.is_master:
             branch_name = "전체지점"
         else:
-            # 관리자는 자신의 지점만
-            classes = Class.query.filter_by(branch_id=current_user.branch_id).all()
-            students = Student.query.filter_by(branch_id=current_user.branch_id).join(User).order_by(User.created_at.desc()).all()
             branch_name = current_user.managed_branch.name if current_user.managed_branch else f"지점{current_user.branch_id}"
+        class_names, time_slots = template_catalog(scope)
         
-        # 새 워크북 생성
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "회원명부_통합"
-        
-        # 🎨 스타일 정의
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        existing_fill = PatternFill(start_color="D5E8D4", end_color="D5E8D4", fill_type="solid")  # 기존 회원 (연한 녹색)
-        template_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")  # 템플릿 (연한 노랑)
-        
-        # 📋 헤더 설정
-        headers = [
-            '번호', '이름', '이메일', '초기비밀번호', '연락처', '비상연락망', 
-            '주소', '지점명', '클래스명', '시간대', '수강시작일(YYYY-MM-DD)', '수강기간(개월)', '상태'
-        ]
-        
-        # 헤더 추가
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center')
-        
-        current_row = 2
-        
-        # 🔹 기존 회원 데이터 추가
-        for idx, student in enumerate(students, 1):
-            row_data = [
-                idx,
-                student.user.name,
-                student.user.email,
-                "****",  # 보안상 비밀번호는 숨김
-                student.user.phone or "",
-                student.emergency_contact or "",
-                student.address or "",
-                student.branch_name,
-                student.class_name or "",
-                student.time_slot or "",
-                student.start_date.strftime('%Y-%m-%d') if student.start_date else "",
-                "",  # 수강기간은 기존 데이터에 없음
-                "기존회원"
-            ]
-            
-            for col_idx, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col_idx, value=value)
-                cell.fill = existing_fill  # 기존 회원은 녹색
-            
-            current_row += 1
-        
-        # 🔹 구분선 추가
-        if students:
-            ws.merge_cells(f'A{current_row}:M{current_row}')
-            separator_cell = ws[f'A{current_row}']
-            separator_cell.value = "⬇️⬇️⬇️ 아래에 새로운 회원 정보를 입력하세요 ⬇️⬇️⬇️"
-            separator_cell.font = Font(bold=True, color="FF0000")
-            separator_cell.alignment = Alignment(horizontal='center')
-            separator_cell.fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-            current_row += 1
-        
-        # 🔹 빈 템플릿 양식 추가 (5줄)
-        template_start_row = current_row
-        for i in range(5):
-            sample_row = [
-                len(students) + i + 1,  # 번호 이어서
-                f"신규회원{i+1}",
-                f"new{i+1}@example.com",
-                "1234",
-                "010-0000-0000",
-                "010-0000-0000",
-                "주소를 입력하세요",
-                branch_name,
-                "",  # 드롭다운으로 선택
-                "",  # 드롭다운으로 선택
-                "2025-09-01",
-                "3",
-                "신규"
-            ]
-            
-            for col_idx, value in enumerate(sample_row, 1):
-                cell = ws.cell(row=current_row, column=col_idx, value=value)
-                cell.fill = template_fill  # 템플릿은 노란색
-            
-            current_row += 1
-        
-        # 🔽 드롭다운 설정
-        class_time_options = []
-        time_options = set()
-        
-        for cls in classes:
-            for time_slot in cls.time_slots:
-                class_time_options.append(cls.name)
-                time_options.add(time_slot.time)
-        
-        unique_classes = sorted(list(set(class_time_options)))
-        unique_times = sorted(list(time_options))
-        
-        if unique_classes:
-            class_validation = DataValidation(
-                type="list",
-                formula1=f'"{",".join(unique_classes)}"',
-                showErrorMessage=True,
-                errorTitle="클래스명 오류",
-                error="등록된 클래스 중에서 선택해주세요."
-            )
-            ws.add_data_validation(class_validation)
-            class_validation.add(f'I{template_start_row}:I1000')
-        
-        if unique_times:
-            time_validation = DataValidation(
-                type="list",
-                formula1=f'"{",".join(unique_times)}"',
-                showErrorMessage=True,
-                errorTitle="시간대 오류",
-                error="등록된 시간대 중에서 선택해주세요."
-            )
-            ws.add_data_validation(time_validation)
-            time_validation.add(f'J{template_start_row}:J1000')
-        
-        # 컬럼 너비 조정
-        column_widths = {
-            'A': 5, 'B': 12, 'C': 25, 'D': 12, 'E': 15, 'F': 15, 
-            'G': 40, 'H': 15, 'I': 15, 'J': 10, 'K': 18, 'L': 12, 'M': 8
-        }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-        
-        # 파일 저장
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
+        rows = student_export_query(scope)
         filename = f"{branch_name}_통합회원명부_{date.today().strftime('%Y%m%d')}.xlsx"
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        return xlsx_stream_response(
+            lambda wb: exports.write_roster_template(wb, rows, branch_name, class_names, time_slots),
+            filename
         )
         
     except Exception as e:
@@ -970,25 +870,25 @@ def download_template():
 @admin_required
 def admin_dashboard():
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         # 날짜 변수들을 먼저 정의
         today = date.today()
         seven_days_later = today + relativedelta(days=7)
         first_day_of_month = today.replace(day=1)
         
-        # 🔹 디버깅 정보 (기존과 동일하게 유지)
-        print(f"🔍 현재 사용자: {current_user.name} ({current_user.role})")
-        print(f"🔍 사용자 branch_id: {current_user.branch_id}")
+        # 🔹 디버깅 정보
+        log.debug('dashboard.start', role=current_user.role, branch_id=current_user.branch_id)
         
-        # 전체 데이터 확인 (디버깅용)
-        all_students = Student.query.all()
-        print(f"🔍 데이터베이스 전체 학생 수: {len(all_students)}")
-        for i, student in enumerate(all_students[:3]):  # 처음 3명만 확인
-            print(f"  - {student.user.name}: branch_id={student.branch_id}, branch_name='{student.branch_name}'")
+        # 전체 데이터 확인 (디버깅용, DEBUG 레벨에서만 수집)
+        if log.debug_enabled:
+            sample_students = Student.query.options(joinedload(Student.user)).limit(3).all()
+            log.debug('dashboard.sample', '데이터베이스 전체 학생 수: %d', Student.query.count(),
+                      sample=[{'name': s.user.name, 'branch_id': s.branch_id, 'branch_name': s.branch_name}
+                              for s in sample_students])
         
         if current_user.role == 'master':
-            print("📊 마스터 모드: 전체 데이터 표시")
+            log.debug('dashboard.mode', mode='master')
             # 마스터는 전체 통계
             total_students = Student.query.count()
             total_vehicles = Vehicle.query.count()
@@ -1005,36 +905,36 @@ def admin_dashboard():
             ).count()
             
         else:
-            print(f"📊 지점 관리자 모드: branch_id {current_user.branch_id}로 필터링")
+            log.debug('dashboard.mode', mode='branch', branch_id=current_user.branch_id)
             
             # 🔹 개선: 우선 branch_id로 시도하되, 백업 로직도 유지
             students_by_id = Student.query.filter_by(branch_id=current_user.branch_id).all()
-            print(f"🔍 branch_id로 찾은 학생: {len(students_by_id)}명")
+            log.debug('dashboard.students_by_id', count=len(students_by_id))
             
             # 백업 방법: branch_name으로도 확인 (데이터 무결성을 위해)
             students_by_name = []
             if hasattr(current_user, 'managed_branch') and current_user.managed_branch:
                 students_by_name = Student.query.filter_by(branch_name=current_user.managed_branch.name).all()
-                print(f"🔍 branch_name으로 찾은 학생: {len(students_by_name)}명")
+                log.debug('dashboard.students_by_name', count=len(students_by_name))
                 
                 # 🔹 개선: 데이터 불일치 경고
                 if len(students_by_id) != len(students_by_name):
-                    print(f"⚠️ 데이터 불일치 감지: branch_id({len(students_by_id)}) vs branch_name({len(students_by_name)})")
+                    log.warning('dashboard.branch_mismatch', '데이터 불일치 감지', by_id=len(students_by_id), by_name=len(students_by_name))
                     # 더 많은 결과를 가진 방법 선택 (기존 로직 유지)
                     if len(students_by_name) > len(students_by_id):
-                        print("🔄 branch_name 방식 사용 (더 많은 데이터)")
+                        log.debug('dashboard.filter_method', method='branch_name')
                         selected_students = students_by_name
                         filter_method = 'branch_name'
                     else:
-                        print("🔄 branch_id 방식 사용")
+                        log.debug('dashboard.filter_method', method='branch_id')
                         selected_students = students_by_id
                         filter_method = 'branch_id'
                 else:
-                    print("✅ 데이터 일치: branch_id 방식 사용")
+                    log.debug('dashboard.filter_method', method='branch_id')
                     selected_students = students_by_id
                     filter_method = 'branch_id'
             else:
-                print("🔄 branch_id 방식만 사용 (managed_branch 없음)")
+                log.debug('dashboard.filter_method', method='branch_id')
                 selected_students = students_by_id
                 filter_method = 'branch_id'
             
@@ -1072,7 +972,7 @@ def admin_dashboard():
                     Student.branch_id == current_user.branch_id
                 ).count()
         
-        print(f"📊 최종 통계 - 학생: {total_students}, 차량: {total_vehicles}, 만료예정: {expiring_soon_count}, 신규: {new_students_this_month}")
+        log.debug('dashboard.stats', total_students=total_students, total_vehicles=total_vehicles, expiring_soon=expiring_soon_count, new_this_month=new_students_this_month)
         
         stats = {
             'total_students': total_students, 
@@ -1083,9 +983,7 @@ def admin_dashboard():
         return render_template('admin/dashboard.html', stats=stats)
     except Exception as e:
         flash(f"대시보드 로딩 중 오류가 발생했습니다: {str(e)}", "danger")
-        print(f"❌ 대시보드 오류: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('dashboard.error', '대시보드 오류: %s', e)
         return redirect(url_for('login'))
 
 # 🔹 개선된 manage_students 함수 (기존 디버깅 기능 유지)
@@ -1095,13 +993,12 @@ def admin_dashboard():
 @admin_required
 def manage_students():
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
-        print(f"🔍 학생 관리 - 현재 사용자: {current_user.name} ({current_user.role})")
-        print(f"🔍 사용자 branch_id: {current_user.branch_id}")
+        log.debug('students.start', role=current_user.role, branch_id=current_user.branch_id)
         
         if current_user.role == 'master':
-            print("📋 마스터 모드: 모든 학생 조회 + 통계")
+            log.debug('students.mode', mode='master')
             # 마스터는 모든 학생 조회 가능
             all_students = Student.query.join(User).order_by(User.created_at.desc()).all()
             
@@ -1141,13 +1038,13 @@ def manage_students():
                                  branch_stats=branch_stats,
                                  class_names=class_names)
         else:
-            print(f"📋 지점 관리자 모드: 지점별 학생 조회")
+            log.debug('students.mode', mode='branch', branch_id=current_user.branch_id)
             
             # 🔹 기존 일반 관리자 로직 (변경 없음)
             students_by_id = Student.query.join(User).filter(
                 Student.branch_id == current_user.branch_id
             ).order_by(User.created_at.desc()).all()
-            print(f"🔍 branch_id로 찾은 학생: {len(students_by_id)}명")
+            log.debug('students.by_id', count=len(students_by_id))
             
             # 백업: branch_name으로도 확인
             students_by_name = []
@@ -1155,26 +1052,26 @@ def manage_students():
                 students_by_name = Student.query.join(User).filter(
                     Student.branch_name == current_user.managed_branch.name
                 ).order_by(User.created_at.desc()).all()
-                print(f"🔍 branch_name으로 찾은 학생: {len(students_by_name)}명")
+                log.debug('students.by_name', count=len(students_by_name))
                 
                 if len(students_by_id) != len(students_by_name):
-                    print(f"⚠️ 학생 데이터 불일치: branch_id({len(students_by_id)}) vs branch_name({len(students_by_name)})")
+                    log.warning('students.branch_mismatch', '학생 데이터 불일치', by_id=len(students_by_id), by_name=len(students_by_name))
                     if len(students_by_name) > len(students_by_id):
-                        print("🔄 branch_name 방식으로 학생 조회")
+                        log.debug('students.filter_method', method='branch_name')
                         all_students = students_by_name
                     else:
-                        print("🔄 branch_id 방식으로 학생 조회")
+                        log.debug('students.filter_method', method='branch_id')
                         all_students = students_by_id
                 else:
-                    print("✅ 학생 데이터 일치: branch_id 방식 사용")
+                    log.debug('students.filter_method', method='branch_id')
                     all_students = students_by_id
             else:
-                print("🔄 branch_id 방식만으로 학생 조회")
+                log.debug('students.filter_method', method='branch_id')
                 all_students = students_by_id
             
             # 최후의 수단: 모든 학생을 조회해서 필터링
             if len(all_students) == 0:
-                print("🔄 최후의 수단: 모든 학생을 조회해서 필터링")
+                log.info('students.fallback_scan', '최후의 수단: 모든 학생을 조회해서 필터링')
                 all_db_students = Student.query.join(User).order_by(User.created_at.desc()).all()
                 filtered_students = []
                 for student in all_db_students:
@@ -1184,16 +1081,14 @@ def manage_students():
                          student.branch_name == current_user.managed_branch.name)):
                         filtered_students.append(student)
                 all_students = filtered_students
-                print(f"🔍 필터링 후 학생: {len(all_students)}명")
+                log.debug('students.fallback_result', count=len(all_students))
             
             # 🔹 일반 관리자는 기존 템플릿 사용
             return render_template('admin/manage_students.html', students=all_students, today=date.today())
             
     except Exception as e:
         flash(f"학생 목록 로딩 중 오류가 발생했습니다: {str(e)}", "danger")
-        print(f"❌ 학생 관리 오류: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('students.error', '학생 관리 오류: %s', e)
         return redirect(url_for('admin_dashboard'))
 
 # 🔹 추가: 마스터 전용 대시보드 통계 API
@@ -1379,7 +1274,7 @@ def master_dashboard():
         
     except Exception as e:
         flash(f"마스터 대시보드 로딩 중 오류가 발생했습니다: {str(e)}", "danger")
-        print(f"❌ 마스터 대시보드 오류: {e}")
+        log.exception('master_dashboard.error', '마스터 대시보드 오류: %s', e)
         return redirect(url_for('admin_dashboard'))
     
 @app.route('/master/advanced-dashboard')
@@ -1417,7 +1312,7 @@ def master_advanced_dashboard():
 @admin_required
 def approve_student(student_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         student_to_approve = Student.query.get_or_404(student_id)
         
         # 🔹 통합된 권한 체크 사용
@@ -1437,7 +1332,7 @@ def approve_student(student_id):
 @admin_required
 def delete_student(student_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         student_to_delete = Student.query.get_or_404(student_id)
         
         # 🔹 통합된 권한 체크 사용
@@ -1461,7 +1356,7 @@ def delete_student(student_id):
 @admin_required
 def extend_subscription(student_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         student = Student.query.get_or_404(student_id)
         
         # 🔹 통합된 권한 체크 사용
@@ -1483,10 +1378,163 @@ def extend_subscription(student_id):
         flash(f"기간 연장 중 오류가 발생했습니다: {str(e)}", "danger")
     return redirect(url_for('manage_students'))
 
+# ----------------------------------------------------
+# 🔹 학생 일괄 처리 API (승인/연장/삭제)
+# ----------------------------------------------------
+BULK_STUDENT_MAX = 2000
+
+def load_bulk_students(current_user):
+    """요청 본문의 student_ids를 한 번의 조회로 권한 확인
+
+    반환: (허용된 학생 행 목록, 항목별 결과 dict) — 결과는 요청 순서대로 유지
+    """
+    data = request.get_json(silent=True) or {}
+    raw_ids = data.get('student_ids') or []
+    if not isinstance(raw_ids, list) or len(raw_ids) > BULK_STUDENT_MAX:
+        raise ValueError(f"student_ids는 최대 {BULK_STUDENT_MAX}개의 목록이어야 합니다.")
+    try:
+        student_ids = list(dict.fromkeys(int(i) for i in raw_ids))
+    except (TypeError, ValueError):
+        raise ValueError("student_ids에는 학생 ID(숫자)만 넣을 수 있습니다.")
+
+    rows = db.session.query(
+        Student.id, Student.user_id, Student.branch_id, Student.branch_name,
+        Student.status, Student.end_date
+    ).filter(Student.id.in_(student_ids)).all()
+    rows_by_id = {row.id: row for row in rows}
+
+    results = {}
+    allowed = []
+    for student_id in student_ids:
+        row = rows_by_id.get(student_id)
+        if row is None:
+            results[student_id] = {'id': student_id, 'result': 'not_found'}
+        elif not check_user_permission_for_student(current_user, row):
+            results[student_id] = {'id': student_id, 'result': 'forbidden'}
+        else:
+            allowed.append(row)
+    return data, student_ids, allowed, results
+
+def bulk_response(student_ids, results):
+    ordered = [results[student_id] for student_id in student_ids]
+    summary = defaultdict(int)
+    for item in ordered:
+        summary[item['result']] += 1
+    return jsonify({'success': True, 'results': ordered, 'summary': dict(summary)})
+
+def status_counter_deltas(rows, new_status=None):
+    """상태 변경/삭제되는 학생들의 지점 카운터 변화량 계산"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    status_field = {'approved': 'approved_students', 'pending': 'pending_students'}
+    for row in rows:
+        if row.status in status_field:
+            deltas[row.branch_id][status_field[row.status]] -= 1
+        if new_status is None:
+            deltas[row.branch_id]['students'] -= 1
+        elif new_status in status_field:
+            deltas[row.branch_id][status_field[new_status]] += 1
+    return deltas
+
+@app.route('/admin/students/bulk/approve', methods=['POST'])
+@admin_required
+def bulk_approve_students():
+    """여러 학생을 한 번에 승인"""
+    try:
+        _, student_ids, allowed, results = load_bulk_students(g.current_user)
+        to_approve = [row for row in allowed if row.status != 'approved']
+        for row in allowed:
+            results[row.id] = {'id': row.id, 'result': 'approved' if row.status != 'approved' else 'already_approved'}
+        
+        if to_approve:
+            Student.query.filter(Student.id.in_([row.id for row in to_approve])).update(
+                {Student.status: 'approved'}, synchronize_session=False
+            )
+            branch_counters.apply_deltas(db.session, status_counter_deltas(to_approve, 'approved'))
+            db.session.commit()
+        return bulk_response(student_ids, results)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'일괄 승인 중 오류가 발생했습니다: {str(e)}'}), 500
+
+@app.route('/admin/students/bulk/extend', methods=['POST'])
+@admin_required
+def bulk_extend_subscriptions():
+    """여러 학생의 수강 기간을 한 번에 연장"""
+    try:
+        data, student_ids, allowed, results = load_bulk_students(g.current_user)
+        months_to_extend = int(data.get('months', 1))
+        if months_to_extend < 1:
+            raise ValueError("연장 개월 수는 1 이상이어야 합니다.")
+        
+        to_extend = [row for row in allowed if row.end_date]
+        for row in allowed:
+            if row.end_date:
+                new_end = row.end_date + relativedelta(months=months_to_extend)
+                results[row.id] = {'id': row.id, 'result': 'extended', 'end_date': new_end.strftime('%Y-%m-%d')}
+            else:
+                results[row.id] = {'id': row.id, 'result': 'no_end_date'}
+        
+        if to_extend:
+            # 종료일별 새 종료일을 CASE로 묶어 UPDATE 한 번에 처리
+            new_end_dates = {row.end_date: row.end_date + relativedelta(months=months_to_extend) for row in to_extend}
+            Student.query.filter(Student.id.in_([row.id for row in to_extend])).update({
+                Student.end_date: case(new_end_dates, value=Student.end_date),
+                Student.extension_count: func.coalesce(Student.extension_count, 0) + 1
+            }, synchronize_session=False)
+            db.session.commit()
+        return bulk_response(student_ids, results)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'일괄 연장 중 오류가 발생했습니다: {str(e)}'}), 500
+
+@app.route('/admin/students/bulk/delete', methods=['POST'])
+@admin_required
+def bulk_delete_students():
+    """여러 학생과 연결된 사용자 계정(및 학생의 배차 기록)을 한 번에 삭제"""
+    try:
+        _, student_ids, allowed, results = load_bulk_students(g.current_user)
+        for row in allowed:
+            results[row.id] = {'id': row.id, 'result': 'deleted'}
+        
+        if allowed:
+            allowed_ids = [row.id for row in allowed]
+            # 🔹 학생의 배차 기록도 같은 트랜잭션에서 삭제 (학생 없는 배차가 남거나 FK 오류로 전체가 실패하지 않도록)
+            dispatch_query = DispatchResult.query.filter(DispatchResult.student_id.in_(allowed_ids))
+            per_route = dispatch_query.with_entities(
+                DispatchResult.vehicle_id, DispatchResult.dispatch_date, func.count(DispatchResult.id)
+            ).group_by(DispatchResult.vehicle_id, DispatchResult.dispatch_date).all()
+            if per_route:
+                dispatch_query.delete(synchronize_session=False)
+                route_payloads.invalidate(db.session, [(vehicle_id, day) for vehicle_id, day, _ in per_route])
+                per_vehicle = defaultdict(int)
+                for vehicle_id, _, count in per_route:
+                    per_vehicle[vehicle_id] -= count
+                branch_counters.apply_vehicle_deltas(db.session, 'dispatches', per_vehicle)
+                for day in sorted({day for _, day, _ in per_route}):
+                    day_routes = [(vehicle_id, count) for vehicle_id, d, count in per_route if d == day]
+                    dispatch_events.queue_event(db.session, 'deleted', {
+                        'dispatch_date': day.strftime('%Y-%m-%d'),
+                        'deleted_count': sum(count for _, count in day_routes)
+                    }, [vehicle_id for vehicle_id, _ in day_routes])
+            Student.query.filter(Student.id.in_(allowed_ids)).delete(synchronize_session=False)
+            User.query.filter(User.id.in_([row.user_id for row in allowed])).delete(synchronize_session=False)
+            branch_counters.apply_deltas(db.session, status_counter_deltas(allowed))
+            db.session.commit()
+        return bulk_response(student_ids, results)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'일괄 삭제 중 오류가 발생했습니다: {str(e)}'}), 500
+
 @app.route('/admin/classes', methods=['GET', 'POST'])
 @admin_required
 def manage_classes():
-    current_user = User.query.get(session['user_id'])
+    current_user = g.current_user
     
     if request.method == 'POST':
         try:
@@ -1556,7 +1604,7 @@ def manage_classes():
 @admin_required
 def delete_class(class_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         class_to_delete = Class.query.get_or_404(class_id)
         
         # 🔹 권한 체크: 마스터이거나 해당 지점의 클래스만 삭제 가능
@@ -1589,74 +1637,62 @@ def delete_class(class_id):
 @login_required
 def get_classes_by_branch(branch_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
-        print(f"🔍 클래스 조회 요청 - 사용자: {current_user.name if current_user else 'None'}, 지점ID: {branch_id}")
+        log.debug('classes_by_branch.request', role=current_user.role, branch_id=branch_id)
         
         # 🔹 회원가입 중인 학생은 모든 지점 클래스 조회 가능하도록 우선 허용
         if current_user.role == 'student' or not hasattr(current_user, 'role'):
-            print("📋 회원가입 모드: 모든 지점 클래스 조회 허용")
             classes = Class.query.filter_by(branch_id=branch_id).all()
         elif current_user.role == 'master':
-            print("📋 마스터 모드: 모든 지점 클래스 조회")
             classes = Class.query.filter_by(branch_id=branch_id).all()
         elif current_user.role == 'admin':
-            print(f"📋 관리자 모드: 지점 권한 체크 ({current_user.branch_id} vs {branch_id})")
             if current_user.branch_id != branch_id:
-                print("❌ 권한 없음")
+                log.warning('classes_by_branch.forbidden', user_branch_id=current_user.branch_id, branch_id=branch_id)
                 return jsonify({'error': '권한이 없습니다.'}), 403
             classes = Class.query.filter_by(branch_id=branch_id).all()
         else:
-            print("❌ 알 수 없는 역할")
+            log.warning('classes_by_branch.forbidden', role=current_user.role, branch_id=branch_id)
             return jsonify({'error': '권한이 없습니다.'}), 403
         
-        print(f"📊 조회된 클래스 수: {len(classes)}")
-        for cls in classes:
-            print(f"  - {cls.name} (ID: {cls.id})")
+        log.debug('classes_by_branch.result', branch_id=branch_id, count=len(classes))
             
         class_list = [{'id': c.id, 'name': c.name} for c in classes]
         return jsonify(class_list)
     except Exception as e:
-        print(f"❌ 클래스 조회 오류: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception('classes_by_branch.error', '클래스 조회 오류: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/class_info/<int:class_id>')
 @login_required
 def get_class_info(class_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         class_item = Class.query.get_or_404(class_id)
         
-        print(f"🔍 클래스 정보 요청 - 클래스ID: {class_id}, 사용자: {current_user.name if current_user else 'None'}")
+        log.debug('class_info.request', role=current_user.role, class_id=class_id)
         
         # 🔹 회원가입 중인 학생은 모든 클래스 정보 조회 가능하도록 우선 허용
         if current_user.role == 'student' or not hasattr(current_user, 'role'):
-            print("📋 회원가입 모드: 모든 클래스 정보 조회 허용")
             pass
         elif current_user.role == 'master':
-            print("📋 마스터 모드: 모든 클래스 정보 조회")
             pass
         elif current_user.role == 'admin':
-            print(f"📋 관리자 모드: 지점 권한 체크 ({current_user.branch_id} vs {class_item.branch_id})")
             if current_user.branch_id != class_item.branch_id:
-                print("❌ 권한 없음")
+                log.warning('class_info.forbidden', user_branch_id=current_user.branch_id, class_id=class_id)
                 return jsonify({'error': '권한이 없습니다.'}), 403
         else:
-            print("❌ 알 수 없는 역할")
+            log.warning('class_info.forbidden', role=current_user.role, class_id=class_id)
             return jsonify({'error': '권한이 없습니다.'}), 403
             
         time_slots = sorted([slot.time for slot in class_item.time_slots])
         durations = sorted([int(d.strip()) for d in class_item.durations.split(',') if d.strip()]) if class_item.durations else []
         
-        print(f"📊 클래스 정보: 시간대 {len(time_slots)}개, 기간 옵션 {len(durations)}개")
+        log.debug('class_info.result', class_id=class_id, time_slots=len(time_slots), durations=len(durations))
         
         return jsonify({'time_slots': time_slots, 'durations': durations})
     except Exception as e:
-        print(f"❌ 클래스 정보 조회 오류: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception('class_info.error', '클래스 정보 조회 오류: %s', e)
         return jsonify({'error': str(e)}), 500
 
 # 🔹 추가: 회원가입 전용 API (로그인 불필요)
@@ -1664,32 +1700,28 @@ def get_class_info(class_id):
 def get_public_classes_by_branch(branch_id):
     """회원가입 시 사용하는 공개 API (로그인 불필요)"""
     try:
-        print(f"🔍 공개 클래스 조회 요청 - 지점ID: {branch_id}")
-        
         classes = Class.query.filter_by(branch_id=branch_id).all()
-        print(f"📊 조회된 클래스 수: {len(classes)}")
+        log.debug('public_classes_by_branch.result', branch_id=branch_id, count=len(classes))
         
         class_list = [{'id': c.id, 'name': c.name} for c in classes]
         return jsonify(class_list)
     except Exception as e:
-        print(f"❌ 공개 클래스 조회 오류: {str(e)}")
+        log.exception('public_classes_by_branch.error', '공개 클래스 조회 오류: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/public/class_info/<int:class_id>')
 def get_public_class_info(class_id):
     """회원가입 시 사용하는 공개 API (로그인 불필요)"""
     try:
-        print(f"🔍 공개 클래스 정보 요청 - 클래스ID: {class_id}")
-        
         class_item = Class.query.get_or_404(class_id)
         time_slots = sorted([slot.time for slot in class_item.time_slots])
         durations = sorted([int(d.strip()) for d in class_item.durations.split(',') if d.strip()]) if class_item.durations else []
         
-        print(f"📊 클래스 정보: 시간대 {len(time_slots)}개, 기간 옵션 {len(durations)}개")
+        log.debug('public_class_info.result', class_id=class_id, time_slots=len(time_slots), durations=len(durations))
         
         return jsonify({'time_slots': time_slots, 'durations': durations})
     except Exception as e:
-        print(f"❌ 공개 클래스 정보 조회 오류: {str(e)}")
+        log.exception('public_class_info.error', '공개 클래스 정보 조회 오류: %s', e)
         return jsonify({'error': str(e)}), 500
 
 # app.py에 추가할 API 라우트들 (기존 API 라우트들 아래에 추가하세요)
@@ -1699,23 +1731,20 @@ def get_public_class_info(class_id):
 def get_branch_stats():
     """지점별 학생 분포 통계"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         if current_user.role == 'master':
-            # 마스터는 모든 지점 통계
-            branches = Branch.query.all()
-            stats = []
-            for branch in branches:
-                student_count = Student.query.filter_by(branch_id=branch.id).count()
-                if student_count > 0:  # 학생이 있는 지점만 포함
-                    stats.append({
-                        'name': branch.name,
-                        'count': student_count
-                    })
+            # 마스터는 모든 지점 통계 (학생이 있는 지점만 포함)
+            rows = db.session.query(Branch.name, BranchCounter.students).join(
+                BranchCounter, BranchCounter.branch_id == Branch.id
+            ).filter(BranchCounter.students > 0).order_by(Branch.id).all()
+            stats = [{'name': name, 'count': count} for name, count in rows]
         else:
             # 일반 관리자는 자신의 지점만
             if current_user.managed_branch:
-                student_count = Student.query.filter_by(branch_id=current_user.branch_id).count()
+                student_count = branch_counters.counter_dict(
+                    branch_counters.get_counters(current_user.branch_id)
+                )['students']
                 stats = [{
                     'name': current_user.managed_branch.name,
                     'count': student_count
@@ -1739,7 +1768,7 @@ def get_branch_stats():
 def get_monthly_stats():
     """월별 신규 가입 통계"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         today = date.today()
         
         months_data = []
@@ -1777,6 +1806,24 @@ def get_monthly_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def new_students_by_branch(start, end=None):
+    """기간 내 신규 가입 학생 수를 지점별로 한 번에 집계"""
+    query = db.session.query(Student.branch_id, func.count(User.id)).join(
+        User, Student.user_id == User.id
+    ).filter(
+        User.role == 'student',
+        User.created_at >= start
+    )
+    if end is not None:
+        query = query.filter(User.created_at <= end)
+    return dict(query.group_by(Student.branch_id).all())
+
+def branch_counter_rows():
+    """지점과 카운터를 한 번에 조회 (지점당 한 행)"""
+    return db.session.query(Branch, BranchCounter).outerjoin(
+        BranchCounter, BranchCounter.branch_id == Branch.id
+    ).order_by(Branch.id).all()
+
 @app.route('/api/detailed-branch-stats')
 @master_required
 def get_detailed_branch_stats():
@@ -1785,40 +1832,24 @@ def get_detailed_branch_stats():
         today = date.today()
         first_day_of_month = today.replace(day=1)
         
-        branches = Branch.query.all()
+        new_this_month_by_branch = new_students_by_branch(first_day_of_month)
         detailed_stats = []
         
-        for branch in branches:
-            # 지점별 학생 수
-            branch_students = Student.query.filter_by(branch_id=branch.id).all()
-            total_students = len(branch_students)
+        for branch, counter in branch_counter_rows():
+            counts = branch_counters.counter_dict(counter)
+            total_students = counts['students']
             
             if total_students == 0:
                 continue  # 학생이 없는 지점은 제외
             
-            # 승인 상태별 분류
-            approved = len([s for s in branch_students if s.status == 'approved'])
-            pending = len([s for s in branch_students if s.status == 'pending'])
-            
-            # 차량 및 클래스 수
-            vehicles = Vehicle.query.filter_by(branch_id=branch.id).count()
-            classes = Class.query.filter_by(branch_id=branch.id).count()
-            
-            # 이번 달 신규 학생
-            new_this_month = User.query.join(Student).filter(
-                User.role == 'student',
-                Student.branch_id == branch.id,
-                User.created_at >= first_day_of_month
-            ).count()
-            
             detailed_stats.append({
                 'name': branch.name,
                 'total_students': total_students,
-                'approved': approved,
-                'pending': pending,
-                'vehicles': vehicles,
-                'classes': classes,
-                'new_this_month': new_this_month
+                'approved': counts['approved_students'],
+                'pending': counts['pending_students'],
+                'vehicles': counts['vehicles'],
+                'classes': counts['classes'],
+                'new_this_month': new_this_month_by_branch.get(branch.id, 0)
             })
         
         # 학생 수 기준으로 정렬
@@ -1833,7 +1864,7 @@ def get_detailed_branch_stats():
 def get_class_distribution():
     """클래스별 학생 분포 통계"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         if current_user.role == 'master':
             # 마스터는 모든 클래스
@@ -1867,7 +1898,7 @@ def get_class_distribution():
 def get_time_distribution():
     """시간대별 학생 분포 통계"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         if current_user.role == 'master':
             # 마스터는 모든 시간대
@@ -2010,31 +2041,19 @@ def get_performance_ranking():
         last_month_start = (this_month_start - relativedelta(months=1))
         last_month_end = this_month_start - relativedelta(days=1)
         
-        branches = Branch.query.all()
+        new_this_month_by_branch = new_students_by_branch(this_month_start)
+        new_last_month_by_branch = new_students_by_branch(last_month_start, last_month_end)
         rankings = []
         
-        for branch in branches:
-            # 기본 통계
-            total_students = Student.query.filter_by(branch_id=branch.id).count()
-            approved_students = Student.query.filter_by(
-                branch_id=branch.id, 
-                status='approved'
-            ).count()
+        for branch, counter in branch_counter_rows():
+            # 기본 통계 (지점 카운터)
+            counts = branch_counters.counter_dict(counter)
+            total_students = counts['students']
+            approved_students = counts['approved_students']
             
-            # 이번 달 신규
-            new_this_month = User.query.join(Student).filter(
-                User.role == 'student',
-                Student.branch_id == branch.id,
-                User.created_at >= this_month_start
-            ).count()
-            
-            # 지난 달 신규
-            new_last_month = User.query.join(Student).filter(
-                User.role == 'student',
-                Student.branch_id == branch.id,
-                User.created_at >= last_month_start,
-                User.created_at <= last_month_end
-            ).count()
+            # 이번 달 / 지난 달 신규
+            new_this_month = new_this_month_by_branch.get(branch.id, 0)
+            new_last_month = new_last_month_by_branch.get(branch.id, 0)
             
             # 성장률 계산
             growth_rate = 0
@@ -2049,7 +2068,7 @@ def get_performance_ranking():
                 approval_rate = (approved_students / total_students) * 100
             
             # 차량 활용률
-            branch_vehicles = Vehicle.query.filter_by(branch_id=branch.id).count()
+            branch_vehicles = counts['vehicles']
             vehicle_utilization = 0
             if branch_vehicles > 0:
                 vehicle_utilization = min((approved_students / (branch_vehicles * 15)) * 100, 100)  # 차량당 15명 기준
@@ -2181,7 +2200,7 @@ def get_monthly_comparison_detailed():
             }
         })
     except Exception as e:
-        print(f"❌ 월별 비교 API 오류: {str(e)}")
+        log.exception('monthly_comparison.error', '월별 비교 API 오류: %s', e)
         return jsonify({'error': str(e)}), 500
     
 @app.route('/api/master/class-popularity-trends')
@@ -2226,16 +2245,14 @@ def get_class_popularity_trends():
 @admin_required
 def manage_vehicles():
     try:
-        current_user = User.query.get(session['user_id'])
-        
-        print(f"🔍 차량 관리 - 현재 사용자: {current_user.name} ({current_user.role})")
+        current_user = g.current_user
         
         if current_user.role == 'master':
             # 마스터는 모든 차량과 기사 조회 가능
             all_vehicles = Vehicle.query.order_by(Vehicle.id).all()
             all_drivers = User.query.filter_by(role='driver').all()
             all_branches = Branch.query.all()
-            print(f"📋 마스터 모드: 전체 차량 {len(all_vehicles)}대, 전체 기사 {len(all_drivers)}명")
+            log.debug('manage_vehicles.loaded', mode='master', vehicles=len(all_vehicles), drivers=len(all_drivers))
         else:
             # 일반 관리자는 자신의 지점 차량과 기사만 조회
             if not current_user.branch_id:
@@ -2251,7 +2268,8 @@ def manage_vehicles():
             ).all()
                 
             all_branches = [current_user.managed_branch] if current_user.managed_branch else []
-            print(f"📋 지점 관리자 모드: 지점 차량 {len(all_vehicles)}대, 지점 기사 {len(all_drivers)}명")
+            log.debug('manage_vehicles.loaded', mode='branch', branch_id=current_user.branch_id,
+                      vehicles=len(all_vehicles), drivers=len(all_drivers))
             
         return render_template('admin/manage_vehicles.html', 
                              vehicles=all_vehicles, 
@@ -2260,13 +2278,13 @@ def manage_vehicles():
                              current_user=current_user)
     except Exception as e:
         flash(f"차량 목록 로딩 중 오류가 발생했습니다: {str(e)}", "danger")
-        print(f"❌ 차량 관리 오류: {e}")
+        log.exception('manage_vehicles.error', '차량 관리 오류: %s', e)
         return redirect(url_for('admin_dashboard'))
 @app.route('/admin/add_driver', methods=['POST'])
 @admin_required
 def add_driver():
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         form = request.form
         email = form.get('email')
         name = form.get('name')
@@ -2307,7 +2325,7 @@ def add_driver():
             role='driver',
             driver_branch_id=int(branch_id)  # 🔹 추가
         )
-        new_driver.set_password(password)
+        new_driver.password_hash = password_hashing.hash_password(password)
         db.session.add(new_driver)
         db.session.commit()
         
@@ -2325,7 +2343,7 @@ def add_driver():
 @admin_required
 def add_vehicle():
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         form = request.form
         vehicle_number = form.get('vehicle_number')
         capacity = form.get('capacity')
@@ -2364,7 +2382,7 @@ def add_vehicle():
 @admin_required
 def assign_driver(vehicle_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         
         # 권한 체크: 마스터이거나 해당 지점의 차량만 기사 배정 가능
@@ -2397,7 +2415,7 @@ def assign_driver(vehicle_id):
 @admin_required
 def delete_vehicle(vehicle_id):
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         vehicle_to_delete = Vehicle.query.get_or_404(vehicle_id)
         
         # 권한 체크: 마스터이거나 해당 지점의 차량만 삭제 가능
@@ -2428,7 +2446,7 @@ def delete_vehicle(vehicle_id):
 @admin_required
 def manage_dispatch():
    try:
-       current_user = User.query.get(session['user_id'])
+       current_user = g.current_user
        
        # 지점별 클래스 목록 조회
        if current_user.role == 'master':
@@ -2438,7 +2456,7 @@ def manage_dispatch():
            available_vehicles = Vehicle.query.all()
        else:
            available_classes = Class.query.filter_by(branch_id=current_user.branch_id).all()
-           branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=current_user.branch_id).all()]
+           branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
            dispatch_dates = db.session.query(DispatchResult.dispatch_date).filter(
                DispatchResult.vehicle_id.in_(branch_vehicle_ids)
            ).distinct().order_by(DispatchResult.dispatch_date.desc()).all()
@@ -2468,7 +2486,7 @@ def manage_dispatch():
 def create_regular_dispatch():
     """정규 배차 생성 - 실제 DispatchResult 데이터 저장"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         data = request.get_json()
         
         class_name = data.get('class_name')
@@ -2482,7 +2500,7 @@ def create_regular_dispatch():
         except:
             dispatch_date = date.today()
         
-        print(f"🚐 정규배차 생성 시작: {class_name}, {dispatch_date}")
+        log.info('dispatch_regular.start', class_name=class_name, dispatch_date=dispatch_date)
         
         # 해당 날짜에 이미 배차가 있는지 확인
         existing_dispatch = DispatchResult.query.filter_by(
@@ -2531,10 +2549,11 @@ def create_regular_dispatch():
                 'error': '기사가 배정된 가용 차량이 없습니다.'
             })
         
-        print(f"📊 대상 학생: {len(students)}명, 가용 차량: {len(available_vehicles)}대")
+        log.debug('dispatch_regular.targets', students=len(students), vehicles=len(available_vehicles))
         
         # 실제 배차 데이터 생성 및 저장
         created_count = 0
+        used_vehicle_ids = set()
         
         for i, student in enumerate(students):
             # 차량 순환 배정
@@ -2552,17 +2571,23 @@ def create_regular_dispatch():
                 
                 db.session.add(new_dispatch)
                 created_count += 1
+                used_vehicle_ids.add(vehicle.id)
                 
-                print(f"  ✅ {student.user.name} → {vehicle.license_plate}")
+                log.debug('dispatch_regular.assigned', student_id=student.id, vehicle_id=vehicle.id)
                 
             except Exception as e:
-                print(f"  ❌ 배차 생성 실패: {e}")
+                log.warning('dispatch_regular.row_failed', '배차 생성 실패: %s', e, student_id=student.id)
                 continue
         
-        # 데이터베이스 커밋
+        # 데이터베이스 커밋 (성공하면 열려 있는 배차 화면에 알림)
         try:
+            dispatch_events.queue_event(db.session, 'plan_created', {
+                'dispatch_date': dispatch_date.strftime('%Y-%m-%d'),
+                'class_name': class_name,
+                'created_count': created_count
+            }, used_vehicle_ids)
             db.session.commit()
-            print(f"🎉 총 {created_count}건의 배차가 생성되었습니다!")
+            log.info('dispatch_regular.created', created_count=created_count)
             
             return jsonify({
                 'success': True,
@@ -2575,14 +2600,14 @@ def create_regular_dispatch():
             
         except Exception as e:
             db.session.rollback()
-            print(f"❌ 데이터베이스 저장 실패: {e}")
+            log.error('dispatch_regular.commit_failed', '데이터베이스 저장 실패: %s', e)
             return jsonify({
                 'success': False,
                 'error': f'배차 저장 중 오류가 발생했습니다: {str(e)}'
             })
         
     except Exception as e:
-        print(f"❌ 배차 생성 전체 오류: {e}")
+        log.exception('dispatch_regular.error', '배차 생성 전체 오류: %s', e)
         return jsonify({
             'success': False,
             'error': f'배차 생성 중 오류가 발생했습니다: {str(e)}'
@@ -2594,7 +2619,7 @@ def create_regular_dispatch():
 def get_dispatch_list():
     """날짜별 배차 목록 조회 - 수정된 버전"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         # 날짜 파라미터 가져오기
         date_param = request.args.get('date')
@@ -2606,25 +2631,27 @@ def get_dispatch_list():
         else:
             target_date = date.today()
         
-        print(f"📅 배차 목록 조회: {target_date}")
+        log.debug('dispatch_list.start', target_date=target_date)
         
-        # 권한별 배차 조회
+        # 권한별 배차 조회 (학생/차량/기사는 함께 로드 — 행마다 추가 조회 없음)
+        dispatch_query = DispatchResult.query.options(
+            joinedload(DispatchResult.student).joinedload(Student.user),
+            joinedload(DispatchResult.vehicle).joinedload(Vehicle.driver)
+        )
         if current_user.role == 'master':
-            dispatches = DispatchResult.query.filter_by(
-                dispatch_date=target_date
+            dispatches = dispatch_query.filter(
+                DispatchResult.dispatch_date == target_date
             ).all()
         else:
             # 해당 지점의 차량들만 조회
-            branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(
-                branch_id=current_user.branch_id
-            ).all()]
+            branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
             
-            dispatches = DispatchResult.query.filter(
+            dispatches = dispatch_query.filter(
                 DispatchResult.dispatch_date == target_date,
                 DispatchResult.vehicle_id.in_(branch_vehicle_ids)
             ).all()
         
-        print(f"📋 조회된 배차 수: {len(dispatches)}")
+        log.debug('dispatch_list.fetched', count=len(dispatches))
         
         # 응답 데이터 구성
         dispatch_list = []
@@ -2641,13 +2668,11 @@ def get_dispatch_list():
                 if dispatch.student and dispatch.student.class_name:
                     student_class = dispatch.student.class_name
                 if dispatch.vehicle:
-                    vehicle_name = dispatch.vehicle.license_plate or dispatch.vehicle.vehicle_number
-                    if dispatch.vehicle.driver_id:
-                        driver = User.query.get(dispatch.vehicle.driver_id)
-                        if driver:
-                            driver_name = driver.name
+                    vehicle_name = dispatch.vehicle.vehicle_number
+                    if dispatch.vehicle.driver:
+                        driver_name = dispatch.vehicle.driver.name
             except Exception as e:
-                print(f"⚠️ 데이터 추출 오류: {e}")
+                log.warning('dispatch_list.row_error', '데이터 추출 오류: %s', e, dispatch_id=dispatch.id)
                 continue
             
             dispatch_data = {
@@ -2658,6 +2683,7 @@ def get_dispatch_list():
                 'driver_name': driver_name,
                 'stop_order': dispatch.stop_order or 0,
                 'status': getattr(dispatch, 'status', 'assigned'),
+                'vehicle_id': dispatch.vehicle_id,
                 'dispatch_date': target_date.strftime('%Y-%m-%d')
             }
             
@@ -2666,7 +2692,7 @@ def get_dispatch_list():
         # 정렬 (stop_order 기준)
         dispatch_list.sort(key=lambda x: x['stop_order'])
         
-        print(f"✅ 반환할 배차 데이터: {len(dispatch_list)}건")
+        log.debug('dispatch_list.done', count=len(dispatch_list))
         
         return jsonify({
             'success': True,
@@ -2676,7 +2702,7 @@ def get_dispatch_list():
         })
         
     except Exception as e:
-        print(f"❌ 배차 목록 조회 오류: {e}")
+        log.exception('dispatch_list.error', '배차 목록 조회 오류: %s', e)
         return jsonify({
             'success': False,
             'error': f'배차 목록 조회 중 오류가 발생했습니다: {str(e)}',
@@ -2688,40 +2714,191 @@ def get_dispatch_list():
 @app.route('/api/dispatch/update-status', methods=['POST'])
 @admin_required
 def update_dispatch_status():
-    """배차 상태 업데이트"""
+    """배차 상태 업데이트 ({"dispatch_id", "status"}) — 권한 내 차량의 배차만, 정의된 상태값만"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         dispatch_id = data.get('dispatch_id')
         new_status = data.get('status')
+        if new_status not in DispatchResult.STATUS_TEXT:
+            return jsonify({'success': False, 'error': f'알 수 없는 상태입니다: {new_status}'}), 400
+        
+        dispatch = db.session.get(DispatchResult, dispatch_id) if isinstance(dispatch_id, int) else None
+        if dispatch is None:
+            return jsonify({'success': False, 'error': '배차를 찾을 수 없습니다.'}), 404
+        if not g.branch_scope.is_master and dispatch.vehicle_id not in g.branch_scope.vehicle_ids:
+            return jsonify({'success': False, 'error': '다른 지점의 배차는 변경할 수 없습니다.'}), 403
+        
+        dispatch.status = new_status
+        dispatch_events.queue_event(db.session, 'status', {
+            'dispatch_id': dispatch.id,
+            'student_id': dispatch.student_id,
+            'vehicle_id': dispatch.vehicle_id,
+            'dispatch_date': dispatch.dispatch_date.strftime('%Y-%m-%d'),
+            'status': dispatch.status,
+            'status_text': dispatch.status_text
+        }, [dispatch.vehicle_id])
+        db.session.commit()
         
-        dispatch = DispatchResult.query.get_or_404(dispatch_id)
-        
-        # status 필드가 있다면 업데이트
-        if hasattr(dispatch, 'status'):
-            dispatch.status = new_status
-            db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': f'배차 상태가 {new_status}로 변경되었습니다.'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'status 필드가 존재하지 않습니다.'
-            })
-            
+        return jsonify({
+            'success': True,
+            'message': f'배차 상태가 {dispatch.status_text}(으)로 변경되었습니다.'
+        })
     except Exception as e:
+        db.session.rollback()
+        log.exception('dispatch_status.error', '배차 상태 변경 오류: %s', e)
         return jsonify({
             'success': False,
             'error': f'상태 업데이트 실패: {str(e)}'
-        })
+        }), 500
+    
+BULK_DISPATCH_MAX = 2000
+
+@app.route('/api/dispatch/bulk-status', methods=['POST'])
+@admin_required
+def bulk_update_dispatch_status():
+    """여러 배차 상태를 한 번에 변경 ({"items": [{dispatch_id, status, notes}, ...]}) — 항목별 결과 반환"""
+    try:
+        data = request.get_json(silent=True) or {}
+        raw_items = data.get('items') or []
+        if not isinstance(raw_items, list) or len(raw_items) > BULK_DISPATCH_MAX:
+            raise ValueError(f"items는 최대 {BULK_DISPATCH_MAX}개의 목록이어야 합니다.")
+        # 같은 배차가 여러 번 오면 마지막 항목 기준
+        items = {}
+        for item in raw_items:
+            if not isinstance(item, dict):
+                raise ValueError("items의 각 항목은 {dispatch_id, status, notes} 형식이어야 합니다.")
+            try:
+                items[int(item.get('dispatch_id'))] = item
+            except (TypeError, ValueError):
+                raise ValueError("dispatch_id는 숫자여야 합니다.")
+        dispatch_ids = list(items)
+        
+        # 지점 범위 확인은 차량과 조인한 조회 한 번으로
+        rows = db.session.query(
+            DispatchResult.id, DispatchResult.vehicle_id, DispatchResult.dispatch_date,
+            DispatchResult.status, DispatchResult.notes, Vehicle.branch_id
+        ).join(Vehicle, Vehicle.id == DispatchResult.vehicle_id) \
+            .filter(DispatchResult.id.in_(dispatch_ids)).all()
+        rows_by_id = {row.id: row for row in rows}
+        
+        scope = g.branch_scope
+        results = {}
+        by_status = defaultdict(list)
+        note_updates = []
+        changes = []
+        for dispatch_id in dispatch_ids:
+            item = items[dispatch_id]
+            row = rows_by_id.get(dispatch_id)
+            new_status = item.get('status')
+            notes = item.get('notes')
+            if row is None:
+                results[dispatch_id] = {'id': dispatch_id, 'result': 'not_found'}
+            elif not scope.is_master and row.branch_id != scope.branch_id:
+                results[dispatch_id] = {'id': dispatch_id, 'result': 'forbidden'}
+            elif new_status not in DispatchResult.STATUS_TEXT:
+                results[dispatch_id] = {'id': dispatch_id, 'result': 'invalid_status'}
+            elif new_status == row.status and (notes is None or notes == row.notes):
+                results[dispatch_id] = {'id': dispatch_id, 'result': 'unchanged'}
+            else:
+                results[dispatch_id] = {'id': dispatch_id, 'result': 'updated', 'status': new_status}
+                if new_status != row.status:
+                    by_status[new_status].append(dispatch_id)
+                if notes is not None and notes != row.notes:
+                    note_updates.append({'id': dispatch_id, 'notes': notes})
+                changes.append(((row.vehicle_id, row.dispatch_date), {'id': dispatch_id, 'status': new_status}))
+        
+        if changes:
+            now = datetime.utcnow()
+            # 바뀔 상태별로 UPDATE 한 문장씩, 특이사항은 기본키 기준 executemany 한 번
+            for new_status, ids in by_status.items():
+                DispatchResult.query.filter(DispatchResult.id.in_(ids)).update(
+                    {DispatchResult.status: new_status, DispatchResult.updated_at: now}, synchronize_session=False
+                )
+            if note_updates:
+                db.session.execute(update(DispatchResult), [dict(u, updated_at=now) for u in note_updates])
+            route_payloads.invalidate(db.session, {key for key, _ in changes})
+            dispatch_events.queue_status_changes(db.session, changes)
+            db.session.commit()
+        return bulk_response(dispatch_ids, results)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception('dispatch_bulk_status.error', '배차 상태 일괄 변경 오류: %s', e)
+        return jsonify({'success': False, 'error': f'상태 일괄 변경 중 오류가 발생했습니다: {str(e)}'}), 500
+
+def run_transition_response(action, target_date, vehicle_ids):
+    """운행 일괄 전환 실행 + 커밋 후 JSON 응답"""
+    changed = dispatch_runs.transition(db.session, action, target_date, vehicle_ids)
+    updated = sum(changed.values())
+    if not updated:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'{dispatch_runs.ACTION_TEXT[action]}할 수 있는 배차가 없습니다.'
+        }), 409
+    db.session.commit()
+    return jsonify({
+        'success': True,
+        'action': action,
+        'date': target_date.strftime('%Y-%m-%d'),
+        'updated': updated,
+        'vehicles': [{'vehicle_id': v, 'updated': count} for v, count in changed.items()]
+    })
+
+@app.route('/api/dispatch/<int:dispatch_id>/<any(start, complete, cancel):action>', methods=['POST'])
+@admin_required
+def transition_dispatch_run(dispatch_id, action):
+    """배차 한 건이 속한 운행(같은 날 같은 차량 전체)을 시작/완료/취소"""
+    try:
+        row = db.session.query(DispatchResult.vehicle_id, DispatchResult.dispatch_date) \
+            .filter(DispatchResult.id == dispatch_id).first()
+        if row is None:
+            return jsonify({'success': False, 'error': '배차를 찾을 수 없습니다.'}), 404
+        if not g.branch_scope.is_master and row.vehicle_id not in g.branch_scope.vehicle_ids:
+            return jsonify({'success': False, 'error': '다른 지점의 배차는 변경할 수 없습니다.'}), 403
+        return run_transition_response(action, row.dispatch_date, [row.vehicle_id])
+    except Exception as e:
+        db.session.rollback()
+        log.exception('dispatch_run.error', '운행 상태 변경 오류: %s', e, dispatch_id=dispatch_id, action=action)
+        return jsonify({'success': False, 'error': f'운행 상태 변경 실패: {str(e)}'}), 500
+
+@app.route('/api/dispatch/runs/<any(start, complete, cancel):action>', methods=['POST'])
+@admin_required
+def transition_dispatch_runs(action):
+    """여러 차량 운행을 한 번에 시작/완료/취소 ({"date": "YYYY-MM-DD", "vehicle_ids": [...]}, 생략 시 지점 전체)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        date_str = data.get('date')
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+        
+        scope = g.branch_scope
+        vehicle_ids = data.get('vehicle_ids')
+        if vehicle_ids is None:
+            query = db.session.query(DispatchResult.vehicle_id).filter(
+                DispatchResult.dispatch_date == target_date
+            ).distinct()
+            if not scope.is_master:
+                query = query.filter(DispatchResult.vehicle_id.in_(scope.vehicle_ids))
+            vehicle_ids = [v for (v,) in query]
+        else:
+            if not isinstance(vehicle_ids, list) or not all(isinstance(v, int) for v in vehicle_ids):
+                return jsonify({'success': False, 'error': 'vehicle_ids 는 차량 ID 목록이어야 합니다.'}), 400
+            if not scope.is_master and not set(vehicle_ids) <= scope.vehicle_ids:
+                return jsonify({'success': False, 'error': '다른 지점의 차량이 포함되어 있습니다.'}), 403
+        return run_transition_response(action, target_date, vehicle_ids)
+    except ValueError:
+        return jsonify({'success': False, 'error': '잘못된 날짜 형식입니다.'}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception('dispatch_runs.error', '운행 상태 일괄 변경 오류: %s', e, action=action)
+        return jsonify({'success': False, 'error': f'운행 상태 변경 실패: {str(e)}'}), 500
     
 @app.route('/api/dispatch/special', methods=['POST'])
 @admin_required
 def create_special_dispatch():
    try:
-       current_user = User.query.get(session['user_id'])
+       current_user = g.current_user
        data = request.get_json()
        
        special_type = data.get('type')
@@ -2763,41 +2940,137 @@ def create_special_dispatch():
        return jsonify({'success': False, 'error': str(e)})
 
    
+# 🔹 학생 필드 프로젝션: ORM 객체 생성 없이 필요한 컬럼만 User와 조인해서 조회
+STUDENT_PROJECTION_FIELDS = {
+    'id': Student.id,
+    'name': User.name,
+    'email': User.email,
+    'phone': User.phone,
+    'emergency_contact': Student.emergency_contact,
+    'address': Student.address,
+    'branch_id': Student.branch_id,
+    'branch_name': Student.branch_name,
+    'class_name': Student.class_name,
+    'time_slot': Student.time_slot,
+    'status': Student.status,
+    'start_date': Student.start_date,
+    'end_date': Student.end_date,
+    'created_at': User.created_at,
+}
+STUDENT_PICKER_FIELDS = ['id', 'name', 'phone', 'address', 'class_name', 'time_slot']
+STUDENT_PROJECTION_MAX_LIMIT = 5000
+STUDENT_PROJECTION_CHUNK = 500
+
+
+def student_projection_query(scope, field_names, class_name=None, status='approved', after_id=None):
+    """지점 범위가 적용된 학생 컬럼 프로젝션 쿼리 (첫 컬럼은 항상 커서용 Student.id)"""
+    columns = [Student.id.label('_cursor')]
+    columns += [STUDENT_PROJECTION_FIELDS[name].label(name) for name in field_names]
+
+    query = db.session.query(*columns).select_from(Student).join(User, Student.user_id == User.id)
+    if not scope.is_master:
+        query = query.filter(Student.branch_id == scope.branch_id)
+    if class_name is not None:
+        query = query.filter(Student.class_name == class_name)
+    if status:
+        query = query.filter(Student.status == status)
+    if after_id is not None:
+        query = query.filter(Student.id > after_id)
+    return query.order_by(Student.id)
+
+
+def student_projection_row(row, field_names):
+    """프로젝션 결과 한 행을 JSON 직렬화 가능한 dict로 변환"""
+    item = {}
+    for name in field_names:
+        value = getattr(row, name)
+        item[name] = value.isoformat() if isinstance(value, date) else value
+    return item
+
+
+@app.route('/api/students/projection')
+@admin_required
+def get_student_projection():
+    """학생 필드 프로젝션 API (fields=, cursor= 페이징, 스트리밍 응답)"""
+    fields_param = request.args.get('fields')
+    field_names = [f.strip() for f in fields_param.split(',') if f.strip()] if fields_param else STUDENT_PICKER_FIELDS
+    unknown = [f for f in field_names if f not in STUDENT_PROJECTION_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'error': f"알 수 없는 필드: {', '.join(unknown)}"}), 400
+
+    try:
+        limit = min(max(int(request.args.get('limit', STUDENT_PROJECTION_CHUNK)), 1), STUDENT_PROJECTION_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        after_id = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit/cursor는 숫자로 입력해주세요.'}), 400
+
+    query = student_projection_query(
+        g.branch_scope,
+        field_names,
+        class_name=request.args.get('class_name'),
+        status=request.args.get('status', 'approved'),
+        after_id=after_id
+    ).limit(limit + 1)
+
+    def generate():
+        yield '{"success": true, "students": ['
+        count = 0
+        last_id = None
+        has_more = False
+        for row in query.yield_per(STUDENT_PROJECTION_CHUNK):
+            if count == limit:
+                has_more = True
+                break
+            yield (',' if count else '') + json.dumps(student_projection_row(row, field_names), ensure_ascii=False)
+            count += 1
+            last_id = row._cursor
+        next_cursor = last_id if has_more else None
+        yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+   
 @app.route('/api/students/by-class')
 @admin_required
 def get_students_by_class():
    try:
-       current_user = User.query.get(session['user_id'])
        class_name = request.args.get('class_name')
        
-       if current_user.role == 'master':
-           students = Student.query.filter(
-               Student.class_name == class_name,
-               Student.status == 'approved'
-           ).all()
-       else:
-           students = Student.query.filter(
-               Student.class_name == class_name,
-               Student.branch_id == current_user.branch_id,
-               Student.status == 'approved'
-           ).all()
-       
-       student_data = []
-       for s in students:
-           student_data.append({
-               'id': s.id,
-               'name': s.user.name,
-               'phone': s.user.phone,
-               'address': s.address,
-               'class_name': s.class_name,
-               'time_slot': s.time_slot
-           })
+       # 🔹 필요한 6개 컬럼만 조회 (Student/User ORM 객체 생성 없음)
+       rows = student_projection_query(g.branch_scope, STUDENT_PICKER_FIELDS, class_name=class_name or '')
+       student_data = [student_projection_row(row, STUDENT_PICKER_FIELDS) for row in rows]
            
        return jsonify({'success': True, 'students': student_data})
        
    except Exception as e:
        return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/dispatch/stream')
+@login_required
+def dispatch_event_stream():
+    """배차 변경 실시간 스트림 (SSE): 마스터=전체, 관리자=자기 지점, 기사=자기 차량"""
+    current_user = g.current_user
+    if current_user.role == 'master':
+        sub_args = {}
+    elif current_user.role == 'admin':
+        sub_args = {'branch_id': current_user.branch_id}
+    elif current_user.role == 'driver' and current_user.vehicle:
+        sub_args = {'vehicle_id': current_user.vehicle.id}
+    else:
+        return jsonify({'success': False, 'error': '배차 알림을 받을 권한이 없습니다.'}), 403
+    
+    # 연결이 오래 유지되므로 DB 커넥션은 바로 반납 (스트림은 DB 를 사용하지 않음)
+    db.session.remove()
+    
+    sub = dispatch_events.broker.subscribe(**sub_args)
+    heartbeat = app.config['DISPATCH_STREAM_HEARTBEAT']
+    return app.response_class(
+        dispatch_events.stream(sub, heartbeat),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # 권한 체크 함수
 def check_dispatch_permission(user, dispatch_id=None):
    """배차 관련 권한 체크"""
@@ -2814,11 +3087,11 @@ def check_dispatch_permission(user, dispatch_id=None):
 def get_dispatch_history():
     """배차 이력 조회 API - 개선 버전"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         from_date = request.args.get('from_date')
         to_date = request.args.get('to_date')
         
-        print(f"📊 배차 이력 API 호출: {from_date} ~ {to_date}")  # 디버그 로그
+        log.debug('dispatch_history.request', from_date=from_date, to_date=to_date)
         
         # 날짜 파싱
         if from_date:
@@ -2832,9 +3105,8 @@ def get_dispatch_history():
         if current_user.role == 'master':
             query = DispatchResult.query
         else:
-            branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=current_user.branch_id).all()]
+            branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
             if not branch_vehicle_ids:
-                print("⚠️ 지점에 차량이 없음")
                 return jsonify({'success': True, 'history': [], 'total_records': 0})
             query = DispatchResult.query.filter(DispatchResult.vehicle_id.in_(branch_vehicle_ids))
         
@@ -2846,10 +3118,9 @@ def get_dispatch_history():
             
         # 배차 결과 조회
         dispatches = query.order_by(DispatchResult.dispatch_date.desc()).all()
-        print(f"📋 조회된 배차 수: {len(dispatches)}")  # 디버그 로그
+        log.debug('dispatch_history.loaded', count=len(dispatches))
         
         if not dispatches:
-            print("📝 배차 데이터가 없음 - 빈 결과 반환")
             return jsonify({'success': True, 'history': [], 'total_records': 0})
         
         # 날짜별 그룹화
@@ -2884,7 +3155,7 @@ def get_dispatch_history():
                             class_stats['클래스 미지정'] += 1
                             
                     except Exception as e:
-                        print(f"⚠️ 클래스명 추출 오류: {e}")
+                        log.warning('dispatch_history.class_name_failed', '클래스명 추출 오류: %s', e, dispatch_id=dispatch.id)
                         class_stats['오류'] += 1
                 
                 history_data.append({
@@ -2897,11 +3168,9 @@ def get_dispatch_history():
                 })
                 
             except Exception as e:
-                print(f"⚠️ 날짜별 데이터 처리 오류: {e}")
+                log.exception('dispatch_history.day_failed', '날짜별 데이터 처리 오류: %s', e, date=dispatch_date.isoformat())
                 continue
         
-        print(f"✅ 최종 반환 데이터 수: {len(history_data)}")
-        
         return jsonify({
             'success': True,
             'history': history_data,
@@ -2909,20 +3178,20 @@ def get_dispatch_history():
         })
         
     except Exception as e:
-        print(f"❌ 배차 이력 API 오류: {e}")
+        log.exception('dispatch_history.error', '배차 이력 API 오류: %s', e)
         return jsonify({'success': False, 'error': str(e)})
     
 @app.route('/admin/dispatch/<a_date>')
 @login_required
 def view_dispatch_by_date(a_date):
    try:
-       current_user = User.query.get(session['user_id'])
+       current_user = g.current_user
        target_date = datetime.strptime(a_date, '%Y-%m-%d').date()
        
        if current_user.role == 'master':
            results = DispatchResult.query.filter_by(dispatch_date=target_date).all()
        else:
-           branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=current_user.branch_id).all()]
+           branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
            results = DispatchResult.query.filter(
                DispatchResult.dispatch_date == target_date,
                DispatchResult.vehicle_id.in_(branch_vehicle_ids)
@@ -2954,7 +3223,7 @@ def view_dispatch_by_date(a_date):
 def create_sample_dispatch_data():
     """샘플 배차 데이터 생성"""
     try:
-        current_user = User.query.get(session['user_id'])
+        current_user = g.current_user
         
         # 기존 학생과 차량 조회
         students = Student.query.filter_by(status='approved').limit(5).all()
@@ -3006,13 +3275,13 @@ def create_sample_dispatch_data():
 @admin_required
 def create_dispatch_for_today():
    try:
-       current_user = User.query.get(session['user_id'])
+       current_user = g.current_user
        today = date.today()
        
        if current_user.role == 'master':
            existing_dispatch = DispatchResult.query.filter_by(dispatch_date=today).first()
        else:
-           branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=current_user.branch_id).all()]
+           branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
            existing_dispatch = DispatchResult.query.filter(
                DispatchResult.dispatch_date == today,
                DispatchResult.vehicle_id.in_(branch_vehicle_ids)
@@ -3037,6 +3306,7 @@ def create_dispatch_for_today():
            return redirect(url_for('manage_dispatch'))
            
        total_dispatched_count = 0
+       used_vehicle_ids = set()
        
        for class_item in all_classes:
            for time_slot in class_item.time_slots:
@@ -3074,6 +3344,7 @@ def create_dispatch_for_today():
                            )
                            db.session.add(new_dispatch)
                            total_dispatched_count += 1
+                           used_vehicle_ids.add(vehicle.id)
                            student_idx += 1
                        else:
                            break
@@ -3081,6 +3352,10 @@ def create_dispatch_for_today():
                        break
        
        if total_dispatched_count > 0:
+           dispatch_events.queue_event(db.session, 'plan_created', {
+               'dispatch_date': today.strftime('%Y-%m-%d'),
+               'created_count': total_dispatched_count
+           }, used_vehicle_ids)
            db.session.commit()
            flash(f"오늘의 전체 배차가 완료되었습니다. (총 {total_dispatched_count}건)", "success")
        else:
@@ -3096,22 +3371,33 @@ def create_dispatch_for_today():
 @admin_required
 def delete_dispatch_by_date(a_date):
    try:
-       current_user = User.query.get(session['user_id'])
+       current_user = g.current_user
        target_date = datetime.strptime(a_date, '%Y-%m-%d').date()
        
        if current_user.role == 'master':
-           deleted_count = DispatchResult.query.filter_by(dispatch_date=target_date).count()
-           DispatchResult.query.filter_by(dispatch_date=target_date).delete()
+           target_query = DispatchResult.query.filter_by(dispatch_date=target_date)
        else:
-           branch_vehicle_ids = [v.id for v in Vehicle.query.filter_by(branch_id=current_user.branch_id).all()]
-           deleted_count = DispatchResult.query.filter(
-               DispatchResult.dispatch_date == target_date,
-               DispatchResult.vehicle_id.in_(branch_vehicle_ids)
-           ).count()
-           DispatchResult.query.filter(
+           branch_vehicle_ids = list(g.branch_scope.vehicle_ids)
+           target_query = DispatchResult.query.filter(
                DispatchResult.dispatch_date == target_date,
                DispatchResult.vehicle_id.in_(branch_vehicle_ids)
-           ).delete()
+           )
+       
+       # 🔹 일괄 삭제는 ORM 이벤트가 없으므로 차량별 건수를 지점 카운터에 직접 반영
+       per_vehicle = dict(target_query.with_entities(
+           DispatchResult.vehicle_id, func.count(DispatchResult.id)
+       ).group_by(DispatchResult.vehicle_id).all())
+       deleted_count = sum(per_vehicle.values())
+       target_query.delete(synchronize_session=False)
+       route_payloads.invalidate(db.session, [(vehicle_id, target_date) for vehicle_id in per_vehicle])
+       branch_counters.apply_vehicle_deltas(
+           db.session, 'dispatches', {vehicle_id: -count for vehicle_id, count in per_vehicle.items()}
+       )
+       if deleted_count:
+           dispatch_events.queue_event(db.session, 'deleted', {
+               'dispatch_date': target_date.strftime('%Y-%m-%d'),
+               'deleted_count': deleted_count
+           }, per_vehicle.keys())
            
        db.session.commit()
        flash(f"{a_date}의 배차 정보 {deleted_count}건이 삭제되었습니다.", "success")
@@ -3129,7 +3415,7 @@ def delete_dispatch_by_date(a_date):
 @login_required
 def driver_view_route():
     try:
-        driver_user = User.query.get(session['user_id'])
+        driver_user = g.current_user
         
         if driver_user.role != 'driver':
             flash("기사 계정으로만 접근할 수 있습니다.", "danger")
@@ -3137,33 +3423,19 @@ def driver_view_route():
             
         if not driver_user.vehicle:
             return render_template('driver/view_route.html', 
-                                  students_data=json.dumps([]),
-                                  route_info=None, driver=driver_user)
+                                  route_payload=None,
+                                  route_version=None, driver=driver_user)
         
         today = date.today()
         vehicle = driver_user.vehicle
         
-        todays_route = DispatchResult.query.filter_by(
-            dispatch_date=today,
-            vehicle_id=vehicle.id
-        ).order_by(DispatchResult.stop_order).all()
-        
-        # 🔥 실제 학생 데이터 변환
-        students_data = []
-        for i, dispatch in enumerate(todays_route):
-            students_data.append({
-                'id': dispatch.student.id,
-                'name': dispatch.student.user.name,
-                'address': dispatch.student.address or '주소 미등록',
-                'phone': dispatch.student.user.phone or '연락처 미등록',
-                'status': 'pending',
-                'estimatedTime': f'{(i+1)*7}분',
-                'distance': f'{(i+1)*1.8:.1f}km'
-            })
+        # 🔹 배차 생성/변경 시 미리 만들어 둔 경로 JSON 을 기본키 조회 한 번으로 사용 (utils/route_payloads.py)
+        route_version, route_payload = route_payloads.get(vehicle.id, today)
         
         return render_template('driver/view_route.html', 
-                              students_data=json.dumps(students_data, ensure_ascii=False),
-                              route_info=todays_route, 
+                              route_payload=route_payload,
+                              route_version=route_version,
+                              rendered_at=int(datetime.now().timestamp() * 1000),
                               driver=driver_user, 
                               vehicle=vehicle, 
                               today_str=today.strftime('%Y-%m-%d'))
@@ -3172,6 +3444,248 @@ def driver_view_route():
         flash(f"운행 정보 조회 중 오류가 발생했습니다: {str(e)}", "danger")
         return redirect(url_for('login'))
 
+@app.route('/api/driver/route')
+@login_required
+def get_driver_route_bundle():
+    """기사 경로 오프라인 번들 (?since=<가진 버전>&date=YYYY-MM-DD) — 처음엔 전체, 이후엔 바뀐 정류장만"""
+    current_user = g.current_user
+    if not current_user or current_user.role != 'driver' or not current_user.vehicle:
+        return jsonify({'success': False, 'error': '차량이 배정된 기사만 조회할 수 있습니다.'}), 403
+    
+    try:
+        date_str = request.args.get('date')
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+    except ValueError:
+        return jsonify({'success': False, 'error': '잘못된 날짜 형식입니다.'}), 400
+    
+    result = route_payloads.bundle(current_user.vehicle.id, target_date, since=request.args.get('since') or None)
+    response = jsonify({'success': True, **result})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/driver/stop-events', methods=['POST'])
+@login_required
+def ingest_stop_events():
+    """기사 앱 정류장 이벤트 묶음 수신 ({"events": [{key, dispatch_id, type, ts}, ...]}) — 반영은 일괄 처리"""
+    current_user = g.current_user
+    if not current_user or current_user.role != 'driver' or not current_user.vehicle:
+        return jsonify({'success': False, 'error': '차량이 배정된 기사만 보낼 수 있습니다.'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list):
+        return jsonify({'success': False, 'error': 'events 목록이 필요합니다.'}), 400
+    
+    try:
+        pending, confirmed, rejected = stop_events.buffer.add(current_user.vehicle.id, events)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # 기사 앱은 confirmed(저장 완료)/rejected 만 보관함에서 지우고, pending 은 잠시 후 다시 보내 저장 여부를 확인
+    return jsonify({
+        'success': True,
+        'pending': pending,
+        'confirmed': confirmed,
+        'rejected': rejected
+    }), 202
+
+@app.route('/api/dispatch/delay', methods=['POST'])
+@login_required
+def report_dispatch_delay():
+    """차량 지연 알림 ({"minutes": 10, "reason": "...", "vehicle_id": 관리자만, "date": 생략 시 오늘}) — 대기열 INSERT 만"""
+    current_user = g.current_user
+    data = request.get_json(silent=True) or {}
+    try:
+        minutes = int(data.get('minutes'))
+        if not 1 <= minutes <= 180:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': '지연 시간(분)은 1~180 사이의 숫자여야 합니다.'}), 400
+    reason = (data.get('reason') or '').strip()[:100] or None
+    
+    if current_user.role == 'driver':
+        if not current_user.vehicle:
+            return jsonify({'success': False, 'error': '배정된 차량이 없습니다.'}), 403
+        vehicle_id = current_user.vehicle.id
+    elif current_user.role in ('master', 'admin'):
+        vehicle_id = data.get('vehicle_id')
+        if not g.branch_scope.is_master and vehicle_id not in g.branch_scope.vehicle_ids:
+            return jsonify({'success': False, 'error': '다른 지점의 차량입니다.'}), 403
+    else:
+        return jsonify({'success': False, 'error': '권한이 없습니다.'}), 403
+    
+    try:
+        date_str = data.get('date')
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+    except ValueError:
+        return jsonify({'success': False, 'error': '잘못된 날짜 형식입니다.'}), 400
+    
+    # 아직 끝나지 않은 정류장의 보호자에게만
+    dispatch_ids = [d for (d,) in db.session.query(DispatchResult.id).filter(
+        DispatchResult.vehicle_id == vehicle_id,
+        DispatchResult.dispatch_date == target_date,
+        DispatchResult.status.in_(('assigned', 'pending', 'in_progress'))
+    )]
+    queued = notifications.enqueue(db.session, 'delay', dispatch_ids, minutes=minutes, reason=reason)
+    db.session.commit()
+    log.info('dispatch_delay.reported', vehicle_id=vehicle_id, minutes=minutes, students=len(dispatch_ids))
+    return jsonify({'success': True, 'students': len(dispatch_ids), 'queued': queued}), 202
+
+@app.route('/api/dispatch/export-sheet', methods=['POST'])
+@admin_required
+def export_dispatch_sheet():
+    """하루 배차를 경로 시트에 저장 예약 ({"date": 생략 시 오늘, "vehicle_ids": 생략 시 권한 내 전체}) — 대기열 INSERT 만"""
+    data = request.get_json(silent=True) or {}
+    try:
+        date_str = data.get('date')
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+    except ValueError:
+        return jsonify({'success': False, 'error': '잘못된 날짜 형식입니다.'}), 400
+    
+    scope = g.branch_scope
+    vehicle_ids = data.get('vehicle_ids')
+    if vehicle_ids is not None:
+        if not isinstance(vehicle_ids, list):
+            return jsonify({'success': False, 'error': 'vehicle_ids 는 목록이어야 합니다.'}), 400
+        if not scope.is_master and not set(vehicle_ids) <= set(scope.vehicle_ids):
+            return jsonify({'success': False, 'error': '다른 지점의 차량이 포함되어 있습니다.'}), 403
+    elif not scope.is_master:
+        vehicle_ids = list(scope.vehicle_ids)
+    
+    try:
+        rows, queued = gsheet_route.export_day(db.session, target_date, vehicle_ids)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception('dispatch_sheet_export.error', '경로 시트 저장 예약 오류: %s', e)
+        return jsonify({'success': False, 'error': f'경로 시트 저장 중 오류가 발생했습니다: {str(e)}'})
+    log.info('dispatch_sheet_export.queued', date=target_date.isoformat(), rows=rows, queued=queued)
+    return jsonify({'success': True, 'rows': rows, 'queued': queued}), 202
+
+@app.route('/driver/route-sw.js')
+def driver_route_service_worker():
+    """기사 경로 화면용 서비스 워커 (/driver/ 범위에서 동작하도록 이 경로로 제공)"""
+    response = send_file(os.path.join(app.static_folder, 'js', 'route-sw.js'), mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/driver/positions', methods=['POST'])
+@login_required
+def ingest_driver_positions():
+    """기사 앱 GPS 좌표 묶음 수신 ({"positions": [{ts, lat, lon, speed}, ...]}) — 저장은 일괄 처리"""
+    current_user = g.current_user
+    if not current_user or current_user.role != 'driver' or not current_user.vehicle:
+        return jsonify({'success': False, 'error': '차량이 배정된 기사만 위치를 보낼 수 있습니다.'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    positions = data.get('positions')
+    if not isinstance(positions, list):
+        return jsonify({'success': False, 'error': 'positions 목록이 필요합니다.'}), 400
+    
+    try:
+        accepted, dropped = gps_ingest.buffer.add(current_user.vehicle.id, positions)
+        if accepted:
+            live_positions.store.update(current_user.vehicle.id, accepted[-1])
+            geofence.processor.submit(current_user.vehicle.id, accepted)
+    except gps_ingest.RateLimited as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+        return response, 429
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'accepted': len(accepted), 'dropped': dropped})
+
+@app.route('/api/vehicles/live')
+@admin_required
+def get_live_vehicles():
+    """지점 차량별 마지막 위치 + 오늘 운행 진행률 (메모리 저장소에서 조회)"""
+    try:
+        scope = g.branch_scope
+        vehicles = live_positions.store.snapshot(None if scope.is_master else scope.branch_id)
+        return jsonify({
+            'success': True,
+            'vehicles': vehicles,
+            'generated_at': datetime.utcnow().isoformat() + 'Z'
+        })
+    except Exception as e:
+        log.exception('live_vehicles.error', '실시간 차량 위치 조회 오류: %s', e)
+        return jsonify({'success': False, 'error': f'실시간 위치 조회 중 오류가 발생했습니다: {str(e)}'})
+
+@app.route('/api/students/<int:student_id>/location', methods=['PUT'])
+@admin_required
+def set_student_location(student_id):
+    """학생 탑승 위치 좌표 등록 ({"lat", "lon"}) — 지오펜스 픽업 감지에 사용, 현재 주소와 함께 저장"""
+    try:
+        student = Student.query.get_or_404(student_id)
+        if not check_user_permission_for_student(g.current_user, student):
+            return jsonify({'success': False, 'error': '해당 학생에 대한 권한이 없습니다.'}), 403
+        lat, lon = geofence.parse_point(request.get_json(silent=True) or {})
+        
+        location = db.session.get(StudentLocation, student.id) or StudentLocation(student_id=student.id)
+        location.lat, location.lon = lat, lon
+        location.address = student.address
+        location.updated_at = datetime.utcnow()
+        db.session.add(location)
+        db.session.commit()
+        return jsonify({'success': True, 'lat': lat, 'lon': lon})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception('student_location.error', '학생 좌표 저장 오류: %s', e)
+        return jsonify({'success': False, 'error': f'좌표 저장 중 오류가 발생했습니다: {str(e)}'})
+
+@app.route('/api/branches/<int:branch_id>/location', methods=['PUT'])
+@admin_required
+def set_branch_location(branch_id):
+    """지점(학원) 좌표 등록 ({"lat", "lon"}) — 지오펜스 도착 감지에 사용"""
+    try:
+        branch = Branch.query.get_or_404(branch_id)
+        if not check_user_permission_for_branch(g.current_user, branch.id):
+            return jsonify({'success': False, 'error': '해당 지점에 대한 권한이 없습니다.'}), 403
+        lat, lon = geofence.parse_point(request.get_json(silent=True) or {})
+        
+        location = db.session.get(BranchLocation, branch.id) or BranchLocation(branch_id=branch.id)
+        location.lat, location.lon = lat, lon
+        location.updated_at = datetime.utcnow()
+        db.session.add(location)
+        db.session.commit()
+        return jsonify({'success': True, 'lat': lat, 'lon': lon})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception('branch_location.error', '지점 좌표 저장 오류: %s', e)
+        return jsonify({'success': False, 'error': f'좌표 저장 중 오류가 발생했습니다: {str(e)}'})
+
+@app.cli.command('verify-branch-counters')
+def verify_branch_counters_command():
+    """지점 카운터를 실제 데이터와 비교해 복구 (cron 등에서 실행)"""
+    drift = branch_counters.verify(repair=True)
+    print(f"지점 카운터 검증 완료: 불일치 {len(drift)}건 복구")
+
+@app.cli.command('import-worker')
+def import_worker_command():
+    """회원명부 업로드 작업 워커 (별도 프로세스로 실행, IMPORT_WORKER_EMBEDDED=false 와 함께 사용)"""
+    print("📥 업로드 작업 워커 시작")
+    import_jobs.worker_loop(app)
+
+@app.cli.command('notify-worker')
+def notify_worker_command():
+    """보호자 알림 발송 워커 (별도 프로세스로 실행, NOTIFY_WORKER_EMBEDDED=false 와 함께 사용)"""
+    print("📨 알림 발송 워커 시작")
+    notifications.worker_loop(app)
+
+@app.cli.command('sheets-worker')
+def sheets_worker_command():
+    """구글 시트 쓰기 워커 (별도 프로세스로 실행, SHEETS_WORKER_EMBEDDED=false 와 함께 사용)"""
+    print("📊 시트 쓰기 워커 시작")
+    sheet_sync.worker_loop(app)
+
 # 🔹 app.py의 에러 핸들러 수정
 @app.errorhandler(404)
 def not_found_error(error):
@@ -3183,12 +3697,37 @@ def internal_error(error):
     return "<h1>500 - 서버 내부 오류</h1>", 500
 
 # 애플리케이션 초기화
-with app.app_context():
-    try:
-        db.create_all()
-        setup_initial_accounts()
-    except Exception as e:
-        print(f"애플리케이션 초기화 오류: {e}")
+def initialize_app():
+    """테이블/초기 계정 준비 후 백그라운드 스레드 시작 (웹 프로세스에서 한 번)"""
+    with app.app_context():
+        try:
+            db.create_all()
+            setup_initial_accounts()
+            # 🔹 기존 데이터에 맞춰 지점 카운터를 채우고 주기 검증 시작 (다른 프로세스가 방금 검증했으면 건너뜀)
+            branch_counters.verify_if_due(app.config['BRANCH_COUNTER_VERIFY_INTERVAL'])
+            branch_counters.start_periodic_verifier(app, app.config['BRANCH_COUNTER_VERIFY_INTERVAL'])
+            # 🔹 회원명부 업로드 작업 워커 (별도 워커 프로세스를 쓰면 IMPORT_WORKER_EMBEDDED=false)
+            import_jobs.start_embedded_worker(app)
+            # 🔹 GPS 좌표 버퍼 저장 스레드
+            gps_ingest.start_flusher(app)
+            live_positions.start_sync(app)
+            # 🔹 배차 변경 후 기사 경로 JSON 재생성 스레드
+            route_payloads.start_builder(app)
+            # 🔹 기사 앱 정류장 이벤트 일괄 반영 스레드
+            stop_events.start_flusher(app)
+            # 🔹 보호자 알림 발송 워커 (별도 워커 프로세스를 쓰면 NOTIFY_WORKER_EMBEDDED=false)
+            notifications.start_embedded_worker(app)
+            # 🔹 구글 시트 쓰기 워커 (별도 워커 프로세스를 쓰면 SHEETS_WORKER_EMBEDDED=false)
+            sheet_sync.start_embedded_worker(app)
+            # 🔹 GPS 좌표 지오펜스 감지 스레드 (픽업/도착 자동 기록)
+            geofence.start_processor(app)
+        except Exception as e:
+            log.exception('app.init_failed', '애플리케이션 초기화 오류: %s', e)
+
+
+# 🔹 비밀번호 해시 풀(spawn) 자식은 이 파일을 __mp_main__ 으로 다시 import 하므로 초기화/워커 시작을 건너뜀
+if __name__ != '__mp_main__':
+    initialize_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
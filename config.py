@@ -6,4 +6,97 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-12345'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///academy_bus.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 🔹 로깅 설정 (utils/applog.py)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+    # 라우트(endpoint)별 샘플링 비율, 예: "upload_students=0.1,get_dispatch_list=0.05"
+    LOG_SAMPLE_RATES = {
+        key.strip(): float(value)
+        for key, value in (
+            item.split('=', 1) for item in os.environ.get('LOG_SAMPLE_RATES', '').split(',') if '=' in item
+        )
+    }
+
+    # 🔹 지점 카운터 주기 검증 간격 (초, 0 이면 비활성)
+    BRANCH_COUNTER_VERIFY_INTERVAL = int(os.environ.get('BRANCH_COUNTER_VERIFY_INTERVAL', '3600'))
+
+    # 🔹 회원명부 업로드: 한 번에 검증/저장/커밋할 행 수
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+    # 업로드 파일/결과 리포트 저장 위치와 백그라운드 워커 설정 (utils/import_jobs.py)
+    IMPORT_JOB_DIR = os.environ.get('IMPORT_JOB_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'import_jobs')
+    # 별도 워커 프로세스(`flask --app app import-worker`)를 띄우면 False 로 설정
+    IMPORT_WORKER_EMBEDDED = os.environ.get('IMPORT_WORKER_EMBEDDED', 'true').lower() == 'true'
+    IMPORT_WORKER_POLL_INTERVAL = float(os.environ.get('IMPORT_WORKER_POLL_INTERVAL', '2'))
+    IMPORT_JOB_STALE_SECONDS = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', '600'))
+
+    # 🔹 배차 실시간 스트림(SSE): 변경이 없을 때 연결 유지용 ping 간격 (초)
+    DISPATCH_STREAM_HEARTBEAT = int(os.environ.get('DISPATCH_STREAM_HEARTBEAT', '15'))
+
+    # 🔹 기사 앱 GPS 수집 (utils/gps_ingest.py): 메모리에 모았다가 주기적으로 일괄 저장
+    GPS_FLUSH_INTERVAL = float(os.environ.get('GPS_FLUSH_INTERVAL', '5'))
+    GPS_FLUSH_ROWS = int(os.environ.get('GPS_FLUSH_ROWS', '2000'))  # 이만큼 쌓이면 주기와 관계없이 저장
+    GPS_BUFFER_MAX = int(os.environ.get('GPS_BUFFER_MAX', '100000'))  # DB 장애 시 보관 한도
+    GPS_MAX_BATCH = int(os.environ.get('GPS_MAX_BATCH', '500'))  # 요청 한 번에 받는 최대 좌표 수
+    # 차량별 제한: 저장할 좌표 간 최소 간격(초), 요청 간 최소 간격(초)
+    GPS_MIN_POINT_INTERVAL = float(os.environ.get('GPS_MIN_POINT_INTERVAL', '2'))
+    GPS_MIN_REQUEST_INTERVAL = float(os.environ.get('GPS_MIN_REQUEST_INTERVAL', '1'))
+
+    # 🔹 관리자 실시간 차량 위치 (utils/live_positions.py)
+    LIVE_POSITION_SYNC_INTERVAL = float(os.environ.get('LIVE_POSITION_SYNC_INTERVAL', '5'))
+    LIVE_VEHICLE_CACHE_SECONDS = int(os.environ.get('LIVE_VEHICLE_CACHE_SECONDS', '60'))
+    LIVE_PROGRESS_MAX_AGE = int(os.environ.get('LIVE_PROGRESS_MAX_AGE', '60'))
+
+    # 🔹 기사 앱 정류장 이벤트(픽업/미탑승/하차) 일괄 반영 (utils/stop_events.py)
+    STOP_EVENT_FLUSH_INTERVAL = float(os.environ.get('STOP_EVENT_FLUSH_INTERVAL', '1'))
+    STOP_EVENT_FLUSH_ROWS = int(os.environ.get('STOP_EVENT_FLUSH_ROWS', '500'))  # 이만큼 쌓이면 주기와 관계없이 반영
+    STOP_EVENT_BUFFER_MAX = int(os.environ.get('STOP_EVENT_BUFFER_MAX', '50000'))
+    STOP_EVENT_MAX_BATCH = int(os.environ.get('STOP_EVENT_MAX_BATCH', '100'))  # 요청 한 번에 받는 최대 이벤트 수
+
+    # 🔹 GPS 지오펜스로 픽업/도착 자동 기록 (utils/geofence.py), 반경은 미터
+    GEOFENCE_ENABLED = os.environ.get('GEOFENCE_ENABLED', 'true').lower() == 'true'
+    GEOFENCE_STOP_RADIUS = int(os.environ.get('GEOFENCE_STOP_RADIUS', '60'))
+    GEOFENCE_BRANCH_RADIUS = int(os.environ.get('GEOFENCE_BRANCH_RADIUS', '100'))
+    GEOFENCE_APPROACH_RADIUS = int(os.environ.get('GEOFENCE_APPROACH_RADIUS', '1500'))  # 이 안에 들어오면 "곧 도착" 알림
+    GEOFENCE_APPROACH_MINUTES = int(os.environ.get('GEOFENCE_APPROACH_MINUTES', '5'))
+    GEOFENCE_LOOKAHEAD = int(os.environ.get('GEOFENCE_LOOKAHEAD', '3'))  # 감지할 다음 정류장 수
+    GEOFENCE_REFRESH_SECONDS = int(os.environ.get('GEOFENCE_REFRESH_SECONDS', '60'))
+    GEOFENCE_REF_LAT = float(os.environ.get('GEOFENCE_REF_LAT', '37.5'))  # 격자 경도 폭 기준 위도 (운행 지역)
+
+    # 🔹 보호자 알림 발송 (utils/notifications.py)
+    # 발송기: console(로그) / file(NOTIFY_FILE_PATH 에 JSON lines) / 'module:callable' (문자 API 연동)
+    NOTIFY_SENDER = os.environ.get('NOTIFY_SENDER', 'console')
+    NOTIFY_FILE_PATH = os.environ.get('NOTIFY_FILE_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'notifications.jsonl')
+    # 별도 워커 프로세스(`flask --app app notify-worker`)를 띄우면 False 로 설정
+    NOTIFY_WORKER_EMBEDDED = os.environ.get('NOTIFY_WORKER_EMBEDDED', 'true').lower() == 'true'
+    NOTIFY_POLL_INTERVAL = float(os.environ.get('NOTIFY_POLL_INTERVAL', '2'))
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '200'))
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '5'))
+    NOTIFY_STALE_SECONDS = int(os.environ.get('NOTIFY_STALE_SECONDS', '300'))
+
+    # 🔹 구글 시트 쓰기 대기열 (utils/sheet_sync.py)
+    # 클라이언트: gspread(실제 API) / fake(메모리, 개발·테스트) / 'module:callable'
+    SHEETS_CLIENT = os.environ.get('SHEETS_CLIENT', 'gspread')
+    GOOGLE_CREDENTIALS_PATH = os.environ.get('GOOGLE_CREDENTIALS_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'credentials.json')
+    ROUTE_SHEET_URL = os.environ.get('ROUTE_SHEET_URL', '')
+    # 별도 워커 프로세스(`flask --app app sheets-worker`)를 띄우면 False 로 설정
+    # (인증 파일이 없으면 내장 워커는 경고 한 번만 남기고 시작하지 않음)
+    SHEETS_WORKER_EMBEDDED = os.environ.get('SHEETS_WORKER_EMBEDDED', 'true').lower() == 'true'
+    SHEETS_POLL_INTERVAL = float(os.environ.get('SHEETS_POLL_INTERVAL', '5'))
+    SHEETS_BATCH_SIZE = int(os.environ.get('SHEETS_BATCH_SIZE', '1000'))  # 한 번에 선점할 행 수
+    SHEETS_MAX_ATTEMPTS = int(os.environ.get('SHEETS_MAX_ATTEMPTS', '8'))
+    SHEETS_STALE_SECONDS = int(os.environ.get('SHEETS_STALE_SECONDS', '300'))
+    SHEETS_QUOTA_COOLDOWN = int(os.environ.get('SHEETS_QUOTA_COOLDOWN', '60'))  # 할당량 초과 시 쉬는 시간 (초)
+
+    # 🔹 기사 경로 오프라인 동기화: 델타 계산용으로 프로세스당 기억할 경로 버전 수 (utils/route_payloads.py)
+    ROUTE_PAYLOAD_HISTORY = int(os.environ.get('ROUTE_PAYLOAD_HISTORY', '256'))
+
+    # 🔹 회원명부 양식 캐시: 프로세스당 보관할 양식 파일 수 (utils/template_cache.py)
+    TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', '64'))
+
+    # 🔹 비밀번호 해시 프로세스 풀 크기 (0 이면 요청 프로세스에서 순차 계산)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
@@ -23,6 +23,38 @@ class Branch(db.Model):
     def __repr__(self):
         return f'<Branch {self.name}>'
 
+# 🔹 지점별 집계 카운터 (utils/branch_counters.py 의 ORM 이벤트로 유지, 주기적으로 검증)
+class BranchCounter(db.Model):
+    __tablename__ = 'branch_counters'
+
+    branch_id = db.Column(db.Integer, db.ForeignKey('branch.id'), primary_key=True)
+    students = db.Column(db.Integer, nullable=False, default=0)
+    approved_students = db.Column(db.Integer, nullable=False, default=0)
+    pending_students = db.Column(db.Integer, nullable=False, default=0)
+    vehicles = db.Column(db.Integer, nullable=False, default=0)
+    classes = db.Column(db.Integer, nullable=False, default=0)
+    admins = db.Column(db.Integer, nullable=False, default=0)
+    drivers = db.Column(db.Integer, nullable=False, default=0)
+    dispatches = db.Column(db.Integer, nullable=False, default=0)
+    verified_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    branch = db.relationship('Branch', backref=db.backref('counters', uselist=False, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<BranchCounter {self.branch_id}: students={self.students}>'
+
+# 🔹 지점별 클래스/시간대 목록 버전 (utils/template_cache.py 의 ORM 이벤트로 증가, 양식 캐시 키로 사용)
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+
+    # 지점 삭제 후에도 버전이 되돌아가지 않도록 FK 없이 유지, 0 = 전체 지점
+    branch_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.branch_id}: v{self.version}>'
+
 class User(db.Model):
     __tablename__ = 'user'
     
@@ -172,17 +204,18 @@ class DispatchResult(db.Model):
     def __repr__(self):
         return f'<DispatchResult {self.id}: {self.dispatch_date}>'
     
+    STATUS_TEXT = {
+        'assigned': '배정됨',
+        'in_progress': '운행중',
+        'completed': '완료',
+        'cancelled': '취소됨',
+        'pending': '대기중'
+    }
+    
     @property
     def status_text(self):
         """상태 텍스트 반환"""
-        status_map = {
-            'assigned': '배정됨',
-            'in_progress': '운행중',
-            'completed': '완료',
-            'cancelled': '취소됨',
-            'pending': '대기중'
-        }
-        return status_map.get(self.status, '알 수 없음')
+        return self.STATUS_TEXT.get(self.status, '알 수 없음')
     
     def to_dict(self):
         """딕셔너리 형태로 변환"""
@@ -202,4 +235,209 @@ class DispatchResult(db.Model):
             'class_name': self.student.class_name if self.student else None,
             'vehicle_name': self.vehicle.license_plate if self.vehicle else None,
             'driver_name': self.vehicle.driver.name if self.vehicle and self.vehicle.driver else None
-        }
\ No newline at end of file
+        }
+# 🔹 백그라운드 명부 업로드 작업 (utils/import_jobs.py 워커가 처리)
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    mode = db.Column(db.String(20), nullable=False, default='insert')  # insert(신규만), upsert(기존 학생 갱신 포함)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branch.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    report_path = db.Column(db.String(500), nullable=True)
+
+    total_rows = db.Column(db.Integer, nullable=True)  # 시작 시 추정치
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    unchanged_count = db.Column(db.Integer, nullable=False, default=0)
+    skipped_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # 워커가 배치마다 갱신 (중단된 작업 감지용)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref='import_jobs')
+
+    def __repr__(self):
+        return f'<ImportJob {self.id}: {self.status}>'
+
+    @property
+    def status_text(self):
+        status_map = {
+            'queued': '대기중',
+            'running': '처리중',
+            'done': '완료',
+            'failed': '실패'
+        }
+        return status_map.get(self.status, '알 수 없음')
+
+    def to_dict(self):
+        progress = None
+        if self.status == 'done':
+            progress = 100
+        elif self.total_rows:
+            progress = min(99, int(self.processed_rows * 100 / self.total_rows))
+        return {
+            'id': self.id,
+            'status': self.status,
+            'status_text': self.status_text,
+            'mode': self.mode,
+            'filename': self.filename,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'progress': progress,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'unchanged': self.unchanged_count,
+            'skipped': self.skipped_count,
+            'errors': self.error_count,
+            'error_message': self.error_message,
+            'has_report': bool(self.report_path),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# 🔹 차량 GPS 위치 기록 (추가만 하는 시계열 테이블, utils/gps_ingest.py 가 모아서 일괄 저장)
+class VehiclePosition(db.Model):
+    __tablename__ = 'vehicle_positions'
+    __table_args__ = (
+        db.Index('ix_vehicle_positions_vehicle_recorded', 'vehicle_id', 'recorded_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False)  # 기기에서 측정한 시각 (UTC)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    speed = db.Column(db.Float, nullable=True)  # m/s (기기가 제공할 때만)
+
+    def __repr__(self):
+        return f'<VehiclePosition {self.vehicle_id} @ {self.recorded_at}>'
+
+# 🔹 차량별 마지막 위치 (프로세스 간 공유용 한 줄 요약, utils/live_positions.py 가 주기적으로 동기화)
+class VehicleLatestPosition(db.Model):
+    __tablename__ = 'vehicle_latest_positions'
+
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    speed = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<VehicleLatestPosition {self.vehicle_id} @ {self.recorded_at}>'
+
+# 🔹 기사 화면용 (차량, 날짜) 경로 데이터 (utils/route_payloads.py 가 배차 변경 시 미리 생성)
+class RoutePayload(db.Model):
+    __tablename__ = 'route_payloads'
+
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    dispatch_date = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.String(40), nullable=False)  # payload 의 해시
+    payload = db.Column(db.Text, nullable=False)  # JSON (HTML 에 바로 넣을 수 있게 <, >, & 이스케이프)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RoutePayload {self.vehicle_id} {self.dispatch_date} v{self.version}>'
+
+# 🔹 기사 앱 정류장 이벤트 (픽업/미탑승/하차) — utils/stop_events.py 가 모아서 DispatchResult 에 일괄 반영
+class DispatchStopEvent(db.Model):
+    __tablename__ = 'dispatch_stop_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)  # 기사 앱이 만든 이벤트 고유 키
+    dispatch_id = db.Column(db.Integer, db.ForeignKey('dispatch_results.id', ondelete='CASCADE'), nullable=False, index=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)  # picked_up, no_show, dropped_off
+    occurred_at = db.Column(db.DateTime, nullable=False)  # 기기에서 누른 시각
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DispatchStopEvent {self.event_type} dispatch={self.dispatch_id}>'
+
+# 🔹 보호자 알림 발송 대기열 (utils/notifications.py) — 요청은 INSERT 만, 발송은 워커가 모아서 처리
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    dedup_key = db.Column(db.String(160), nullable=False, unique=True)  # 같은 알림은 한 번만 (종류:배차:수신자)
+    kind = db.Column(db.String(20), nullable=False)  # picked_up, arrived, approaching, delay
+    recipient = db.Column(db.String(40), nullable=False)  # 수신 번호
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=True)
+    dispatch_id = db.Column(db.Integer, nullable=True, index=True)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed, skipped
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), nullable=True)  # 워커 선점 표시
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.kind} → {self.recipient} ({self.status})>'
+
+# 🔹 지오펜스용 좌표 (utils/geofence.py) — 학생 탑승 위치 / 지점 위치
+class StudentLocation(db.Model):
+    __tablename__ = 'student_locations'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    address = db.Column(db.String(200))  # 좌표를 구한 주소 (학생 주소가 바뀌면 사용하지 않음)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StudentLocation {self.student_id} ({self.lat}, {self.lon})>'
+
+class BranchLocation(db.Model):
+    __tablename__ = 'branch_locations'
+
+    branch_id = db.Column(db.Integer, db.ForeignKey('branch.id', ondelete='CASCADE'), primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BranchLocation {self.branch_id} ({self.lat}, {self.lon})>'
+
+# 🔹 구글 시트 쓰기 대기열 (utils/sheet_sync.py) — 시트 API 는 워커가 묶어서 호출
+class SheetSyncOutbox(db.Model):
+    __tablename__ = 'sheet_sync_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet = db.Column(db.String(300), nullable=False)  # 스프레드시트 URL 또는 키
+    worksheet = db.Column(db.String(100), nullable=True)  # 워크시트 이름 (없으면 첫 번째 시트)
+    op = db.Column(db.String(20), nullable=False)  # append(행 추가), update(범위 수정)
+    payload = db.Column(db.Text, nullable=False)  # JSON: 행 값 목록 또는 {"range", "values"}
+    dedup_key = db.Column(db.String(160), nullable=True, unique=True)  # 같은 행을 두 번 보내지 않도록 (선택)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), nullable=True)  # 워커 선점 표시
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_sheet_sync_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<SheetSyncOutbox {self.op} → {self.worksheet or "sheet1"} ({self.status})>'
@@ -0,0 +1,60 @@
+// 기사 경로 화면 서비스 워커 (/driver/route-sw.js 로 제공, 범위: /driver/)
+// - /driver/view 페이지: 네트워크 우선, 실패(지하주차장 등 신호 없음) 시 마지막으로 받은 페이지
+// - 외부 CSS/폰트(tailwind, Google Fonts): 캐시 우선, 백그라운드 갱신
+// - 경로 데이터(/api/driver/route)는 페이지가 localStorage 에 저장하고 델타로 동기화하므로 여기서 다루지 않음
+
+const CACHE_NAME = 'driver-route-v1';
+const PAGE_PATH = '/driver/view';
+const ASSET_HOSTS = ['cdn.tailwindcss.com', 'fonts.googleapis.com', 'fonts.gstatic.com'];
+
+self.addEventListener('install', (event) => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key !== CACHE_NAME).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    try {
+        const response = await fetch(request);
+        // 로그인 페이지로 돌아간 응답은 저장하지 않음
+        if (response.ok && !response.redirected) {
+            cache.put(PAGE_PATH, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(PAGE_PATH);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+    const refresh = fetch(request)
+        .then(response => {
+            if (response.ok || response.type === 'opaque') cache.put(request, response.clone());
+            return response;
+        })
+        .catch(() => cached);
+    return cached || refresh;
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin && url.pathname === PAGE_PATH) {
+        event.respondWith(networkFirst(request));
+    } else if (ASSET_HOSTS.includes(url.hostname)) {
+        event.respondWith(cacheFirst(request));
+    }
+});
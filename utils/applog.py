@@ -0,0 +1,107 @@
+# utils/applog.py
+# 설명: print 디버깅을 대체하는 구조화 로깅 계층입니다.
+#       - 레벨: LOG_LEVEL (기본 INFO)
+#       - 라우트별 샘플링: LOG_SAMPLE_RATE / LOG_SAMPLE_RATES (DEBUG/INFO 에만 적용)
+#       - 지연 포맷팅: 메시지는 실제로 출력될 때만 '%' 포맷팅됩니다.
+
+import json
+import logging
+import random
+import sys
+from datetime import datetime
+
+from flask import g, has_request_context, request, current_app
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+ROOT_LOGGER_NAME = 'academy_bus'
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄짜리 JSON 로그 포맷"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'msg': record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredLogger:
+    """event 이름 + key=value 필드를 함께 남기는 로거"""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def is_enabled_for(self, level):
+        return self._logger.isEnabledFor(level)
+
+    @property
+    def debug_enabled(self):
+        """디버그 전용 데이터 수집 여부 판단용"""
+        return self.is_enabled_for(DEBUG) and self._sampled(DEBUG)
+
+    def _sampled(self, level):
+        """요청 단위로 한 번만 샘플링 여부를 결정 (WARNING 이상은 항상 기록)"""
+        if level >= WARNING or not has_request_context():
+            return True
+        if '_log_sampled' not in g:
+            rates = current_app.config.get('LOG_SAMPLE_RATES') or {}
+            rate = rates.get(request.endpoint, current_app.config.get('LOG_SAMPLE_RATE', 1.0))
+            g._log_sampled = rate >= 1.0 or random.random() < rate
+        return g._log_sampled
+
+    def log(self, level, event, msg='', *args, exc_info=False, **fields):
+        if not self._logger.isEnabledFor(level) or not self._sampled(level):
+            return
+        if has_request_context():
+            fields.setdefault('endpoint', request.endpoint)
+            user = g.get('current_user')
+            if user is not None:
+                fields.setdefault('user_id', user.id)
+        self._logger.log(level, msg, *args, exc_info=exc_info,
+                         extra={'event': event, 'fields': fields})
+
+    def debug(self, event, msg='', *args, **fields):
+        self.log(DEBUG, event, msg, *args, **fields)
+
+    def info(self, event, msg='', *args, **fields):
+        self.log(INFO, event, msg, *args, **fields)
+
+    def warning(self, event, msg='', *args, **fields):
+        self.log(WARNING, event, msg, *args, **fields)
+
+    def error(self, event, msg='', *args, **fields):
+        self.log(ERROR, event, msg, *args, **fields)
+
+    def exception(self, event, msg='', *args, **fields):
+        self.log(ERROR, event, msg, *args, exc_info=True, **fields)
+
+
+def get_logger(name):
+    """academy_bus 네임스페이스 아래의 구조화 로거 반환"""
+    if not name.startswith(ROOT_LOGGER_NAME):
+        name = f'{ROOT_LOGGER_NAME}.{name}'
+    return StructuredLogger(name)
+
+
+def init_app(app):
+    """앱 설정(LOG_LEVEL)에 맞춰 루트 로거와 핸들러를 한 번만 구성"""
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    root.propagate = False
+    if not any(getattr(h, '_academy_bus', False) for h in root.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        handler._academy_bus = True
+        root.addHandler(handler)
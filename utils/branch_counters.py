@@ -0,0 +1,358 @@
+# utils/branch_counters.py
+# 설명: 지점별 학생/차량/클래스/관리자/기사/배차 수를 branch_counters 테이블에 유지합니다.
+#       - Student, Vehicle, Class, User, DispatchResult 의 insert/update/delete 이벤트에서
+#         변화량(delta)을 모아 두었다가 flush 직후 지점별 UPDATE 한 번으로 반영합니다.
+#       - Query.delete()/update() 같은 일괄 작업은 이벤트가 발생하지 않으므로
+#         호출하는 쪽에서 apply_deltas()/apply_vehicle_deltas()로 직접 반영합니다.
+#       - verify()가 실제 데이터와 비교해 어긋난 값을 복구합니다 (주기 실행 / CLI).
+#         카운터 행을 먼저 잠그고 집계한 뒤 차이만큼 더하므로, 그 사이 다른 요청이 반영한 변화량을 덮어쓰지 않습니다.
+#         주기 실행은 verify_if_due()로 verified_at 을 조건부 UPDATE 해 선점한 프로세스 하나만 수행합니다.
+
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, case, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import db
+from models import Branch, BranchCounter, Student, Vehicle, Class, User, DispatchResult
+from utils import applog
+
+log = applog.get_logger('branch_counters')
+
+COUNTER_FIELDS = (
+    'students', 'approved_students', 'pending_students',
+    'vehicles', 'classes', 'admins', 'drivers', 'dispatches',
+)
+
+_DELTA_KEY = '_branch_counter_deltas'
+
+
+# ----------------------------------------------------
+# 모델별 기여 규칙: (키, 카운터 필드) 목록
+#   키는 ('branch', 지점ID) 또는 ('vehicle', 차량ID) — 배차는 차량을 통해 지점이 결정됨
+# ----------------------------------------------------
+def _student_contrib(values):
+    branch_id = values.get('branch_id')
+    if branch_id is None:
+        return []
+    result = [(('branch', branch_id), 'students')]
+    if values.get('status') == 'approved':
+        result.append((('branch', branch_id), 'approved_students'))
+    elif values.get('status') == 'pending':
+        result.append((('branch', branch_id), 'pending_students'))
+    return result
+
+
+def _vehicle_contrib(values):
+    branch_id = values.get('branch_id')
+    return [(('branch', branch_id), 'vehicles')] if branch_id is not None else []
+
+
+def _class_contrib(values):
+    branch_id = values.get('branch_id')
+    return [(('branch', branch_id), 'classes')] if branch_id is not None else []
+
+
+def _user_contrib(values):
+    role = values.get('role')
+    if role == 'admin' and values.get('branch_id') is not None:
+        return [(('branch', values['branch_id']), 'admins')]
+    if role == 'driver' and values.get('driver_branch_id') is not None:
+        return [(('branch', values['driver_branch_id']), 'drivers')]
+    return []
+
+
+def _dispatch_contrib(values):
+    vehicle_id = values.get('vehicle_id')
+    return [(('vehicle', vehicle_id), 'dispatches')] if vehicle_id is not None else []
+
+
+TRACKED_MODELS = {
+    Student: (('branch_id', 'status'), _student_contrib),
+    Vehicle: (('branch_id',), _vehicle_contrib),
+    Class: (('branch_id',), _class_contrib),
+    User: (('role', 'branch_id', 'driver_branch_id'), _user_contrib),
+    DispatchResult: (('vehicle_id',), _dispatch_contrib),
+}
+
+
+# ----------------------------------------------------
+# 이벤트 → 변화량 누적
+# ----------------------------------------------------
+def _pending(session):
+    return session.info.setdefault(_DELTA_KEY, defaultdict(Counter))
+
+
+def _values(state, attrs, old=False):
+    values = {}
+    for name in attrs:
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values[name] = history.deleted[0]
+        elif not old and history.added:
+            values[name] = history.added[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = state.dict.get(name)
+    return values
+
+
+def _record(target, contributions, sign):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    pending = _pending(session)
+    for key, field in contributions:
+        pending[key][field] += sign
+
+
+def _make_listeners(attrs, contrib):
+    def after_insert(mapper, connection, target):
+        _record(target, contrib(_values(inspect(target), attrs)), 1)
+
+    def after_delete(mapper, connection, target):
+        _record(target, contrib(_values(inspect(target), attrs, old=True)), -1)
+
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        if not any(state.attrs[name].history.has_changes() for name in attrs):
+            return
+        _record(target, contrib(_values(state, attrs, old=True)), -1)
+        _record(target, contrib(_values(state, attrs)), 1)
+
+    return after_insert, after_delete, after_update
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+for _model, (_attrs, _contrib) in TRACKED_MODELS.items():
+    _ins, _del, _upd = _make_listeners(_attrs, _contrib)
+    event.listen(_model, 'after_insert', _ins)
+    event.listen(_model, 'after_delete', _del)
+    event.listen(_model, 'after_update', _upd)
+    # 커밋 후(만료된 상태) 값을 바꿔도 이전 값이 history 에 남도록 (없으면 이전 지점/상태를 알 수 없음)
+    for _name in _attrs:
+        event.listen(getattr(_model, _name), 'set', _keep_old_value, active_history=True, retval=True)
+
+
+@event.listens_for(Vehicle, 'after_update')
+def _move_vehicle_dispatches(mapper, connection, target):
+    """차량의 지점이 바뀌면 그 차량의 배차 수를 이전 지점에서 새 지점으로 옮김
+
+    배차 변화량은 차량 키로 모였다가 반영 시점의 차량 지점에 더해지므로, 이미 반영된 배차만 여기서 옮깁니다.
+    """
+    history = inspect(target).attrs.branch_id.history
+    if not history.deleted or not history.added or history.deleted[0] is None:
+        return
+    table = DispatchResult.__table__
+    count = connection.execute(
+        select(func.count()).select_from(table).where(table.c.vehicle_id == target.id)
+    ).scalar()
+    if count:
+        _record(target, [(('branch', history.deleted[0]), 'dispatches')], -count)
+        _record(target, [(('branch', history.added[0]), 'dispatches')], count)
+
+
+@event.listens_for(Branch, 'after_insert')
+def _create_counter_row(mapper, connection, target):
+    """새 지점은 0으로 채운 카운터 행을 함께 생성"""
+    connection.execute(BranchCounter.__table__.insert().values(
+        branch_id=target.id, verified_at=datetime.utcnow(), **{f: 0 for f in COUNTER_FIELDS}
+    ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_pending(session, flush_context):
+    pending = session.info.pop(_DELTA_KEY, None)
+    if pending:
+        _apply(session.connection(), pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_DELTA_KEY, None)
+
+
+# ----------------------------------------------------
+# 변화량 반영
+# ----------------------------------------------------
+def _apply(connection, pending):
+    by_branch = defaultdict(Counter)
+    vehicle_ids = [key[1] for key in pending if key[0] == 'vehicle']
+    vehicle_branch = {}
+    if vehicle_ids:
+        vehicle_table = Vehicle.__table__
+        vehicle_branch = dict(connection.execute(
+            vehicle_table.select().with_only_columns(vehicle_table.c.id, vehicle_table.c.branch_id)
+            .where(vehicle_table.c.id.in_(vehicle_ids))
+        ).all())
+
+    for (kind, key_id), deltas in pending.items():
+        branch_id = key_id if kind == 'branch' else vehicle_branch.get(key_id)
+        if branch_id is not None:
+            by_branch[branch_id].update(deltas)
+
+    table = BranchCounter.__table__
+    for branch_id, deltas in by_branch.items():
+        values = {table.c[field]: table.c[field] + amount for field, amount in deltas.items() if amount}
+        if values:
+            connection.execute(table.update().where(table.c.branch_id == branch_id).values(values))
+
+
+def apply_deltas(session, deltas_by_branch):
+    """일괄 작업용: {지점ID: {카운터: 변화량}} 을 즉시 반영"""
+    pending = defaultdict(Counter)
+    for branch_id, deltas in deltas_by_branch.items():
+        pending[('branch', branch_id)].update(deltas)
+    _apply(session.connection(), pending)
+
+
+def apply_vehicle_deltas(session, field, deltas_by_vehicle):
+    """일괄 작업용: {차량ID: 변화량} 을 해당 차량의 지점 카운터에 즉시 반영"""
+    pending = defaultdict(Counter)
+    for vehicle_id, amount in deltas_by_vehicle.items():
+        pending[('vehicle', vehicle_id)][field] += amount
+    _apply(session.connection(), pending)
+
+
+# ----------------------------------------------------
+# 조회
+# ----------------------------------------------------
+def get_counters(branch_id):
+    """지점 카운터 한 행 (없으면 None)"""
+    return db.session.get(BranchCounter, branch_id)
+
+
+def counter_dict(counter):
+    return {field: (getattr(counter, field) if counter else 0) for field in COUNTER_FIELDS}
+
+
+# ----------------------------------------------------
+# 검증 / 복구
+# ----------------------------------------------------
+def _actual_counts():
+    """실제 테이블을 GROUP BY 로 한 번씩 집계"""
+    actual = defaultdict(Counter)
+    for branch_id in (row[0] for row in db.session.query(Branch.id)):
+        actual[branch_id]  # 데이터가 없는 지점도 0으로 포함
+
+    rows = db.session.query(
+        Student.branch_id,
+        func.count(Student.id),
+        func.sum(case((Student.status == 'approved', 1), else_=0)),
+        func.sum(case((Student.status == 'pending', 1), else_=0)),
+    ).group_by(Student.branch_id)
+    for branch_id, total, approved, pending in rows:
+        actual[branch_id].update(students=total, approved_students=approved or 0, pending_students=pending or 0)
+
+    simple_counts = [
+        ('vehicles', db.session.query(Vehicle.branch_id, func.count(Vehicle.id)).group_by(Vehicle.branch_id)),
+        ('classes', db.session.query(Class.branch_id, func.count(Class.id)).group_by(Class.branch_id)),
+        ('admins', db.session.query(User.branch_id, func.count(User.id))
+            .filter(User.role == 'admin', User.branch_id.isnot(None)).group_by(User.branch_id)),
+        ('drivers', db.session.query(User.driver_branch_id, func.count(User.id))
+            .filter(User.role == 'driver', User.driver_branch_id.isnot(None)).group_by(User.driver_branch_id)),
+        ('dispatches', db.session.query(Vehicle.branch_id, func.count(DispatchResult.id))
+            .join(Vehicle, DispatchResult.vehicle_id == Vehicle.id).group_by(Vehicle.branch_id)),
+    ]
+    for field, query in simple_counts:
+        for branch_id, count in query:
+            actual[branch_id][field] = count
+    return actual
+
+
+def verify(repair=True):
+    """카운터와 실제 집계를 비교해 어긋난 지점 목록을 반환 (repair=True 면 복구 후 커밋)
+
+    복구 시에는 카운터 행을 FOR UPDATE 로 먼저 잠가 집계 중 다른 트랜잭션의 _apply() 를 기다리게 하고,
+    절대값 대신 `필드 = 필드 + (실제 - 읽은 값)` 으로 고칩니다 (행 잠금이 없는 SQLite 에서도 그 사이 반영분 유지).
+    """
+    query = BranchCounter.query.populate_existing()
+    if repair:
+        query = query.with_for_update()
+    stored = {c.branch_id: c for c in query.all()}
+    actual = _actual_counts()
+    existing_branches = {row[0] for row in db.session.query(Branch.id)}
+    table = BranchCounter.__table__
+    drift = []
+    now = datetime.utcnow()
+
+    for branch_id in existing_branches:
+        expected = {field: actual[branch_id][field] for field in COUNTER_FIELDS}
+        counter = stored.get(branch_id)
+        current = counter_dict(counter)
+        if counter is None or current != expected:
+            drift.append({'branch_id': branch_id, 'stored': current if counter else None, 'actual': expected})
+            if repair and counter is None:
+                db.session.add(BranchCounter(branch_id=branch_id, verified_at=now, **expected))
+                continue
+        if repair:
+            values = {table.c[field]: table.c[field] + (expected[field] - current[field])
+                      for field in COUNTER_FIELDS if expected[field] != current[field]}
+            values[table.c.verified_at] = now
+            db.session.execute(table.update().where(table.c.branch_id == branch_id).values(values))
+            db.session.expire(counter)
+
+    # 삭제된 지점의 카운터 행 정리
+    for branch_id, counter in stored.items():
+        if branch_id not in existing_branches:
+            drift.append({'branch_id': branch_id, 'stored': counter_dict(counter), 'actual': None})
+            if repair:
+                db.session.delete(counter)
+
+    if repair:
+        db.session.commit()
+    for item in drift:
+        log.warning('branch_counters.drift', '지점 카운터 불일치', **item)
+    return drift
+
+
+def verify_if_due(max_age_seconds):
+    """최근 max_age_seconds 안에 (다른 프로세스가) 검증했으면 건너뜀, 아니면 verify(repair=True)
+
+    verified_at 조건부 UPDATE 로 선점하므로 여러 웹 프로세스가 동시에 깨어나도 한 곳만 검증합니다.
+    카운터 행이 없는 지점이 있으면(첫 배포 등) 항상 검증합니다.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=max_age_seconds)
+    claimed = db.session.execute(
+        update(BranchCounter)
+        .where(or_(BranchCounter.verified_at.is_(None), BranchCounter.verified_at <= cutoff))
+        .values(verified_at=now)
+    ).rowcount
+    if not claimed:
+        missing = db.session.query(Branch.id).outerjoin(BranchCounter, BranchCounter.branch_id == Branch.id) \
+            .filter(BranchCounter.branch_id.is_(None)).first()
+        if missing is None:
+            db.session.rollback()
+            log.debug('branch_counters.verify_skipped', max_age=max_age_seconds)
+            return None
+    return verify(repair=True)
+
+
+def start_periodic_verifier(app, interval_seconds):
+    """interval_seconds 마다 verify_if_due()를 실행하는 데몬 스레드 시작 (0 이하면 비활성)"""
+    if interval_seconds <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            with app.app_context():
+                try:
+                    verify_if_due(interval_seconds)
+                except Exception as e:
+                    db.session.rollback()
+                    log.exception('branch_counters.verify_failed', '카운터 검증 실패: %s', e)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='branch-counter-verifier', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,185 @@
+# utils/dispatch_events.py
+# 설명: 배차 변경(상태 변경 / 배차 생성 / 삭제)을 열려 있는 관리자·기사 화면에 SSE 로 전달하는 pub/sub 입니다.
+#       - 라우트는 queue_event() 로 세션에 이벤트를 쌓아 두고, 커밋이 성공한 뒤에만 브로커로 발행합니다 (롤백 시 폐기).
+#       - 브로커는 프로세스 내 메모리 큐: 구독자마다 Queue 하나, 발행 시 범위(지점/차량)가 맞는 구독자에게만 넣습니다.
+#         변경이 없을 때는 구독자 스레드가 Queue 에서 대기만 하므로 DB 조회나 목록 재구성이 없습니다.
+#       - 프로세스 내 브로커이므로 웹 프로세스가 하나일 때(Procfile: python app.py, 또는 gunicorn 단일 워커 + 스레드) 기준입니다.
+#       - add_listener() 로 등록한 함수는 발행 시 동기 호출됩니다 (서버 내부 캐시 무효화용).
+#       - 구독자 큐가 가득 차면 이후 이벤트 대신 resync 이벤트를 한 번 보내 화면이 목록을 새로 불러오게 합니다.
+
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import DispatchResult, Vehicle
+from utils import applog
+
+log = applog.get_logger('dispatch_events')
+
+_PENDING_KEY = '_dispatch_events'
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class DispatchEvent:
+    """발행되는 이벤트 하나 (branch_ids/vehicle_ids 로 받을 구독자를 결정)"""
+
+    __slots__ = ('id', 'type', 'data', 'branch_ids', 'vehicle_ids')
+
+    def __init__(self, event_id, event_type, data, branch_ids, vehicle_ids):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.branch_ids = frozenset(branch_ids)
+        self.vehicle_ids = frozenset(vehicle_ids)
+
+    def to_sse(self):
+        payload = json.dumps(self.data, ensure_ascii=False, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """SSE 연결 하나: branch_id/vehicle_id 가 모두 None 이면 전체(마스터)"""
+
+    def __init__(self, branch_id=None, vehicle_id=None):
+        self.branch_id = branch_id
+        self.vehicle_id = vehicle_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, evt):
+        if self.vehicle_id is not None:
+            return self.vehicle_id in evt.vehicle_ids
+        if self.branch_id is not None:
+            return self.branch_id in evt.branch_ids
+        return True
+
+    def offer(self, evt):
+        try:
+            self.queue.put_nowait(evt)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """다음 이벤트 (timeout 동안 없으면 None), 넘친 적이 있으면 'resync'"""
+        if self.overflowed:
+            self.overflowed = False
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            return 'resync'
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listeners = []
+        self._ids = itertools.count(1)
+
+    def add_listener(self, fn):
+        """fn(event) 를 발행마다 호출 (예외는 기록만 하고 무시)"""
+        self._listeners.append(fn)
+
+    def subscribe(self, branch_id=None, vehicle_id=None):
+        sub = Subscription(branch_id=branch_id, vehicle_id=vehicle_id)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type, data, branch_ids=(), vehicle_ids=()):
+        evt = DispatchEvent(next(self._ids), event_type, data, branch_ids, vehicle_ids)
+        with self._lock:
+            targets = [sub for sub in self._subscribers if sub.matches(evt)]
+        for sub in targets:
+            sub.offer(evt)
+        for fn in self._listeners:
+            try:
+                fn(evt)
+            except Exception as e:
+                log.exception('dispatch_events.listener_failed', '이벤트 리스너 오류: %s', e)
+        log.debug('dispatch_events.published', type=event_type, subscribers=len(targets))
+        return evt
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broker = Broker()
+
+
+# ----------------------------------------------------
+# 커밋 후 발행
+# ----------------------------------------------------
+def queue_event(session, event_type, data, vehicle_ids):
+    """이벤트를 세션에 쌓아 두고 커밋 성공 후 발행 (지점은 차량 기준으로 한 번에 조회)"""
+    vehicle_ids = {v for v in vehicle_ids if v is not None}
+    branch_ids = set()
+    if vehicle_ids:
+        branch_ids = {b for (b,) in session.query(Vehicle.branch_id).filter(Vehicle.id.in_(vehicle_ids)).distinct()}
+    session.info.setdefault(_PENDING_KEY, []).append((event_type, data, branch_ids, vehicle_ids))
+
+
+def queue_status_changes(session, changes):
+    """일괄 UPDATE 로 바뀐 배차들 [((차량ID, 날짜), {'id', 'status', ...})] → 날짜별 'statuses' 이벤트 하나씩"""
+    by_date = defaultdict(list)
+    vehicles = defaultdict(set)
+    for (vehicle_id, dispatch_date), state in changes:
+        by_date[dispatch_date].append({
+            'dispatch_id': state['id'],
+            'vehicle_id': vehicle_id,
+            'status': state['status'],
+            'status_text': DispatchResult.STATUS_TEXT.get(state['status'], '알 수 없음'),
+            'pickup_time': state['pickup_time'].strftime('%H:%M') if state.get('pickup_time') else None,
+            'arrival_time': state['arrival_time'].strftime('%H:%M') if state.get('arrival_time') else None,
+        })
+        vehicles[dispatch_date].add(vehicle_id)
+    for dispatch_date, items in by_date.items():
+        queue_event(session, 'statuses', {
+            'dispatch_date': dispatch_date.strftime('%Y-%m-%d'),
+            'changes': items
+        }, vehicles[dispatch_date])
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    for event_type, data, branch_ids, vehicle_ids in session.info.pop(_PENDING_KEY, ()):
+        broker.publish(event_type, data, branch_ids, vehicle_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ----------------------------------------------------
+# SSE 스트림
+# ----------------------------------------------------
+def stream(sub, heartbeat=15):
+    """구독을 SSE 텍스트로 변환하는 제너레이터 (연결이 끊기면 구독 해제)"""
+    try:
+        yield "retry: 5000\n: connected\n\n"
+        while True:
+            evt = sub.get(timeout=heartbeat)
+            if evt is None:
+                yield f": ping {int(time.time())}\n\n"
+            elif evt == 'resync':
+                yield "event: resync\ndata: {}\n\n"
+            else:
+                yield evt.to_sse()
+    finally:
+        broker.unsubscribe(sub)
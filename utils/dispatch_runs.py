@@ -0,0 +1,53 @@
+# utils/dispatch_runs.py
+# 설명: 차량 한 대의 하루 운행(그날 그 차량의 DispatchResult 전체)을 한 번에 시작/완료/취소합니다.
+#       - 차량마다 UPDATE ... WHERE vehicle_id, dispatch_date, status IN (허용 상태) 한 문장 — 학생 수와 관계없음.
+#       - 허용되지 않는 상태의 행(이미 완료/취소된 정류장 등)은 그대로 두고, 바뀐 행이 없으면 실패로 돌려줍니다.
+#       - 일괄 UPDATE 는 ORM 이벤트가 없으므로 기사 경로 JSON 무효화와 배차 변경 알림('run')을 직접 처리합니다.
+#       - 커밋은 호출하는 쪽(라우트)에서 한 번만 합니다.
+
+from datetime import datetime
+
+from models import DispatchResult
+from utils import applog, dispatch_events, route_payloads
+
+log = applog.get_logger('dispatch_runs')
+
+# 동작 → (바꿀 수 있는 현재 상태, 바뀔 상태)
+RUN_TRANSITIONS = {
+    'start': (('assigned', 'pending'), 'in_progress'),
+    'complete': (('in_progress',), 'completed'),
+    'cancel': (('assigned', 'pending', 'in_progress'), 'cancelled'),
+}
+
+ACTION_TEXT = {'start': '시작', 'complete': '완료', 'cancel': '취소'}
+
+
+def transition(session, action, dispatch_date, vehicle_ids):
+    """차량별 운행 상태 일괄 변경 → {차량ID: 바뀐 행 수} (알 수 없는 동작은 ValueError)"""
+    if action not in RUN_TRANSITIONS:
+        raise ValueError(f"알 수 없는 운행 동작입니다: {action}")
+    from_statuses, to_status = RUN_TRANSITIONS[action]
+
+    now = datetime.utcnow()
+    changed = {}
+    for vehicle_id in sorted(set(vehicle_ids)):
+        count = session.query(DispatchResult).filter(
+            DispatchResult.vehicle_id == vehicle_id,
+            DispatchResult.dispatch_date == dispatch_date,
+            DispatchResult.status.in_(from_statuses)
+        ).update({DispatchResult.status: to_status, DispatchResult.updated_at: now}, synchronize_session=False)
+        changed[vehicle_id] = count
+
+    moved = [vehicle_id for vehicle_id, count in changed.items() if count]
+    if moved:
+        route_payloads.invalidate(session, [(vehicle_id, dispatch_date) for vehicle_id in moved])
+        dispatch_events.queue_event(session, 'run', {
+            'dispatch_date': dispatch_date.strftime('%Y-%m-%d'),
+            'action': action,
+            'from_statuses': list(from_statuses),
+            'status': to_status,
+            'status_text': DispatchResult.STATUS_TEXT.get(to_status, '알 수 없음'),
+            'vehicles': {vehicle_id: changed[vehicle_id] for vehicle_id in moved}
+        }, moved)
+    log.info('dispatch_runs.transition', action=action, vehicles=len(changed), rows=sum(changed.values()))
+    return changed
@@ -0,0 +1,366 @@
+# utils/exports.py
+# 설명: 회원 명부 / 배차 이력 내보내기 (xlsx, csv, parquet)
+#       - 행은 yield_per 쿼리에서 한 줄씩 받아 바로 기록하므로 행 수와 관계없이 메모리가 일정합니다.
+#       - xlsx: openpyxl write_only 워크북은 시트 XML 을 임시 파일에 쓰고 save() 시점에 zip 으로 묶기 때문에,
+#         워크북 전체를 임시 파일에 저장한 뒤 청크 단위로 응답합니다. 메모리는 일정하지만 첫 바이트는
+#         워크북 생성이 끝난 뒤에 나가므로, 큰 내보내기에서 바로 받기 시작하려면 csv 를 사용합니다.
+#       - csv: 행을 버퍼에 모아 CHUNK_SIZE 마다 바로 전송 (엑셀 호환 UTF-8 BOM 포함).
+#       - parquet: pyarrow(선택 설치)로 PARQUET_BATCH_ROWS 행씩 row group 을 기록 (zstd 압축, 날짜는 date 타입 유지).
+
+import csv
+import io
+import tempfile
+import unicodedata
+from collections import namedtuple
+from itertools import islice
+from urllib.parse import quote
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from models import DispatchResult
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+CHUNK_SIZE = 64 * 1024
+PARQUET_BATCH_ROWS = 50000
+
+STUDENT_STATUS_TEXT = {'approved': '승인완료', 'pending': '승인대기'}
+
+# 내보내기 컬럼: 헤더, 타입(string/date/time/int), 행 → 값 함수
+ExportColumn = namedtuple('ExportColumn', 'header kind getter')
+
+
+# ----------------------------------------------------
+# 응답 도우미
+# ----------------------------------------------------
+def attachment_headers(filename):
+    """한글 파일명을 포함한 Content-Disposition 헤더 (send_file 과 같은 방식)"""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii') or 'download'
+    quoted = quote(filename, safe="!#$&+^`|~")
+    return {'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quoted}"}
+
+
+def stream_xlsx(build):
+    """build(workbook) 으로 write_only 워크북을 채운 뒤 임시 파일 내용을 청크 단위로 생성
+
+    행 단위 스트리밍이 아닙니다: build/save 가 끝날 때까지(첫 next() 호출에서) 기다린 뒤 전송을 시작합니다.
+    얻는 것은 응답 크기와 무관한 메모리 사용량 (BytesIO 에 전체를 올리지 않음) 입니다.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        workbook = openpyxl.Workbook(write_only=True)
+        build(workbook)
+        workbook.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def display_value(value, kind):
+    """xlsx/csv 에 쓰는 표시용 값 (날짜는 YYYY-MM-DD, 시간은 HH:MM, None 은 빈 칸)"""
+    if value is None:
+        return ''
+    if kind == 'date':
+        return value.strftime('%Y-%m-%d')
+    if kind == 'time':
+        return value.strftime('%H:%M')
+    return value
+
+
+def stream_csv(columns, rows):
+    """CSV 를 CHUNK_SIZE 단위로 생성 (엑셀에서 한글이 깨지지 않도록 BOM 포함)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.header for c in columns])
+    yield '\ufeff'.encode('utf-8')
+    for row in rows:
+        writer.writerow([display_value(c.getter(row), c.kind) for c in columns])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(columns, rows):
+    """PARQUET_BATCH_ROWS 행씩 row group 으로 기록한 parquet 파일을 청크 단위로 생성 (pyarrow 필요)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {'string': pa.string(), 'date': pa.date32(), 'time': pa.time32('s'), 'int': pa.int64()}
+    schema = pa.schema([(c.header, arrow_types[c.kind]) for c in columns])
+    rows = iter(rows)
+
+    with tempfile.TemporaryFile() as tmp:
+        with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+            while True:
+                batch = list(islice(rows, PARQUET_BATCH_ROWS))
+                if not batch:
+                    break
+                arrays = [pa.array([c.getter(row) for row in batch], type=arrow_types[c.kind]) for c in columns]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def styled_row(sheet, values, font=None, fill=None, alignment=None, border=None):
+    """write_only 시트에 스타일을 적용한 한 행"""
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(sheet, value=value)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if alignment:
+            cell.alignment = alignment
+        if border:
+            cell.border = border
+        cells.append(cell)
+    return cells
+
+
+def write_table_sheet(workbook, title, columns, rows):
+    """헤더 1줄 + 데이터 행으로 된 기본 시트 (pandas to_excel 과 같은 헤더 스타일)"""
+    sheet = workbook.create_sheet(title)
+    thin = Side(style='thin')
+    sheet.append(styled_row(
+        sheet, [c.header for c in columns],
+        font=Font(bold=True),
+        alignment=Alignment(horizontal='center', vertical='top'),
+        border=Border(left=thin, right=thin, top=thin, bottom=thin)
+    ))
+    for row in rows:
+        sheet.append([display_value(c.getter(row), c.kind) for c in columns])
+
+
+# ----------------------------------------------------
+# 등록 회원 명부 (download_students)
+#   rows: name, email, phone, emergency_contact, address, branch_name, class_name,
+#         time_slot, status, start_date, created_at 속성을 가진 행
+# ----------------------------------------------------
+STUDENT_ROSTER_COLUMNS = [
+    ExportColumn('이름', 'string', lambda r: r.name),
+    ExportColumn('이메일', 'string', lambda r: r.email),
+    ExportColumn('연락처', 'string', lambda r: r.phone or ''),
+    ExportColumn('비상연락망', 'string', lambda r: r.emergency_contact or ''),
+    ExportColumn('주소', 'string', lambda r: r.address or ''),
+    ExportColumn('지점명', 'string', lambda r: r.branch_name),
+    ExportColumn('클래스명', 'string', lambda r: r.class_name or ''),
+    ExportColumn('시간대', 'string', lambda r: r.time_slot or ''),
+    ExportColumn('승인상태', 'string', lambda r: STUDENT_STATUS_TEXT.get(r.status, '승인대기')),
+    ExportColumn('수강시작일', 'date', lambda r: r.start_date),
+    ExportColumn('등록일', 'date', lambda r: r.created_at.date() if r.created_at else None),
+]
+
+
+def write_student_roster(workbook, rows):
+    write_table_sheet(workbook, '회원명부', STUDENT_ROSTER_COLUMNS, rows)
+
+
+# ----------------------------------------------------
+# 배차 이력 (download_dispatch_history)
+#   rows: dispatch_date, vehicle_number, driver_name, student_name, class_name, time_slot,
+#         address, stop_order, status, pickup_time, arrival_time, notes 속성을 가진 행
+# ----------------------------------------------------
+DISPATCH_HISTORY_COLUMNS = [
+    ExportColumn('배차일', 'date', lambda r: r.dispatch_date),
+    ExportColumn('차량번호', 'string', lambda r: r.vehicle_number),
+    ExportColumn('기사명', 'string', lambda r: r.driver_name or ''),
+    ExportColumn('학생명', 'string', lambda r: r.student_name),
+    ExportColumn('클래스명', 'string', lambda r: r.class_name or ''),
+    ExportColumn('시간대', 'string', lambda r: r.time_slot or ''),
+    ExportColumn('주소', 'string', lambda r: r.address or ''),
+    ExportColumn('탑승순서', 'int', lambda r: r.stop_order),
+    ExportColumn('상태', 'string', lambda r: DispatchResult.STATUS_TEXT.get(r.status, '알 수 없음')),
+    ExportColumn('픽업시간', 'time', lambda r: r.pickup_time),
+    ExportColumn('도착시간', 'time', lambda r: r.arrival_time),
+    ExportColumn('특이사항', 'string', lambda r: r.notes or ''),
+]
+
+
+def write_dispatch_history(workbook, rows):
+    write_table_sheet(workbook, '배차이력', DISPATCH_HISTORY_COLUMNS, rows)
+
+
+# ----------------------------------------------------
+# 기존 회원 + 업로드 양식 통합본 (download_template)
+# ----------------------------------------------------
+TEMPLATE_HEADERS = [
+    '번호', '이름', '이메일', '초기비밀번호', '연락처', '비상연락망',
+    '주소', '지점명', '클래스명', '시간대', '수강시작일(YYYY-MM-DD)', '수강기간(개월)', '상태'
+]
+TEMPLATE_COLUMN_WIDTHS = {
+    'A': 5, 'B': 12, 'C': 25, 'D': 12, 'E': 15, 'F': 15,
+    'G': 40, 'H': 15, 'I': 15, 'J': 10, 'K': 18, 'L': 12, 'M': 8
+}
+TEMPLATE_SAMPLE_ROWS = 5
+TEMPLATE_INPUT_ROWS = 1000  # 드롭다운을 적용할 입력 행 수
+
+
+def write_roster_template(workbook, rows, branch_name, class_names, time_slots):
+    """기존 회원(녹색) → 구분선 → 신규 입력 양식(노랑) 순서의 통합 명부"""
+    sheet = workbook.create_sheet('회원명부_통합')
+
+    # 컬럼 너비는 첫 행을 쓰기 전에 지정해야 함 (write_only)
+    for col, width in TEMPLATE_COLUMN_WIDTHS.items():
+        sheet.column_dimensions[col].width = width
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    existing_fill = PatternFill(start_color="D5E8D4", end_color="D5E8D4", fill_type="solid")  # 기존 회원 (연한 녹색)
+    template_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")  # 템플릿 (연한 노랑)
+
+    sheet.append(styled_row(sheet, TEMPLATE_HEADERS, font=header_font, fill=header_fill,
+                            alignment=Alignment(horizontal='center')))
+    current_row = 2
+
+    # 🔹 기존 회원 데이터
+    student_count = 0
+    for row in rows:
+        student_count += 1
+        sheet.append(styled_row(sheet, [
+            student_count,
+            row.name,
+            row.email,
+            "****",  # 보안상 비밀번호는 숨김
+            row.phone or "",
+            row.emergency_contact or "",
+            row.address or "",
+            row.branch_name,
+            row.class_name or "",
+            row.time_slot or "",
+            display_value(row.start_date, 'date'),
+            "",  # 수강기간은 기존 데이터에 없음
+            "기존회원"
+        ], fill=existing_fill))
+        current_row += 1
+
+    # 🔹 구분선
+    if student_count:
+        sheet.append(styled_row(
+            sheet, ["⬇️⬇️⬇️ 아래에 새로운 회원 정보를 입력하세요 ⬇️⬇️⬇️"],
+            font=Font(bold=True, color="FF0000"),
+            fill=PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+            alignment=Alignment(horizontal='center')
+        ))
+        sheet.merged_cells.add(f'A{current_row}:M{current_row}')
+        current_row += 1
+
+    # 🔹 빈 템플릿 양식 (5줄)
+    template_start_row = current_row
+    for i in range(TEMPLATE_SAMPLE_ROWS):
+        sheet.append(styled_row(sheet, [
+            student_count + i + 1,  # 번호 이어서
+            f"신규회원{i+1}",
+            f"new{i+1}@example.com",
+            "1234",
+            "010-0000-0000",
+            "010-0000-0000",
+            "주소를 입력하세요",
+            branch_name,
+            "",  # 드롭다운으로 선택
+            "",  # 드롭다운으로 선택
+            "2025-09-01",
+            "3",
+            "신규"
+        ], fill=template_fill))
+
+    # 🔽 드롭다운 (데이터 검증은 save 시점에 시트 끝에 기록되므로 마지막에 추가해도 됨)
+    last_input_row = template_start_row + TEMPLATE_INPUT_ROWS - 1
+    if class_names:
+        class_validation = DataValidation(
+            type="list",
+            formula1=f'"{",".join(class_names)}"',
+            showErrorMessage=True,
+            errorTitle="클래스명 오류",
+            error="등록된 클래스 중에서 선택해주세요."
+        )
+        sheet.data_validations.append(class_validation)
+        class_validation.add(f'I{template_start_row}:I{last_input_row}')
+
+    if time_slots:
+        time_validation = DataValidation(
+            type="list",
+            formula1=f'"{",".join(time_slots)}"',
+            showErrorMessage=True,
+            errorTitle="시간대 오류",
+            error="등록된 시간대 중에서 선택해주세요."
+        )
+        sheet.data_validations.append(time_validation)
+        time_validation.add(f'J{template_start_row}:J{last_input_row}')
+
+
+# ----------------------------------------------------
+# 빈 업로드 양식 (download_dynamic_template)
+# ----------------------------------------------------
+UPLOAD_TEMPLATE_HEADERS = TEMPLATE_HEADERS[:11]
+
+
+def xlsx_bytes(build):
+    """캐시용: stream_xlsx 결과를 하나의 bytes 로"""
+    return b''.join(stream_xlsx(build))
+
+
+def write_upload_template(workbook, branch_name, class_names):
+    """헤더 + 샘플 1줄 + 지점명/클래스명 드롭다운만 있는 업로드 양식"""
+    sheet = workbook.create_sheet('회원명부')
+
+    sample = []
+    if class_names:
+        sample = [
+            1, "홍길동", "sample@example.com", 12345,
+            "010-1234-5678", "010-9876-5432",
+            "경기도 용인시 기흥구 동천동 123-45",
+            branch_name, class_names[0], "07:00", "2025-08-07"
+        ]
+
+    # 컬럼 너비: 헤더/샘플 값 길이 기준 (셀을 다시 순회하지 않음)
+    for idx, header in enumerate(UPLOAD_TEMPLATE_HEADERS):
+        values = [header] + ([sample[idx]] if sample else [])
+        width = min(max(len(str(v)) for v in values) + 2, 50)
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(idx + 1)].width = width
+
+    sheet.append(UPLOAD_TEMPLATE_HEADERS)
+    if sample:
+        sheet.append(sample)
+
+    if class_names:
+        class_validation = DataValidation(
+            type="list",
+            formula1=f'"{",".join(class_names)}"',
+            showErrorMessage=True,
+            errorTitle="잘못된 클래스명",
+            error="목록에서 선택해주세요"
+        )
+        sheet.data_validations.append(class_validation)
+        class_validation.add('I2:I1000')  # 클래스명 컬럼 (I열)
+
+    branch_validation = DataValidation(
+        type="list",
+        formula1=f'"{branch_name}"',
+        showErrorMessage=True,
+        errorTitle="잘못된 지점명",
+        error="해당 지점명만 사용 가능합니다"
+    )
+    sheet.data_validations.append(branch_validation)
+    branch_validation.add('H2:H1000')  # 지점명 컬럼 (H열)
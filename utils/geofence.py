@@ -0,0 +1,335 @@
+# utils/geofence.py
+# 설명: 수신한 GPS 좌표 흐름을 지오펜스와 비교해 픽업/도착 시각을 자동 기록합니다 (기사가 버튼을 잊어도 기록됨).
+#       - 차량마다 오늘 남은 정류장 중 다음 GEOFENCE_LOOKAHEAD 개 + 지점(학원) 위치만 펜스로 둡니다.
+#       - 펜스는 (차량, 격자 칸) → 펜스 목록 dict 에 넣어 두므로 좌표 하나 확인은 dict 조회 한 번 + 펜스 몇 개 거리 계산.
+#         격자 칸 크기는 가장 큰 반경(곧 도착 반경)이라 좌표가 속한 칸만 보면 됩니다.
+#       - 정류장 펜스 진입 → 'picked_up', 탑승 학생이 있는 상태로 지점 펜스 진입 → 태운 학생 전원 'dropped_off'.
+#         기록은 utils/stop_events.py 버퍼로 넘겨 기사 앱 이벤트와 같은 일괄 반영/알림 경로를 탑니다
+#         (idempotency_key 가 날짜+배차+종류로 고정이라 재시작 후 다시 감지돼도 한 번만 반영).
+#       - 정류장 GEOFENCE_APPROACH_RADIUS 안에 들어오면 보호자 "곧 도착" 알림을 대기열에 넣습니다 (학생당 한 번).
+#       - 요청 스레드는 submit() 으로 큐에 넣기만 하고, 처리 스레드 하나가 모아서 처리합니다.
+#       - 좌표가 없는 학생/지점(student_locations, branch_locations 미등록)은 감지하지 않습니다.
+
+import math
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timezone
+
+from database import db
+from models import (BranchLocation, DispatchResult, Student, StudentLocation, Vehicle)
+from utils import applog, dispatch_events, notifications, stop_events
+
+log = applog.get_logger('geofence')
+
+EARTH_RADIUS = 6371000.0  # m
+METERS_PER_DEG_LAT = 111320.0
+OPEN_STATUSES = ('assigned', 'pending', 'in_progress')
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """짧은 거리용 평면 근사 (수 km 이내 오차 무시 가능)"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+def parse_point(data):
+    """{'lat', 'lon'} → (위도, 경도), 범위를 벗어나면 ValueError (관리자 좌표 등록용)"""
+    try:
+        lat, lon = float(data['lat']), float(data['lon'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('위도(lat)/경도(lon)를 숫자로 입력해주세요.')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('좌표 범위가 올바르지 않습니다.')
+    return lat, lon
+
+
+def to_local(recorded_at):
+    """gps_ingest 의 UTC 측정 시각 → 서버 현지 시각 (pickup_time/arrival_time 기준)"""
+    return recorded_at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+class Fence:
+    __slots__ = ('kind', 'dispatch_id', 'lat', 'lon', 'radius')
+
+    def __init__(self, kind, dispatch_id, lat, lon, radius):
+        self.kind = kind              # 'stop', 'approach', 'branch'
+        self.dispatch_id = dispatch_id
+        self.lat = lat
+        self.lon = lon
+        self.radius = radius
+
+
+class Grid:
+    """위경도 → 고정 크기(m) 격자 칸 (경도 폭은 기준 위도 하나로 계산)"""
+
+    def __init__(self, cell_size, ref_lat):
+        self.cell_size = cell_size
+        self.meters_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(ref_lat))
+
+    def cell(self, lat, lon):
+        return (int(math.floor(lat * METERS_PER_DEG_LAT / self.cell_size)),
+                int(math.floor(lon * self.meters_per_deg_lon / self.cell_size)))
+
+    def cells_covering(self, fence):
+        """펜스 원이 걸치는 칸 전부 (반경 ≤ 칸 크기이므로 최대 3x3)"""
+        lat_min = (fence.lat * METERS_PER_DEG_LAT - fence.radius) / self.cell_size
+        lat_max = (fence.lat * METERS_PER_DEG_LAT + fence.radius) / self.cell_size
+        lon_min = (fence.lon * self.meters_per_deg_lon - fence.radius) / self.cell_size
+        lon_max = (fence.lon * self.meters_per_deg_lon + fence.radius) / self.cell_size
+        for y in range(int(math.floor(lat_min)), int(math.floor(lat_max)) + 1):
+            for x in range(int(math.floor(lon_min)), int(math.floor(lon_max)) + 1):
+                yield (y, x)
+
+
+class VehiclePlan:
+    """차량 한 대의 오늘 정류장 목록과 감지 상태"""
+
+    __slots__ = ('stops', 'branch', 'onboard', 'done', 'approached', 'inside', 'loaded_at')
+
+    def __init__(self, stops, branch, onboard, loaded_at):
+        self.stops = stops            # [(배차ID, 위도, 경도)] 남은 정류장, 순서대로
+        self.branch = branch          # (위도, 경도) 또는 None
+        self.onboard = onboard        # 탑승했고 아직 도착 안 한 배차 ID
+        self.done = set()             # 이번 프로세스에서 픽업을 감지한 배차
+        self.approached = set()       # "곧 도착" 알림을 넣은 배차
+        self.inside = set()           # 현재 안에 있는 펜스 키 (진입 순간만 처리)
+        self.loaded_at = loaded_at
+
+
+class GeofenceProcessor:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._plans = {}              # 차량 ID → VehiclePlan
+        self._index = {}              # (차량 ID, 격자 칸) → [Fence]
+        self._cells = {}              # 차량 ID → 등록한 격자 키 (다시 등록할 때 지울 목록)
+        self._dirty = set()           # 배차 변경으로 다시 읽을 차량
+        self._plan_date = None
+        self.stop_radius = 60
+        self.branch_radius = 100
+        self.approach_radius = 1500
+        self.approach_minutes = 5
+        self.lookahead = 3
+        self.refresh_seconds = 60
+        self.grid = Grid(self.approach_radius, 37.5)
+
+    def configure(self, config):
+        self.stop_radius = config.get('GEOFENCE_STOP_RADIUS', self.stop_radius)
+        self.branch_radius = config.get('GEOFENCE_BRANCH_RADIUS', self.branch_radius)
+        self.approach_radius = config.get('GEOFENCE_APPROACH_RADIUS', self.approach_radius)
+        self.approach_minutes = config.get('GEOFENCE_APPROACH_MINUTES', self.approach_minutes)
+        self.lookahead = config.get('GEOFENCE_LOOKAHEAD', self.lookahead)
+        self.refresh_seconds = config.get('GEOFENCE_REFRESH_SECONDS', self.refresh_seconds)
+        cell_size = max(self.stop_radius, self.branch_radius, self.approach_radius)
+        self.grid = Grid(cell_size, config.get('GEOFENCE_REF_LAT', 37.5))
+
+    # ---- 입력 ----
+    def submit(self, vehicle_id, points):
+        """gps_ingest 가 받은 좌표 [{'recorded_at', 'lat', 'lon', ...}] 를 처리 대기열에 추가 (요청 스레드)"""
+        if points:
+            self._queue.put((vehicle_id, points))
+
+    def mark_dirty(self, vehicle_ids):
+        with self._lock:
+            self._dirty.update(vehicle_ids)
+
+    # ---- 정류장 / 펜스 ----
+    def load_plans(self, vehicle_ids):
+        """오늘 남은 정류장과 좌표를 차량 여러 대 분 한 번에 조회"""
+        today = date.today()
+        rows = db.session.query(
+            DispatchResult.id, DispatchResult.vehicle_id, DispatchResult.status,
+            DispatchResult.pickup_time, DispatchResult.arrival_time,
+            StudentLocation.lat, StudentLocation.lon, StudentLocation.address, Student.address
+        ).join(Student, Student.id == DispatchResult.student_id) \
+            .outerjoin(StudentLocation, StudentLocation.student_id == Student.id) \
+            .filter(DispatchResult.dispatch_date == today,
+                    DispatchResult.vehicle_id.in_(vehicle_ids),
+                    DispatchResult.status.in_(OPEN_STATUSES)) \
+            .order_by(DispatchResult.vehicle_id, DispatchResult.stop_order, DispatchResult.id).all()
+        branches = dict(db.session.query(Vehicle.id, BranchLocation.branch_id)
+                        .join(BranchLocation, BranchLocation.branch_id == Vehicle.branch_id)
+                        .filter(Vehicle.id.in_(vehicle_ids)).all())
+        branch_points = {b.branch_id: (b.lat, b.lon) for b in
+                         BranchLocation.query.filter(BranchLocation.branch_id.in_(set(branches.values())))}
+
+        stops = defaultdict(list)
+        onboard = defaultdict(set)
+        for dispatch_id, vehicle_id, status, pickup, arrival, lat, lon, geo_address, address in rows:
+            if pickup is not None:
+                if arrival is None:
+                    onboard[vehicle_id].add(dispatch_id)
+                continue
+            # 주소가 바뀐 뒤 좌표를 다시 구하지 않았으면 사용하지 않음
+            if lat is not None and (geo_address is None or geo_address == address):
+                stops[vehicle_id].append((dispatch_id, lat, lon))
+
+        now = time.monotonic()
+        with self._lock:
+            if self._plan_date != today:
+                self._plans.clear()
+                self._index.clear()
+                self._cells.clear()
+                self._plan_date = today
+            for vehicle_id in vehicle_ids:
+                previous = self._plans.get(vehicle_id)
+                plan = VehiclePlan(stops[vehicle_id], branch_points.get(branches.get(vehicle_id)),
+                                   onboard[vehicle_id], now)
+                if previous is not None:
+                    plan.approached = previous.approached
+                    plan.inside = previous.inside
+                    plan.done = {d for d in previous.done if d in {s[0] for s in plan.stops}}
+                    plan.onboard |= plan.done
+                self._plans[vehicle_id] = plan
+                self._rebuild_fences(vehicle_id, plan)
+
+    def _rebuild_fences(self, vehicle_id, plan):
+        """차량 펜스를 격자에 다시 등록 (_lock 안에서 호출)"""
+        for key in self._cells.pop(vehicle_id, ()):
+            self._index.pop(key, None)
+        fences = []
+        upcoming = [s for s in plan.stops if s[0] not in plan.done][:self.lookahead]
+        for dispatch_id, lat, lon in upcoming:
+            fences.append(Fence('stop', dispatch_id, lat, lon, self.stop_radius))
+            if dispatch_id not in plan.approached:
+                fences.append(Fence('approach', dispatch_id, lat, lon, self.approach_radius))
+        if plan.branch is not None and plan.onboard:
+            fences.append(Fence('branch', None, plan.branch[0], plan.branch[1], self.branch_radius))
+        keys = self._cells[vehicle_id] = set()
+        for fence in fences:
+            for cell in self.grid.cells_covering(fence):
+                self._index.setdefault((vehicle_id, cell), []).append(fence)
+                keys.add((vehicle_id, cell))
+
+    def _plans_to_load(self, vehicle_ids):
+        now = time.monotonic()
+        with self._lock:
+            stale = {v for v in vehicle_ids
+                     if v not in self._plans or now - self._plans[v].loaded_at > self.refresh_seconds}
+            stale |= self._dirty & set(vehicle_ids)
+            self._dirty -= stale
+            if self._plan_date != date.today():
+                stale = set(vehicle_ids)
+        return stale
+
+    # ---- 처리 ----
+    def check(self, vehicle_id, point):
+        """좌표 하나 확인 → [(종류, 배차ID 목록)] 새로 진입한 펜스 (_lock 밖에서 호출)"""
+        with self._lock:
+            plan = self._plans.get(vehicle_id)
+            if plan is None:
+                return []
+            candidates = self._index.get((vehicle_id, self.grid.cell(point['lat'], point['lon'])), ())
+            hits = []
+            inside = set()
+            for fence in candidates:
+                if distance_m(point['lat'], point['lon'], fence.lat, fence.lon) > fence.radius:
+                    continue
+                key = (fence.kind, fence.dispatch_id)
+                inside.add(key)
+                if key in plan.inside:
+                    continue
+                if fence.kind == 'stop':
+                    plan.done.add(fence.dispatch_id)
+                    plan.onboard.add(fence.dispatch_id)
+                    hits.append(('picked_up', [fence.dispatch_id]))
+                elif fence.kind == 'approach':
+                    plan.approached.add(fence.dispatch_id)
+                    hits.append(('approaching', [fence.dispatch_id]))
+                elif fence.kind == 'branch':
+                    hits.append(('dropped_off', sorted(plan.onboard)))
+                    plan.onboard = set()
+            plan.inside = inside
+            if hits:
+                self._rebuild_fences(vehicle_id, plan)
+            return hits
+
+    def process(self, batch):
+        """[(차량ID, 좌표 목록)] 처리 → (픽업/도착 이벤트 수, 곧 도착 알림 배차 수) (앱 컨텍스트 필요)"""
+        vehicle_ids = {vehicle_id for vehicle_id, _ in batch}
+        stale = self._plans_to_load(vehicle_ids)
+        if stale:
+            self.load_plans(stale)
+
+        events = defaultdict(list)
+        approaching = []
+        for vehicle_id, points in batch:
+            for point in points:
+                for kind, dispatch_ids in self.check(vehicle_id, point):
+                    if kind == 'approaching':
+                        approaching.extend(dispatch_ids)
+                        continue
+                    occurred_at = to_local(point['recorded_at'])
+                    for dispatch_id in dispatch_ids:
+                        events[vehicle_id].append({
+                            'idempotency_key': f"geo:{occurred_at.date()}:{dispatch_id}:{kind}",
+                            'dispatch_id': dispatch_id, 'event_type': kind, 'occurred_at': occurred_at
+                        })
+
+        for vehicle_id, items in events.items():
+            stop_events.buffer.add_parsed(vehicle_id, items)
+        if approaching:
+            notifications.enqueue(db.session, 'approaching', approaching, minutes=self.approach_minutes)
+            db.session.commit()
+        count = sum(len(items) for items in events.values())
+        if count or approaching:
+            log.info('geofence.detected', events=count, approaching=len(approaching))
+        return count, len(approaching)
+
+    def drain(self, timeout=1.0):
+        """대기열에서 한 번에 가져올 수 있는 만큼 꺼내 차량별로 합침"""
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        merged = defaultdict(list)
+        item = first
+        while True:
+            merged[item[0]].extend(item[1])
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return [(vehicle_id, sorted(points, key=lambda p: p['recorded_at'])) for vehicle_id, points in merged.items()]
+
+
+processor = GeofenceProcessor()
+
+
+def _on_dispatch_event(evt):
+    # 배차 생성/삭제/상태 변경 → 해당 차량 정류장 목록을 다음 좌표 때 다시 읽음
+    processor.mark_dirty(evt.vehicle_ids)
+
+
+dispatch_events.broker.add_listener(_on_dispatch_event)
+
+
+def init_app(app):
+    processor.configure(app.config)
+
+
+def start_processor(app):
+    """수신 좌표를 지오펜스와 비교하는 데몬 스레드 (GEOFENCE_ENABLED=False 면 비활성)"""
+    if not app.config.get('GEOFENCE_ENABLED', True):
+        return None
+
+    def run():
+        while True:
+            batch = processor.drain()
+            if not batch:
+                continue
+            with app.app_context():
+                try:
+                    processor.process(batch)
+                except Exception as e:
+                    db.session.rollback()
+                    log.exception('geofence.process_failed', '지오펜스 처리 실패: %s', e)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='geofence-processor', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,185 @@
+# utils/gps_ingest.py
+# 설명: 기사 앱이 보내는 GPS 좌표 묶음을 메모리 버퍼에 모았다가 vehicle_positions 에 일괄 저장합니다.
+#       - 요청은 검증/제한 후 버퍼에 넣기만 하고 바로 응답합니다 (요청마다 INSERT/커밋하지 않음).
+#       - 플러시 스레드가 GPS_FLUSH_INTERVAL 마다(또는 GPS_FLUSH_ROWS 이상 쌓이면 즉시) 버퍼 전체를
+#         executemany INSERT 한 번 + 커밋 한 번으로 저장합니다. 저장 실패 시 GPS_BUFFER_MAX 까지 버퍼에 되돌립니다.
+#       - 차량별 제한: GPS_MIN_REQUEST_INTERVAL 보다 잦은 요청은 거절(429),
+#         GPS_MIN_POINT_INTERVAL 보다 촘촘한 좌표와 이미 받은 시각 이전 좌표는 버림.
+
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from database import db
+from models import VehiclePosition
+from utils import applog
+
+log = applog.get_logger('gps_ingest')
+
+MAX_CLOCK_SKEW = timedelta(minutes=5)  # 기기 시계가 이보다 미래면 버림
+
+
+class RateLimited(Exception):
+    """차량별 요청 간격 제한 초과"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"{retry_after:.1f}초 후 다시 시도하세요.")
+        self.retry_after = retry_after
+
+
+def parse_point(point):
+    """{'ts', 'lat', 'lon', 'speed'} → (측정 시각 UTC, 위도, 경도, 속도), 잘못된 좌표는 ValueError
+
+    ts 는 epoch 밀리초(Geolocation API 의 position.timestamp) 또는 ISO 8601 문자열.
+    """
+    ts = point.get('ts')
+    if isinstance(ts, bool):
+        raise ValueError('측정 시각(ts) 형식 오류')
+    if isinstance(ts, (int, float)):
+        recorded_at = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
+    elif isinstance(ts, str):
+        recorded_at = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        if recorded_at.tzinfo is None:
+            recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+    else:
+        raise ValueError('측정 시각(ts) 누락')
+    recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    lat = float(point['lat'])
+    lon = float(point['lon'])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('좌표 범위 오류')
+    speed = point.get('speed')
+    speed = float(speed) if speed is not None else None
+    return recorded_at, lat, lon, speed
+
+
+class PositionBuffer:
+    """프로세스 내 좌표 버퍼 + 차량별 제한 상태"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._rows = []
+        self._last_request = {}   # 차량 ID → 마지막으로 받은 요청 시각 (monotonic)
+        self._last_point = {}     # 차량 ID → 마지막으로 받은 좌표의 측정 시각
+        self.flush_rows = 2000
+        self.buffer_max = 100000
+        self.max_batch = 500
+        self.min_point_interval = timedelta(seconds=2)
+        self.min_request_interval = 1.0
+        self.wakeup = threading.Event()
+
+    def configure(self, config):
+        self.flush_rows = config.get('GPS_FLUSH_ROWS', self.flush_rows)
+        self.buffer_max = config.get('GPS_BUFFER_MAX', self.buffer_max)
+        self.max_batch = config.get('GPS_MAX_BATCH', self.max_batch)
+        self.min_point_interval = timedelta(seconds=config.get('GPS_MIN_POINT_INTERVAL', 2))
+        self.min_request_interval = config.get('GPS_MIN_REQUEST_INTERVAL', self.min_request_interval)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def add(self, vehicle_id, points):
+        """한 차량의 좌표 묶음 접수 → (저장 대기로 받은 좌표 목록, 버린 개수), 제한 초과 시 RateLimited"""
+        if len(points) > self.max_batch:
+            raise ValueError(f"한 번에 최대 {self.max_batch}개까지 보낼 수 있습니다.")
+
+        parsed = []
+        dropped = 0
+        for point in points:
+            try:
+                parsed.append(parse_point(point))
+            except (AttributeError, KeyError, TypeError, ValueError, OverflowError, OSError):
+                # dict 가 아닌 항목, 범위를 벗어난 ts(fromtimestamp 오류) 등은 그 좌표만 버림
+                dropped += 1
+        parsed.sort(key=lambda p: p[0])
+
+        now = datetime.utcnow()
+        received = time.monotonic()
+        accepted = []
+        with self._lock:
+            last_request = self._last_request.get(vehicle_id)
+            if last_request is not None and received - last_request < self.min_request_interval:
+                raise RateLimited(self.min_request_interval - (received - last_request))
+            self._last_request[vehicle_id] = received
+
+            last_point = self._last_point.get(vehicle_id)
+            for recorded_at, lat, lon, speed in parsed:
+                too_close = last_point is not None and recorded_at < last_point + self.min_point_interval
+                if too_close or recorded_at > now + MAX_CLOCK_SKEW:
+                    dropped += 1
+                    continue
+                accepted.append({
+                    'vehicle_id': vehicle_id, 'recorded_at': recorded_at, 'received_at': now,
+                    'lat': lat, 'lon': lon, 'speed': speed
+                })
+                last_point = recorded_at
+            if last_point is not None:
+                self._last_point[vehicle_id] = last_point
+
+            overflow = len(self._rows) + len(accepted) - self.buffer_max
+            if overflow > 0:
+                # 저장이 계속 실패하는 상황: 가장 오래된 좌표부터 버림
+                del self._rows[:overflow]
+                log.warning('gps_ingest.buffer_overflow', '버퍼 한도 초과로 오래된 좌표 %d개 삭제', overflow)
+            self._rows.extend(accepted)
+            should_flush = len(self._rows) >= self.flush_rows
+
+        if should_flush:
+            self.wakeup.set()
+        return accepted, dropped
+
+    def flush(self):
+        """버퍼 전체를 INSERT 한 번으로 저장 (앱 컨텍스트 안에서 호출), 저장한 행 수 반환"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                db.session.execute(insert(VehiclePosition), rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    self._rows[:0] = rows[-self.buffer_max:]
+                log.exception('gps_ingest.flush_failed', '좌표 %d개 저장 실패 (다음 주기에 재시도): %s', len(rows), e)
+                return 0
+            log.debug('gps_ingest.flushed', rows=len(rows))
+            return len(rows)
+
+
+buffer = PositionBuffer()
+
+
+def init_app(app):
+    buffer.configure(app.config)
+
+
+def start_flusher(app):
+    """GPS_FLUSH_INTERVAL 마다(또는 버퍼가 차면 즉시) 저장하는 데몬 스레드, 종료 시 남은 좌표 저장"""
+    interval = app.config.get('GPS_FLUSH_INTERVAL', 5)
+
+    def flush_now():
+        with app.app_context():
+            try:
+                buffer.flush()
+            finally:
+                db.session.remove()
+
+    def run():
+        while True:
+            buffer.wakeup.wait(interval)
+            buffer.wakeup.clear()
+            flush_now()
+
+    atexit.register(flush_now)
+    thread = threading.Thread(target=run, name='gps-position-flusher', daemon=True)
+    thread.start()
+    return thread
@@ -1,24 +1,16 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import os
-from datetime import datetime
+# utils/gsheet.py
+# 설명: 수강회원 / 기사 시트에 행을 추가합니다.
+#       시트 API 는 직접 호출하지 않고 utils/sheet_sync.py 대기열에 넣기만 합니다 (워커가 모아서 append_rows).
+#       대기열 행은 호출한 쪽의 db.session 에 추가만 하므로 커밋은 호출한 쪽에서 합니다 (회원/기사 저장과 같은 트랜잭션).
 
-# 🔐 인증 설정
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive"
-]
+from datetime import datetime
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-cred_path = os.path.join(BASE_DIR, "../credentials.json")
-creds = ServiceAccountCredentials.from_json_keyfile_name(cred_path, scope)
-client = gspread.authorize(creds)
+from database import db
+from utils import sheet_sync
 
 # ✅ 수강회원 시트 저장 함수
 def append_member_data(sheet_url, data):
-    sheet = client.open_by_url(sheet_url).sheet1
+    """수강회원 행 추가 예약 (db.session 에 추가만, 커밋은 호출한 쪽)"""
     today = datetime.today().strftime("%Y-%m-%d")
     row = [
         data.get("branch", ""),          # A 지점명
@@ -36,11 +28,11 @@ def append_member_data(sheet_url, data):
         data.get("email", ""),           # M 이메일(ID)
         data.get("memo", "")             # N 비고
     ]
-    sheet.append_row(row)
+    sheet_sync.enqueue_rows(db.session, sheet_url, None, [row])
 
 # ✅ 기사 시트 저장 함수
 def append_driver_data(sheet_url, data):
-    sheet = client.open_by_url(sheet_url).sheet1
+    """기사 행 추가 예약 (db.session 에 추가만, 커밋은 호출한 쪽)"""
     row = [
         data.get("branch", ""),      # A 지점명
         data.get("name", ""),        # B 이름
@@ -50,4 +42,4 @@ def append_driver_data(sheet_url, data):
         "",                          # F 배정호차
         ""                           # G 비고
     ]
-    sheet.append_row(row)
+    sheet_sync.enqueue_rows(db.session, sheet_url, None, [row])
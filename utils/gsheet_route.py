@@ -1,32 +1,71 @@
 # utils/gsheet_route.py
+# 설명: 승인된 경로를 경로 시트("경로저장")에 저장합니다.
+#       시트 API 는 직접 호출하지 않고 utils/sheet_sync.py 대기열에 넣기만 합니다 (워커가 모아서 append_rows 한 번).
+#       대기열 행은 호출한 쪽 세션에 추가만 하므로 커밋은 호출한 쪽에서 합니다.
 
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 
-# 구글시트 인증
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-client = gspread.authorize(creds)
+from flask import current_app
 
-ROUTE_SHEET_URL = "경로시트_URL_여기에_입력하세요"
+from database import db
+from models import DispatchResult, Student, User, Vehicle
+from utils import sheet_sync
 
-def append_route_data(route_list, driver_name, vehicle_no):
-    sheet = client.open_by_url(ROUTE_SHEET_URL)
-    worksheet = sheet.worksheet("경로저장")
+ROUTE_WORKSHEET = "경로저장"
+
+
+def route_sheet_url():
+    url = current_app.config.get('ROUTE_SHEET_URL')
+    if not url:
+        raise ValueError('경로 시트 URL(ROUTE_SHEET_URL)이 설정되지 않았습니다.')
+    return url
+
+
+def route_row(day, vehicle_no, r, driver_name):
+    return [
+        day,
+        vehicle_no,
+        r["지점명"],
+        r.get("반", ""),  # 반이 없으면 공백
+        r["시간대"],
+        r["이름"],
+        r["주소"],
+        driver_name,
+        "승인"  # 상태는 무조건 승인된 애들임
+    ]
 
+
+def append_route_data(route_list, driver_name, vehicle_no):
+    """경로 목록 저장 예약 (정류장 수와 관계없이 대기열 INSERT 한 번, db.session 에 추가만 하고 커밋은 호출한 쪽)"""
     today = datetime.today().strftime("%Y-%m-%d")
+    rows = [route_row(today, vehicle_no, r, driver_name) for r in route_list]
+    return sheet_sync.enqueue_rows(db.session, route_sheet_url(), ROUTE_WORKSHEET, rows)
+
+
+def export_day(session, dispatch_date, vehicle_ids=None):
+    """하루 배차 전체를 경로 시트 저장 예약 → (대상 행 수, 새로 쌓인 행 수)
+
+    조회는 조인 쿼리 한 번, 배차마다 dedup 키(route:날짜:배차ID)가 있어 다시 내보내도 이미 예약된 행은 건너뜁니다.
+    """
+    query = session.query(
+        DispatchResult.id, Vehicle.vehicle_number, Student.branch_name, Student.class_name,
+        Student.time_slot, Student.address, User.name, Vehicle.driver_id
+    ).join(Student, Student.id == DispatchResult.student_id) \
+        .join(User, User.id == Student.user_id) \
+        .join(Vehicle, Vehicle.id == DispatchResult.vehicle_id) \
+        .filter(DispatchResult.dispatch_date == dispatch_date, DispatchResult.status != 'cancelled')
+    if vehicle_ids is not None:
+        query = query.filter(DispatchResult.vehicle_id.in_(vehicle_ids))
+    records = query.order_by(Vehicle.vehicle_number, DispatchResult.stop_order, DispatchResult.id).all()
 
-    for r in route_list:
-        row = [
-            today,
-            vehicle_no,
-            r["지점명"],
-            r.get("반", ""),  # 반이 없으면 공백
-            r["시간대"],
-            r["이름"],
-            r["주소"],
-            driver_name,
-            "승인"  # 상태는 무조건 승인된 애들임
-        ]
-        worksheet.append_row(row)
+    driver_ids = {r.driver_id for r in records if r.driver_id}
+    drivers = dict(session.query(User.id, User.name).filter(User.id.in_(driver_ids))) if driver_ids else {}
+    day = dispatch_date.strftime("%Y-%m-%d")
+    rows, keys = [], []
+    for r in records:
+        stop = {"지점명": r.branch_name or "", "반": r.class_name or "", "시간대": r.time_slot or "",
+                "이름": r.name, "주소": r.address or ""}
+        rows.append(route_row(day, r.vehicle_number, stop, drivers.get(r.driver_id, "")))
+        keys.append(f"route:{day}:{r.id}")
+    queued = sheet_sync.enqueue_rows(session, route_sheet_url(), ROUTE_WORKSHEET, rows, dedup_keys=keys)
+    return len(rows), queued
@@ -0,0 +1,199 @@
+# utils/import_jobs.py
+# 설명: 회원명부 업로드를 요청 밖에서 처리하는 작업 큐입니다.
+#       - 업로드 요청은 파일을 IMPORT_JOB_DIR 에 저장하고 import_jobs 행(queued)만 만든 뒤 바로 응답합니다.
+#       - DB 테이블을 큐로 사용: 워커는 queued 작업을 조건부 UPDATE 로 선점하므로 워커가 여러 개여도 중복 처리되지 않습니다.
+#       - 워커: 별도 프로세스(`flask --app app import-worker`) 또는 IMPORT_WORKER_EMBEDDED=True 일 때 웹 프로세스 내 데몬 스레드.
+#       - 업로드 방식(mode)은 작업에 저장되어 워커가 그대로 사용합니다 (insert / upsert).
+#       - 배치마다 진행률/heartbeat 를 갱신하고, 완료 시 행별 결과 리포트(xlsx)를 저장합니다.
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from sqlalchemy.orm import joinedload
+
+from database import db
+from models import ImportJob, User
+from utils import applog, roster_import
+
+log = applog.get_logger('import_jobs')
+
+ALLOWED_EXTENSIONS = ('.xlsx', '.csv')
+RESULT_LABELS = {'created': '등록', 'updated': '변경', 'unchanged': '변경 없음', 'duplicate': '중복(건너뜀)', 'error': '오류'}
+
+
+# ----------------------------------------------------
+# 작업 등록
+# ----------------------------------------------------
+def enqueue(file_storage, user, job_dir, mode='insert'):
+    """업로드 파일을 저장하고 대기 작업을 생성"""
+    if mode not in roster_import.IMPORT_MODES:
+        raise ValueError("알 수 없는 업로드 방식입니다.")
+    ext = os.path.splitext(file_storage.filename or '')[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError("xlsx 또는 csv 파일만 업로드할 수 있습니다.")
+
+    os.makedirs(job_dir, exist_ok=True)
+    path = os.path.join(job_dir, f"{uuid.uuid4().hex}{ext}")
+    file_storage.save(path)
+
+    job = ImportJob(
+        user_id=user.id,
+        branch_id=user.branch_id,
+        filename=file_storage.filename,
+        file_path=path,
+        mode=mode
+    )
+    db.session.add(job)
+    db.session.commit()
+    log.info('import_jobs.enqueued', job_id=job.id, filename=job.filename, mode=mode)
+    return job
+
+
+# ----------------------------------------------------
+# 워커
+# ----------------------------------------------------
+def requeue_stale(stale_seconds):
+    """heartbeat 가 끊긴 running 작업을 다시 대기열로 (이미 등록된 행은 중복 이메일로 건너뜀)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    count = ImportJob.query.filter(
+        ImportJob.status == 'running', ImportJob.heartbeat_at < cutoff
+    ).update({'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        log.warning('import_jobs.requeued', '중단된 작업 %d건 재시작', count)
+    return count
+
+
+def claim_next():
+    """가장 오래된 대기 작업 하나를 선점 (다른 워커가 먼저 가져가면 다음 작업 시도)"""
+    while True:
+        job_id = db.session.query(ImportJob.id).filter_by(status='queued').order_by(ImportJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        now = datetime.utcnow()
+        claimed = ImportJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': now, 'heartbeat_at': now}, synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(ImportJob, job_id)
+
+
+def run_job(job, batch_size):
+    """작업 하나 처리: 배치마다 진행률 갱신 → 리포트 저장 → 완료/실패 기록"""
+    job_id = job.id
+    log.info('import_jobs.started', job_id=job_id, filename=job.filename, mode=job.mode)
+
+    def on_batch(result):
+        ImportJob.query.filter_by(id=job_id).update({
+            'processed_rows': result.total,
+            'created_count': result.created,
+            'updated_count': result.updated,
+            'unchanged_count': result.unchanged,
+            'skipped_count': result.skipped,
+            'error_count': result.errors,
+            'heartbeat_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    try:
+        user = User.query.options(joinedload(User.managed_branch)).filter_by(id=job.user_id).first()
+        if user is None:
+            raise ValueError("업로드한 사용자를 찾을 수 없습니다.")
+
+        job.total_rows = roster_import.estimate_rows(job.file_path)
+        db.session.commit()
+
+        importer = roster_import.RosterImporter(user, batch_size=batch_size, mode=job.mode)
+        with open(job.file_path, 'rb') as f:
+            result = importer.run(f, job.filename, on_batch=on_batch)
+
+        job.report_path = write_report(job, result)
+        job.processed_rows = result.total
+        job.created_count = result.created
+        job.updated_count = result.updated
+        job.unchanged_count = result.unchanged
+        job.skipped_count = result.skipped
+        job.error_count = result.errors
+        job.status = 'done'
+        log.info('import_jobs.done', job_id=job_id, rows=result.total, created=result.created,
+                 updated=result.updated, unchanged=result.unchanged, skipped=result.skipped, errors=result.errors)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        log.exception('import_jobs.failed', '업로드 작업 실패: %s', e, job_id=job_id)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def write_report(job, result):
+    """행별 결과 리포트 (write_only 모드로 저장, 경로 반환)"""
+    path = os.path.splitext(job.file_path)[0] + '_report.xlsx'
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('업로드 결과')
+
+    header_font = Font(bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    error_fill = PatternFill(start_color='FFE6E6', end_color='FFE6E6', fill_type='solid')
+
+    header = []
+    for title in ('행 번호', '결과', '메시지'):
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        header.append(cell)
+    sheet.append(header)
+
+    for row_no, status, message in sorted(result.rows):
+        if status == 'error':
+            cells = [WriteOnlyCell(sheet, value=v) for v in (row_no, RESULT_LABELS[status], message)]
+            for cell in cells:
+                cell.fill = error_fill
+            sheet.append(cells)
+        else:
+            sheet.append([row_no, RESULT_LABELS.get(status, status), message])
+
+    workbook.save(path)
+    return path
+
+
+def worker_loop(app, stop_event=None):
+    """대기 작업을 계속 가져와 처리 (별도 프로세스 또는 데몬 스레드에서 실행)"""
+    poll_interval = app.config['IMPORT_WORKER_POLL_INTERVAL']
+    stale_seconds = app.config['IMPORT_JOB_STALE_SECONDS']
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+
+    while not (stop_event and stop_event.is_set()):
+        job = None
+        with app.app_context():
+            try:
+                requeue_stale(stale_seconds)
+                job = claim_next()
+                if job:
+                    run_job(job, batch_size)
+            except Exception as e:
+                db.session.rollback()
+                log.exception('import_jobs.worker_error', '업로드 워커 오류: %s', e)
+            finally:
+                db.session.remove()
+        if job is None:
+            time.sleep(poll_interval)
+
+
+def start_embedded_worker(app):
+    """웹 프로세스 안에서 워커를 데몬 스레드로 실행 (IMPORT_WORKER_EMBEDDED=False 면 비활성)"""
+    if not app.config.get('IMPORT_WORKER_EMBEDDED'):
+        return None
+    thread = threading.Thread(target=worker_loop, args=(app,), name='import-job-worker', daemon=True)
+    thread.start()
+    return thread
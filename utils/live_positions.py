@@ -0,0 +1,217 @@
+# utils/live_positions.py
+# 설명: 관리자 실시간 차량 위치 화면용 메모리 저장소입니다.
+#       - 차량별 마지막 위치: 기사 앱 위치 수신 시 메모리 dict 를 바로 갱신합니다.
+#         동기화 스레드가 LIVE_POSITION_SYNC_INTERVAL 마다 바뀐 차량만 vehicle_latest_positions(차량당 1행)에 쓰고,
+#         다른 프로세스가 쓴 최신 위치를 읽어 합칩니다 (재시작 시에도 이 테이블로 복원).
+#       - 운행 진행률: 오늘 DispatchResult 를 차량별로 집계해 캐시하고, 배차 이벤트(utils/dispatch_events.py)가
+#         발행되면 해당 차량만 무효화합니다. 이벤트 없이 바뀌는 경우를 위해 LIVE_PROGRESS_MAX_AGE 가 지나면 다시 집계.
+#       - 차량 목록(번호/지점/기사명)은 LIVE_VEHICLE_CACHE_SECONDS 동안 캐시합니다.
+#       → 대시보드 조회는 캐시가 유효한 동안 DB 를 전혀 읽지 않습니다.
+
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import case, func, insert, update
+
+from database import db
+from models import DispatchResult, User, Vehicle, VehicleLatestPosition
+from utils import applog, dispatch_events
+
+log = applog.get_logger('live_positions')
+
+ACTIVE_STATUSES = ('assigned', 'in_progress', 'pending')
+
+
+class LiveStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._positions = {}      # 차량 ID → {'recorded_at', 'lat', 'lon', 'speed'}
+        self._dirty = set()       # 공유 테이블에 아직 쓰지 않은 차량
+        self._synced_at = None    # 공유 테이블에서 마지막으로 읽은 updated_at
+        self._vehicles = None     # [{'vehicle_id', 'vehicle_number', 'branch_id', 'driver_name'}]
+        self._vehicles_loaded = 0.0
+        self._progress = {}       # 차량 ID → (집계 시각, 진행률 dict)
+        self._progress_date = None
+        self.vehicle_cache_seconds = 60
+        self.progress_max_age = 60
+
+    def configure(self, config):
+        self.vehicle_cache_seconds = config.get('LIVE_VEHICLE_CACHE_SECONDS', self.vehicle_cache_seconds)
+        self.progress_max_age = config.get('LIVE_PROGRESS_MAX_AGE', self.progress_max_age)
+
+    # ---- 위치 ----
+    def update(self, vehicle_id, point):
+        """수신한 좌표로 갱신 (기존보다 최신일 때만)"""
+        with self._lock:
+            current = self._positions.get(vehicle_id)
+            if current is not None and current['recorded_at'] >= point['recorded_at']:
+                return
+            self._positions[vehicle_id] = {
+                'recorded_at': point['recorded_at'], 'lat': point['lat'],
+                'lon': point['lon'], 'speed': point.get('speed')
+            }
+            self._dirty.add(vehicle_id)
+
+    def sync(self):
+        """바뀐 위치를 공유 테이블에 쓰고, 다른 프로세스가 쓴 위치를 읽어 합침 (앱 컨텍스트 필요)"""
+        with self._lock:
+            dirty = {v: dict(self._positions[v]) for v in self._dirty}
+            self._dirty.clear()
+
+        now = datetime.utcnow()
+        try:
+            if dirty:
+                table = VehicleLatestPosition.__table__
+                existing = {v for (v,) in db.session.query(VehicleLatestPosition.vehicle_id)
+                            .filter(VehicleLatestPosition.vehicle_id.in_(dirty))}
+                rows = [{'vehicle_id': v, 'updated_at': now, **p} for v, p in dirty.items()]
+                updates = [row for row in rows if row['vehicle_id'] in existing]
+                inserts = [row for row in rows if row['vehicle_id'] not in existing]
+                if updates:
+                    db.session.execute(update(VehicleLatestPosition), updates)
+                if inserts:
+                    db.session.execute(insert(table), inserts)
+                db.session.commit()
+
+            query = db.session.query(VehicleLatestPosition)
+            if self._synced_at is not None:
+                query = query.filter(VehicleLatestPosition.updated_at > self._synced_at)
+            for row in query:
+                self._merge_shared(row)
+                if self._synced_at is None or row.updated_at > self._synced_at:
+                    self._synced_at = row.updated_at
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+
+    def _merge_shared(self, row):
+        with self._lock:
+            current = self._positions.get(row.vehicle_id)
+            if current is None or current['recorded_at'] < row.recorded_at:
+                self._positions[row.vehicle_id] = {
+                    'recorded_at': row.recorded_at, 'lat': row.lat, 'lon': row.lon, 'speed': row.speed
+                }
+
+    # ---- 차량 목록 ----
+    def vehicles(self):
+        with self._lock:
+            if self._vehicles is not None and time.monotonic() - self._vehicles_loaded < self.vehicle_cache_seconds:
+                return self._vehicles
+        rows = db.session.query(Vehicle.id, Vehicle.vehicle_number, Vehicle.branch_id, User.name) \
+            .outerjoin(User, User.id == Vehicle.driver_id).order_by(Vehicle.vehicle_number).all()
+        vehicles = [
+            {'vehicle_id': v_id, 'vehicle_number': number, 'branch_id': branch_id, 'driver_name': driver_name}
+            for v_id, number, branch_id, driver_name in rows
+        ]
+        with self._lock:
+            self._vehicles = vehicles
+            self._vehicles_loaded = time.monotonic()
+        return vehicles
+
+    # ---- 운행 진행률 ----
+    def invalidate_progress(self, vehicle_ids=None):
+        with self._lock:
+            if vehicle_ids is None:
+                self._progress.clear()
+            else:
+                for vehicle_id in vehicle_ids:
+                    self._progress.pop(vehicle_id, None)
+
+    def progress(self, vehicle_ids):
+        """오늘 차량별 진행률 {차량 ID: {'total', 'completed', 'cancelled', 'next_stop'}} (없는 것만 한 번에 집계)"""
+        today = date.today()
+        now = time.monotonic()
+        with self._lock:
+            if self._progress_date != today:
+                self._progress.clear()
+                self._progress_date = today
+            cached = {v: self._progress[v] for v in vehicle_ids if v in self._progress}
+        fresh = {v: p for v, (loaded, p) in cached.items() if now - loaded < self.progress_max_age}
+        missing = [v for v in vehicle_ids if v not in fresh]
+        if not missing:
+            return fresh
+
+        loaded = {v: {'total': 0, 'completed': 0, 'cancelled': 0, 'next_stop': None} for v in missing}
+        rows = db.session.query(
+            DispatchResult.vehicle_id,
+            func.count(DispatchResult.id),
+            func.sum(case((DispatchResult.status == 'completed', 1), else_=0)),
+            func.sum(case((DispatchResult.status == 'cancelled', 1), else_=0)),
+            func.min(case((DispatchResult.status.in_(ACTIVE_STATUSES), DispatchResult.stop_order), else_=None))
+        ).filter(
+            DispatchResult.dispatch_date == today,
+            DispatchResult.vehicle_id.in_(missing)
+        ).group_by(DispatchResult.vehicle_id)
+        for vehicle_id, total, completed, cancelled, next_stop in rows:
+            loaded[vehicle_id] = {
+                'total': total, 'completed': int(completed or 0),
+                'cancelled': int(cancelled or 0), 'next_stop': next_stop
+            }
+
+        with self._lock:
+            for vehicle_id, value in loaded.items():
+                self._progress[vehicle_id] = (now, value)
+        fresh.update(loaded)
+        return fresh
+
+    # ---- 조회 ----
+    def snapshot(self, branch_id=None):
+        """지점(None 이면 전체) 차량별 마지막 위치 + 진행률"""
+        vehicles = [v for v in self.vehicles() if branch_id is None or v['branch_id'] == branch_id]
+        progress = self.progress([v['vehicle_id'] for v in vehicles])
+        now = datetime.utcnow()
+        with self._lock:
+            positions = {v['vehicle_id']: self._positions.get(v['vehicle_id']) for v in vehicles}
+
+        result = []
+        for vehicle in vehicles:
+            position = positions[vehicle['vehicle_id']]
+            item = dict(vehicle)
+            item['position'] = None
+            if position:
+                item['position'] = {
+                    'lat': position['lat'], 'lon': position['lon'], 'speed': position['speed'],
+                    'recorded_at': position['recorded_at'].isoformat() + 'Z',
+                    'age_seconds': int((now - position['recorded_at']).total_seconds())
+                }
+            item['progress'] = progress.get(vehicle['vehicle_id'])
+            result.append(item)
+        return result
+
+
+store = LiveStore()
+
+
+def _on_dispatch_event(evt):
+    # 배차 생성/삭제/상태 변경 → 해당 차량 진행률만 다시 집계
+    store.invalidate_progress(evt.vehicle_ids)
+
+
+dispatch_events.broker.add_listener(_on_dispatch_event)
+
+
+def init_app(app):
+    store.configure(app.config)
+
+
+def start_sync(app):
+    """LIVE_POSITION_SYNC_INTERVAL 마다 공유 테이블과 동기화하는 데몬 스레드 (시작 시 한 번 복원)"""
+    interval = app.config.get('LIVE_POSITION_SYNC_INTERVAL', 5)
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    store.sync()
+                except Exception as e:
+                    log.exception('live_positions.sync_failed', '마지막 위치 동기화 실패: %s', e)
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='live-position-sync', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,267 @@
+# utils/notifications.py
+# 설명: 탑승 / 도착 / 곧 도착 / 지연 알림을 보호자(학생 비상연락처, 학생 본인 번호)에게 보내는 발송 대기열입니다.
+#       - 이벤트를 만드는 쪽은 enqueue() 로 notification_outbox 에 INSERT 만 합니다 (같은 트랜잭션, 발송 없음).
+#       - dedup_key(종류:배차:수신자)가 유니크라서 같은 알림은 몇 번 요청돼도 한 건만 쌓입니다
+#         ("곧 도착"은 학생당 한 번, 지연은 10분 단위로 늘어날 때만 다시 보냄).
+#       - 워커는 import_jobs 와 같이 DB 테이블을 큐로 사용: 조건부 UPDATE 로 묶음을 선점하므로 워커가 여러 개여도 중복 발송되지 않습니다.
+#       - 발송 전 정리: 같은 배차에 탑승/도착 알림이 있으면 밀린 "곧 도착"/"지연"은 건너뛰고,
+#         한 수신자에게 가는 여러 알림은 메시지 하나로 합쳐 보냅니다.
+#       - 발송기는 NOTIFY_SENDER 로 교체: 'console'(로그), 'file'(JSON lines), 또는 'module:callable' (문자 API 연동).
+
+import importlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+
+from database import db
+from models import DispatchResult, NotificationOutbox, Student, User, Vehicle
+from utils import applog
+
+log = applog.get_logger('notifications')
+
+KINDS = ('picked_up', 'arrived', 'approaching', 'delay')
+DELAY_STEP = 10  # 지연 알림을 다시 보내는 단위 (분)
+# 같은 배차에 이 알림이 있으면 아직 안 나간 "곧 도착"/"지연"은 의미가 없음
+SUPERSEDES = {'picked_up': ('approaching', 'delay'), 'arrived': ('approaching', 'delay')}
+
+
+def render_message(kind, target, at=None, minutes=None, reason=None):
+    name = target['student_name']
+    vehicle = target['vehicle_number']
+    if kind == 'picked_up':
+        return f"{name} 학생이 {at.strftime('%H:%M')}에 {vehicle} 차량에 탑승했습니다."
+    if kind == 'arrived':
+        return f"{name} 학생이 탄 {vehicle} 차량이 {at.strftime('%H:%M')}에 도착했습니다."
+    if kind == 'approaching':
+        return f"{vehicle} 차량이 약 {minutes}분 후 {name} 학생 탑승 장소에 도착합니다."
+    text = f"{vehicle} 차량이 약 {minutes}분 지연되고 있습니다. ({name} 학생)"
+    return f"{text} 사유: {reason}" if reason else text
+
+
+def dedup_key(kind, dispatch_id, recipient, minutes=None):
+    if kind == 'delay':
+        return f"delay:{dispatch_id}:{recipient}:{(minutes or 0) // DELAY_STEP * DELAY_STEP}"
+    return f"{kind}:{dispatch_id}:{recipient}"
+
+
+def _targets(session, dispatch_ids):
+    """배차 ID → 학생 이름/수신 번호/차량 번호 (조인 쿼리 한 번)"""
+    rows = session.query(
+        DispatchResult.id, DispatchResult.student_id, User.name, User.phone,
+        Student.emergency_contact, Vehicle.vehicle_number
+    ).join(Student, Student.id == DispatchResult.student_id) \
+        .join(User, User.id == Student.user_id) \
+        .join(Vehicle, Vehicle.id == DispatchResult.vehicle_id) \
+        .filter(DispatchResult.id.in_(set(dispatch_ids))).all()
+    targets = {}
+    for dispatch_id, student_id, name, phone, emergency, vehicle_number in rows:
+        # 보호자 번호 우선, 같은 번호는 한 번만
+        recipients = list(dict.fromkeys(p.strip() for p in (emergency, phone) if p and p.strip()))
+        targets[dispatch_id] = {
+            'student_id': student_id, 'student_name': name,
+            'vehicle_number': vehicle_number, 'recipients': recipients
+        }
+    return targets
+
+
+def enqueue(session, kind, dispatch_ids, at=None, minutes=None, reason=None):
+    """배차별 알림을 발송 대기열에 추가 (커밋은 호출하는 쪽), 새로 쌓인 건수 반환 (이미 있는 키는 건너뜀)
+
+    at: 탑승/도착 시각 (배차별로 다르면 {배차ID: 시각}), minutes: 곧 도착/지연 분, reason: 지연 사유
+    """
+    if kind not in KINDS:
+        raise ValueError(f"알 수 없는 알림 종류입니다: {kind}")
+    dispatch_ids = list(dispatch_ids)
+    if not dispatch_ids:
+        return 0
+
+    now = datetime.utcnow()
+    rows = {}
+    for dispatch_id, target in _targets(session, dispatch_ids).items():
+        when = at.get(dispatch_id) if isinstance(at, dict) else at
+        message = render_message(kind, target, at=when or datetime.now(), minutes=minutes, reason=reason)
+        for recipient in target['recipients']:
+            key = dedup_key(kind, dispatch_id, recipient, minutes)
+            rows[key] = {
+                'dedup_key': key, 'kind': kind, 'recipient': recipient,
+                'student_id': target['student_id'], 'dispatch_id': dispatch_id, 'message': message,
+                'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now
+            }
+    if not rows:
+        return 0
+    return _insert_ignoring_duplicates(session, list(rows.values()))
+
+
+def _insert_ignoring_duplicates(session, rows):
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+        stmt = dialect_insert(NotificationOutbox.__table__).on_conflict_do_nothing(index_elements=['dedup_key'])
+        result = session.execute(stmt, rows)
+        return result.rowcount if result.rowcount >= 0 else len(rows)
+    # 그 외 DB: 이미 있는 키를 먼저 걸러냄 (동시 요청 경합은 드묾)
+    existing = {k for (k,) in session.query(NotificationOutbox.dedup_key)
+                .filter(NotificationOutbox.dedup_key.in_([row['dedup_key'] for row in rows]))}
+    rows = [row for row in rows if row['dedup_key'] not in existing]
+    if rows:
+        session.execute(insert(NotificationOutbox.__table__), rows)
+    return len(rows)
+
+
+# ----------------------------------------------------
+# 발송기
+# ----------------------------------------------------
+class ConsoleSender:
+    """개발/테스트용: 로그로만 남김"""
+
+    def send(self, recipient, text):
+        log.info('notifications.console_send', '[알림] %s ← %s', recipient, text, recipient=recipient)
+
+
+class FileSender:
+    """개발/테스트용: 보낸 메시지를 JSON lines 파일에 추가"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, recipient, text):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        line = json.dumps({'to': recipient, 'text': text, 'at': datetime.utcnow().isoformat() + 'Z'}, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+def get_sender(config):
+    """NOTIFY_SENDER 설정으로 발송기 생성 ('module:callable' 은 config 를 받아 send(recipient, text) 객체 반환)"""
+    name = config.get('NOTIFY_SENDER', 'console')
+    if name == 'console':
+        return ConsoleSender()
+    if name == 'file':
+        return FileSender(config['NOTIFY_FILE_PATH'])
+    module_name, _, attr = name.partition(':')
+    if not attr:
+        raise ValueError(f"알 수 없는 발송기 설정입니다: {name}")
+    return getattr(importlib.import_module(module_name), attr)(config)
+
+
+# ----------------------------------------------------
+# 워커
+# ----------------------------------------------------
+def requeue_stale(stale_seconds):
+    """발송 중에 멈춘(워커 중단) 알림을 다시 대기로"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    count = NotificationOutbox.query.filter(
+        NotificationOutbox.status == 'sending', NotificationOutbox.claimed_at < cutoff
+    ).update({'status': 'pending', 'claim_token': None}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        log.warning('notifications.requeued', '발송 중단 알림 %d건 재시도', count)
+    return count
+
+
+def claim_batch(limit):
+    """보낼 차례인 알림을 최대 limit 건 선점 (다른 워커가 먼저 가져간 행은 제외)"""
+    now = datetime.utcnow()
+    ids = [i for (i,) in db.session.query(NotificationOutbox.id).filter(
+        NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now
+    ).order_by(NotificationOutbox.id).limit(limit)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    NotificationOutbox.query.filter(
+        NotificationOutbox.id.in_(ids), NotificationOutbox.status == 'pending'
+    ).update({'status': 'sending', 'claim_token': token, 'claimed_at': now}, synchronize_session=False)
+    db.session.commit()
+    return NotificationOutbox.query.filter_by(claim_token=token, status='sending') \
+        .order_by(NotificationOutbox.id).all()
+
+
+def deliver(rows, sender, max_attempts=5):
+    """선점한 알림 정리 → 수신자별 한 메시지로 발송 → 결과를 기본키 UPDATE 한 번으로 기록"""
+    now = datetime.utcnow()
+    updates = []
+
+    # 탑승/도착 알림이 있는 배차의 "곧 도착"/"지연"은 건너뜀
+    final_kinds = defaultdict(set)
+    for row in rows:
+        final_kinds[(row.dispatch_id, row.recipient)].add(row.kind)
+    to_send = defaultdict(list)
+    for row in rows:
+        kinds = final_kinds[(row.dispatch_id, row.recipient)]
+        if any(row.kind in SUPERSEDES.get(kind, ()) for kind in kinds):
+            updates.append({'id': row.id, 'status': 'skipped', 'claim_token': None})
+        else:
+            to_send[row.recipient].append(row)
+
+    sent = failed = 0
+    for recipient, items in to_send.items():
+        text = '\n'.join(dict.fromkeys(item.message for item in items))
+        try:
+            sender.send(recipient, text)
+        except Exception as e:
+            for item in items:
+                attempts = item.attempts + 1
+                updates.append({
+                    'id': item.id, 'attempts': attempts, 'last_error': str(e)[:500], 'claim_token': None,
+                    'status': 'failed' if attempts >= max_attempts else 'pending',
+                    # 재시도 간격: 30초, 1분, 2분, ...
+                    'next_attempt_at': now + timedelta(seconds=30 * 2 ** (attempts - 1))
+                })
+            failed += len(items)
+            log.warning('notifications.send_failed', '알림 발송 실패: %s', e, recipient=recipient)
+            continue
+        updates.extend({'id': item.id, 'status': 'sent', 'sent_at': now, 'attempts': item.attempts + 1,
+                        'claim_token': None} for item in items)
+        sent += len(items)
+
+    # executemany 는 같은 컬럼 조합끼리 묶어서 실행
+    by_columns = defaultdict(list)
+    for params in updates:
+        by_columns[tuple(sorted(params))].append(params)
+    for params in by_columns.values():
+        db.session.execute(update(NotificationOutbox), params)
+    db.session.commit()
+    log.debug('notifications.delivered', sent=sent, failed=failed, skipped=len(rows) - sent - failed)
+    return sent
+
+
+def worker_loop(app, stop_event=None):
+    """대기 알림을 묶음으로 계속 발송 (별도 프로세스 또는 데몬 스레드에서 실행)"""
+    poll_interval = app.config.get('NOTIFY_POLL_INTERVAL', 2)
+    batch_size = app.config.get('NOTIFY_BATCH_SIZE', 200)
+    max_attempts = app.config.get('NOTIFY_MAX_ATTEMPTS', 5)
+    stale_seconds = app.config.get('NOTIFY_STALE_SECONDS', 300)
+    sender = get_sender(app.config)
+
+    while not (stop_event and stop_event.is_set()):
+        rows = []
+        with app.app_context():
+            try:
+                requeue_stale(stale_seconds)
+                rows = claim_batch(batch_size)
+                if rows:
+                    deliver(rows, sender, max_attempts)
+            except Exception as e:
+                db.session.rollback()
+                log.exception('notifications.worker_error', '알림 워커 오류: %s', e)
+            finally:
+                db.session.remove()
+        # 가득 찬 묶음이면 바로 다음 묶음
+        if len(rows) < batch_size:
+            time.sleep(poll_interval)
+
+
+def start_embedded_worker(app):
+    """웹 프로세스 안에서 알림 워커를 데몬 스레드로 실행 (NOTIFY_WORKER_EMBEDDED=False 면 비활성)"""
+    if not app.config.get('NOTIFY_WORKER_EMBEDDED'):
+        return None
+    thread = threading.Thread(target=worker_loop, args=(app,), name='notification-worker', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,79 @@
+# utils/password_hashing.py
+# 설명: 비밀번호 해시를 프로세스 풀에서 계산하는 서비스입니다.
+#       - werkzeug generate_password_hash 를 그대로 사용하므로 해시 방식/강도는 User.set_password 와 같습니다.
+#       - 명부 업로드처럼 수천 건을 해시할 때(hash_many) CPU 코어 수만큼 나누어 계산합니다. 한 건(hash_password)은 바로 계산.
+#       - PASSWORD_HASH_WORKERS=0 이거나 풀을 만들 수 없으면 현재 프로세스에서 순차 계산합니다.
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash
+
+from utils import applog
+
+log = applog.get_logger('password_hashing')
+
+_lock = threading.Lock()
+_pool = None
+_workers = os.cpu_count() or 1
+
+
+def _hash(password):
+    """워커 프로세스에서 실행되는 함수 (pickle 가능해야 하므로 모듈 최상위에 둠)"""
+    return generate_password_hash(password)
+
+
+def init_app(app):
+    """PASSWORD_HASH_WORKERS 설정 반영 (풀은 첫 사용 시 생성)"""
+    global _workers
+    _workers = app.config.get('PASSWORD_HASH_WORKERS', _workers)
+
+
+def _get_pool():
+    global _pool
+    if _workers <= 0:
+        return None
+    with _lock:
+        if _pool is None:
+            # fork 는 부모의 DB 커넥션/스레드를 복제하므로 spawn 사용
+            # (자식은 app.py 를 __mp_main__ 으로 import — app.py 는 이때 초기화/워커 시작을 하지 않음)
+            _pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
+
+
+def hash_many(passwords):
+    """비밀번호 목록 → 같은 순서의 해시 목록"""
+    passwords = [str(p) for p in passwords]
+    if not passwords:
+        return []
+
+    try:
+        pool = _get_pool()
+        if pool is not None:
+            chunksize = max(1, len(passwords) // (_workers * 4))
+            return list(pool.map(_hash, passwords, chunksize=chunksize))
+    except (BrokenProcessPool, OSError) as e:
+        log.warning('password_hashing.pool_failed', '프로세스 풀 해시 실패, 순차 처리로 전환: %s', e)
+        shutdown()
+
+    return [_hash(p) for p in passwords]
+
+
+def hash_password(password):
+    """비밀번호 한 건 해시 (계정 생성/회원가입용) — 풀 왕복(IPC) 비용이 더 크므로 현재 프로세스에서 계산"""
+    return _hash(str(password))
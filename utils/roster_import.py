@@ -0,0 +1,539 @@
+# utils/roster_import.py
+# 설명: 회원명부 엑셀 스트리밍 임포터입니다.
+#       - openpyxl read_only 모드로 한 행씩 읽어 워크북 전체를 메모리에 올리지 않습니다.
+#       - batch_size 행 단위로 검증 → 중복 제거 → 저장 → 커밋 을 한 묶음으로 처리합니다.
+#       - 배치 저장이 실패하면 그 배치만 롤백되고 다음 배치는 계속 진행됩니다.
+#       - 지점 조회는 임포트당 한 번 만든 인덱스로, 기존 이메일 확인은 배치당 IN 조회 한 번으로 처리합니다.
+#       - mode='upsert': 이메일이 같은 기존 학생은 행 다이제스트를 비교해 달라진 행만 배치 UPDATE 합니다.
+#         (빈 셀은 기존 값 유지, 비밀번호/승인 상태는 변경하지 않음)
+
+import csv
+import hashlib
+import io
+import re
+from collections import Counter, defaultdict
+
+import openpyxl
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import update
+
+from database import db
+from models import User, Student, Branch
+from utils import applog, branch_counters, password_hashing, route_payloads
+
+log = applog.get_logger('roster_import')
+
+COL_NAME = '이름'
+COL_EMAIL = '이메일'
+COL_PASSWORD = '초기비밀번호'
+COL_PHONE = '연락처'
+COL_EMERGENCY = '비상연락망'
+COL_ADDRESS = '주소'
+COL_BRANCH = '지점명'
+COL_CLASS = '클래스명'
+COL_TIME_SLOT = '시간대'
+COL_START_DATE = '수강시작일(YYYY-MM-DD)'
+COL_DURATION = '수강기간(개월)'
+
+IMPORT_MODES = ('insert', 'upsert')
+
+# upsert 비교/갱신 대상 필드 (branch_name 은 파일 표기가 달라도 같은 지점이면 비교하지 않음)
+UPSERT_USER_FIELDS = ('name', 'phone')
+UPSERT_STUDENT_FIELDS = ('branch_id', 'class_name', 'time_slot', 'address', 'emergency_contact',
+                         'start_date', 'end_date')
+
+
+class RowError(Exception):
+    """행 단위 검증 실패"""
+
+
+class ImportResult:
+    """임포트 결과 집계 + 행별 결과 (엑셀 행 번호, 결과, 메시지)"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = 0
+        self.rows = []
+
+    def add(self, row_no, status, message=''):
+        if status == 'created':
+            self.created += 1
+        elif status == 'updated':
+            self.updated += 1
+        elif status == 'unchanged':
+            self.unchanged += 1
+        elif status == 'duplicate':
+            self.skipped += 1
+        else:
+            self.errors += 1
+        self.rows.append((row_no, status, message))
+
+    @property
+    def total(self):
+        return len(self.rows)
+
+
+# ----------------------------------------------------
+# 파일 읽기
+# ----------------------------------------------------
+def clean_value(value):
+    """빈 셀/공백 문자열은 None, 문자열은 strip, 정수형 실수(12345.0)는 int로 정리"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_roster_rows(stream, filename):
+    """업로드 파일에서 (엑셀 행 번호, {헤더: 값}) 를 한 행씩 생성 (완전히 빈 행은 건너뜀)"""
+    filename = (filename or '').lower()
+
+    if filename.endswith('.csv'):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+        reader = csv.reader(text)
+        header = [clean_value(h) for h in next(reader, [])]
+        for row_no, values in enumerate(reader, start=2):
+            cleaned = [clean_value(v) for v in values]
+            if any(v is not None for v in cleaned):
+                yield row_no, dict(zip(header, cleaned))
+        return
+
+    if filename.endswith('.xls'):
+        raise ValueError("xls 형식은 지원하지 않습니다. xlsx 형식으로 저장 후 업로드해주세요.")
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [clean_value(h) for h in next(rows, ())]
+        for row_no, values in enumerate(rows, start=2):
+            cleaned = [clean_value(v) for v in values]
+            if any(v is not None for v in cleaned):
+                yield row_no, dict(zip(header, cleaned))
+    finally:
+        workbook.close()
+
+
+def estimate_rows(path):
+    """진행률 표시용 데이터 행 수 추정 (xlsx 는 시트 크기 정보, csv 는 줄 수)"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    try:
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        return max(max_row - 1, 0) if max_row else None
+    except Exception:
+        return None
+
+
+def iter_batches(rows, size):
+    """행 이터레이터를 size 개씩 묶어서 생성"""
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ----------------------------------------------------
+# 조회 리졸버: 지점 인덱스 + 이메일 중복 판정
+# ----------------------------------------------------
+def normalize_branch_key(name):
+    """공백 제거 + 소문자"""
+    return re.sub(r'\s+', '', name).lower()
+
+
+def fuzzy_branch_key(name):
+    """정규화 키에서 '지점'/'점' 접미사 제거 (예: '동천 지점' → '동천')"""
+    key = normalize_branch_key(name)
+    for suffix in ('지점', '점'):
+        if key.endswith(suffix) and len(key) > len(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+class BranchIndex:
+    """임포트 1회당 한 번 만드는 지점 조회 인덱스 (정확 → 정규화 → 퍼지 → 부분 일치)"""
+
+    def __init__(self, branches):
+        self.exact = {}
+        self.normalized = {}
+        self.fuzzy = {}
+        for branch_id, name in branches:
+            self.exact.setdefault(name, branch_id)
+            self.normalized.setdefault(normalize_branch_key(name), branch_id)
+            self.fuzzy.setdefault(fuzzy_branch_key(name), branch_id)
+        self._cache = {}
+
+    @classmethod
+    def load(cls):
+        return cls(db.session.query(Branch.id, Branch.name).order_by(Branch.id).all())
+
+    def lookup(self, name):
+        """지점명 → 지점 ID (없으면 None), 같은 이름은 캐시"""
+        if name in self._cache:
+            return self._cache[name]
+
+        branch_id = self.exact.get(name)
+        if branch_id is None:
+            key = normalize_branch_key(name)
+            branch_id = self.normalized.get(key) or self.fuzzy.get(fuzzy_branch_key(name))
+            if branch_id is None:
+                # 마지막 수단: 기존 업로드와 같은 양방향 부분 일치
+                for candidate, candidate_id in self.normalized.items():
+                    if key in candidate or candidate in key:
+                        branch_id = candidate_id
+                        break
+
+        self._cache[name] = branch_id
+        return branch_id
+
+
+class ImportResolver:
+    """지점 인덱스와 파일 전체의 이메일 중복 상태를 들고 다니는 리졸버"""
+
+    def __init__(self, current_user, branch_index=None):
+        self.current_user = current_user
+        self.branches = branch_index or BranchIndex.load()
+        self.seen_emails = {}  # 이메일 → 처음 나온 엑셀 행 번호
+
+    # ---- 지점 ----
+    def default_branch(self):
+        """지점명이 없거나 찾지 못했을 때 관리자의 기본 지점 사용"""
+        user = self.current_user
+        if user.role != 'master' and user.branch_id:
+            managed = user.managed_branch
+            return user.branch_id, managed.name if managed else f"지점{user.branch_id}"
+        return None
+
+    def resolve_branch(self, raw_name):
+        branch_name = str(raw_name).strip() if raw_name is not None else ''
+        if not branch_name:
+            fallback = self.default_branch()
+            if not fallback:
+                raise RowError('지점명이 없고 기본 지점도 설정되지 않음')
+            return fallback
+
+        branch_id = self.branches.lookup(branch_name)
+        if branch_id is not None:
+            # 권한 체크 (일반 관리자는 자신의 지점만)
+            if self.current_user.role != 'master' and branch_id != self.current_user.branch_id:
+                raise RowError('권한 없음 - 다른 지점 학생')
+            return branch_id, branch_name
+
+        fallback = self.default_branch()
+        if not fallback:
+            raise RowError(f"지점 '{branch_name}'을 찾을 수 없고 기본 지점도 없음")
+        return fallback
+
+    # ---- 이메일 ----
+    def existing_emails(self, emails):
+        """배치의 이메일 중 이미 가입된 것 (IN 조회 1회)"""
+        if not emails:
+            return set()
+        return {email for (email,) in db.session.query(User.email).filter(User.email.in_(set(emails)))}
+
+    def split_duplicates(self, prepared):
+        """(신규 행 목록, [(행, 사유)] 중복 목록) — 파일 내 중복은 앞선 행만 살림"""
+        existing = self.existing_emails([item.email for item in prepared])
+        unique = []
+        duplicates = []
+        for item in prepared:
+            first_row = self.seen_emails.get(item.email)
+            if first_row is not None:
+                duplicates.append((item, f'파일 내 중복 이메일 ({item.email}, {first_row}행)'))
+                continue
+            self.seen_emails[item.email] = item.row_no
+            if item.email in existing:
+                duplicates.append((item, f'이미 존재하는 이메일 ({item.email})'))
+                continue
+            unique.append(item)
+        return unique, duplicates
+
+    def existing_students(self, emails):
+        """upsert 용: 배치 이메일의 기존 계정/학생 정보 {이메일: 행} (IN 조회 1회)"""
+        if not emails:
+            return {}
+        rows = db.session.query(
+            User.email, User.id.label('user_id'), User.role, User.name, User.phone,
+            Student.id.label('student_id'), Student.status,
+            *(getattr(Student, field) for field in UPSERT_STUDENT_FIELDS)
+        ).outerjoin(Student, Student.user_id == User.id).filter(User.email.in_(set(emails))).all()
+        return {row.email: row for row in rows}
+
+    def split_upserts(self, prepared):
+        """(신규 행 목록, [(행, 기존 정보)] 목록, [(행, 사유)] 파일 내 중복 목록)"""
+        existing = self.existing_students([item.email for item in prepared])
+        new_items = []
+        matched = []
+        duplicates = []
+        for item in prepared:
+            first_row = self.seen_emails.get(item.email)
+            if first_row is not None:
+                duplicates.append((item, f'파일 내 중복 이메일 ({item.email}, {first_row}행)'))
+                continue
+            self.seen_emails[item.email] = item.row_no
+            record = existing.get(item.email)
+            if record is None:
+                new_items.append(item)
+            else:
+                matched.append((item, record))
+        return new_items, matched, duplicates
+
+
+def row_digest(values):
+    """비교용 행 다이제스트 (필드 순서 고정, None 과 빈 문자열은 같게 취급)"""
+    text = '\x1f'.join('' if value is None else str(value) for value in values)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# ----------------------------------------------------
+# 임포터
+# ----------------------------------------------------
+class PreparedRow:
+    """검증을 통과한 한 행 (DB 저장 직전 값)"""
+
+    __slots__ = ('row_no', 'name', 'email', 'password', 'phone', 'branch_id', 'branch_name',
+                 'class_name', 'time_slot', 'address', 'emergency_contact', 'start_date', 'end_date')
+
+    def __init__(self, **values):
+        for key, value in values.items():
+            setattr(self, key, value)
+
+
+class RowUpdate:
+    """upsert 로 바뀐 기존 학생 한 명 (변경된 필드만)"""
+
+    __slots__ = ('item', 'record', 'user_changes', 'student_changes')
+
+    def __init__(self, item, record, user_changes, student_changes):
+        self.item = item
+        self.record = record
+        self.user_changes = user_changes
+        self.student_changes = student_changes
+
+    @property
+    def row_no(self):
+        return self.item.row_no
+
+
+class RosterImporter:
+    """회원명부를 배치 단위로 검증/저장하는 임포터 (mode: insert=신규만 등록, upsert=기존 학생 갱신 포함)"""
+
+    def __init__(self, current_user, batch_size=500, mode='insert'):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"지원하지 않는 업로드 방식입니다: {mode}")
+        self.current_user = current_user
+        self.batch_size = max(int(batch_size), 1)
+        self.mode = mode
+        self.resolver = None
+
+    def run(self, stream, filename, on_batch=None):
+        """on_batch(result) 는 배치 커밋 후마다 호출 (백그라운드 작업 진행률 갱신용)"""
+        result = ImportResult()
+        self.resolver = ImportResolver(self.current_user)
+        rows = iter_roster_rows(stream, filename)
+        for batch_no, batch in enumerate(iter_batches(rows, self.batch_size), start=1):
+            self.import_batch(batch, result)
+            log.debug('roster_import.batch', batch=batch_no, rows=len(batch), created=result.created,
+                      updated=result.updated, skipped=result.skipped, errors=result.errors)
+            if on_batch:
+                on_batch(result)
+        return result
+
+    # ---- 배치 처리 ----
+    def import_batch(self, batch, result):
+        prepared = []
+        for row_no, row in batch:
+            try:
+                prepared.append(self.prepare_row(row_no, row))
+            except RowError as e:
+                result.add(row_no, 'error', str(e))
+            except Exception as e:
+                log.warning('roster_import.row_error', '%d행 처리 중 오류: %s', row_no, e)
+                result.add(row_no, 'error', f'처리 중 오류: {e}')
+
+        if self.mode == 'upsert':
+            to_insert, to_update = self.split_upserts(prepared, result)
+        else:
+            to_insert, to_update = self.drop_duplicates(prepared, result), []
+        if not to_insert and not to_update:
+            return
+
+        try:
+            if to_insert:
+                self.insert_rows(to_insert)
+            if to_update:
+                self.update_rows(to_update)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.error('roster_import.batch_failed', '배치 저장 실패: %s', e, rows=len(to_insert) + len(to_update))
+            for item in to_insert + to_update:
+                result.add(item.row_no, 'error', f'배치 저장 실패: {e}')
+            return
+
+        for item in to_insert:
+            result.add(item.row_no, 'created')
+        for change in to_update:
+            result.add(change.row_no, 'updated', ', '.join({**change.user_changes, **change.student_changes}))
+
+    def drop_duplicates(self, prepared, result):
+        unique, duplicates = self.resolver.split_duplicates(prepared)
+        for item, reason in duplicates:
+            result.add(item.row_no, 'duplicate', reason)
+        return unique
+
+    def split_upserts(self, prepared, result):
+        """(신규 등록할 행, 변경된 기존 학생 RowUpdate 목록) — 변경 없는 행은 여기서 결과 처리"""
+        new_items, matched, duplicates = self.resolver.split_upserts(prepared)
+        for item, reason in duplicates:
+            result.add(item.row_no, 'duplicate', reason)
+
+        changes = []
+        for item, record in matched:
+            try:
+                change = self.diff_row(item, record)
+            except RowError as e:
+                result.add(item.row_no, 'error', str(e))
+                continue
+            if change is None:
+                result.add(item.row_no, 'unchanged')
+            else:
+                changes.append(change)
+        return new_items, changes
+
+    def diff_row(self, item, record):
+        """기존 학생과 비교해 바뀐 필드만 담은 RowUpdate (같으면 None), 빈 셀은 기존 값 유지"""
+        if record.role != 'student':
+            raise RowError(f'학생 계정이 아닌 이메일 ({item.email})')
+        if record.student_id is None:
+            raise RowError(f'학생 정보가 없는 계정 ({item.email})')
+        if self.current_user.role != 'master' and record.branch_id != self.current_user.branch_id:
+            raise RowError('권한 없음 - 다른 지점 학생')
+
+        fields = UPSERT_USER_FIELDS + UPSERT_STUDENT_FIELDS
+        current = [getattr(record, field) for field in fields]
+        merged = [
+            value if value not in (None, '') else old
+            for value, old in zip((getattr(item, field) for field in fields), current)
+        ]
+        if row_digest(merged) == row_digest(current):
+            return None
+
+        changed = {field: new for field, new, old in zip(fields, merged, current) if new != old}
+        user_changes = {f: changed[f] for f in UPSERT_USER_FIELDS if f in changed}
+        student_changes = {f: changed[f] for f in UPSERT_STUDENT_FIELDS if f in changed}
+        if 'branch_id' in student_changes:
+            student_changes['branch_name'] = item.branch_name
+        return RowUpdate(item, record, user_changes, student_changes)
+
+    def update_rows(self, changes):
+        """바뀐 필드만 기본키 기준 배치 UPDATE (executemany) — ORM 이벤트가 없으므로 지점 카운터/경로 JSON 은 직접 반영"""
+        user_params = [{'id': c.record.user_id, **c.user_changes} for c in changes if c.user_changes]
+        student_params = [{'id': c.record.student_id, **c.student_changes} for c in changes if c.student_changes]
+        if user_params:
+            db.session.execute(update(User), user_params)
+        if student_params:
+            db.session.execute(update(Student), student_params)
+        # 기사 경로에 표시되는 이름/연락처/주소가 바뀐 학생은 미리 만든 경로 JSON 도 무효화
+        route_changed = [c.record.student_id for c in changes
+                         if c.user_changes or 'address' in c.student_changes]
+        if route_changed:
+            route_payloads.invalidate_students(db.session, route_changed)
+
+        deltas = defaultdict(Counter)
+        for change in changes:
+            new_branch = change.student_changes.get('branch_id')
+            if new_branch is None:
+                continue
+            fields = ['students']
+            if change.record.status in ('approved', 'pending'):
+                fields.append(f'{change.record.status}_students')
+            for field in fields:
+                deltas[change.record.branch_id][field] -= 1
+                deltas[new_branch][field] += 1
+        if deltas:
+            branch_counters.apply_deltas(db.session, deltas)
+
+    def insert_rows(self, items):
+        # 해시는 프로세스 풀에서 배치 단위로 계산
+        hashes = password_hashing.hash_many(item.password for item in items)
+        users = [
+            User(name=item.name, email=item.email, phone=item.phone, role='student', password_hash=password_hash)
+            for item, password_hash in zip(items, hashes)
+        ]
+        db.session.add_all(users)
+        db.session.flush()  # 사용자 ID 생성
+
+        db.session.add_all([
+            Student(
+                user_id=user.id,
+                branch_id=item.branch_id,
+                branch_name=item.branch_name,
+                class_name=item.class_name,
+                time_slot=item.time_slot,
+                address=item.address,
+                emergency_contact=item.emergency_contact,
+                start_date=item.start_date,
+                end_date=item.end_date,
+                status='approved'
+            )
+            for user, item in zip(users, items)
+        ])
+
+    # ---- 행 검증 ----
+    def prepare_row(self, row_no, row):
+        name = row.get(COL_NAME)
+        email = row.get(COL_EMAIL)
+        if email is None or name is None:
+            raise RowError('필수 데이터 누락 (이름/이메일)')
+        password = row.get(COL_PASSWORD)
+        if password is None:
+            raise RowError('초기비밀번호 누락')
+
+        start_date, end_date = self.parse_period(row_no, row)
+        branch_id, branch_name = self.resolver.resolve_branch(row.get(COL_BRANCH))
+
+        return PreparedRow(
+            row_no=row_no,
+            name=str(name),
+            email=str(email),
+            password=str(password),
+            phone=str(row[COL_PHONE]) if row.get(COL_PHONE) is not None else '',
+            branch_id=branch_id,
+            branch_name=branch_name,
+            class_name=str(row.get(COL_CLASS) or ''),
+            time_slot=str(row.get(COL_TIME_SLOT) or ''),
+            address=str(row.get(COL_ADDRESS) or ''),
+            emergency_contact=str(row.get(COL_EMERGENCY) or ''),
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def parse_period(self, row_no, row):
+        """수강 시작일/종료일 (변환 실패 시 기간 없이 등록)"""
+        start_date = None
+        end_date = None
+        if row.get(COL_START_DATE) is not None:
+            try:
+                start_date = pd.to_datetime(row[COL_START_DATE]).date()
+                if row.get(COL_DURATION) is not None:
+                    end_date = start_date + relativedelta(months=int(row[COL_DURATION]))
+            except Exception as e:
+                log.debug('roster_import.date_parse_failed', '%d행 날짜 변환 실패: %s', row_no, e)
+        return start_date, end_date
@@ -0,0 +1,278 @@
+# utils/roster_validation.py
+# 설명: 회원명부 업로드 사전 검증 (dry-run, DB 에 아무것도 저장하지 않음)
+#       - 시트 전체를 pandas DataFrame 으로 읽어 컬럼 단위로 한 번에 검증합니다.
+#         (필수값, 이메일 형식, 파일 내/기존 회원 중복, 날짜·수강기간, 지점 권한, 클래스·시간대 존재 여부)
+#       - 수강 종료일은 relativedelta(months=n) 과 같은 규칙(말일 보정)으로 벡터 연산해 함께 보여줍니다.
+#       - 오류 셀에 색과 메모를 단 검증 결과 워크북을 만들어, 한 번에 고쳐 다시 올릴 수 있게 합니다.
+
+import io
+from collections import Counter, defaultdict
+from datetime import date, datetime, time as dt_time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.comments import Comment
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from database import db
+from models import Class, TimeSlot, User
+from utils.roster_import import (
+    COL_NAME, COL_EMAIL, COL_PASSWORD, COL_BRANCH, COL_CLASS, COL_TIME_SLOT,
+    COL_START_DATE, COL_DURATION, ImportResolver, RowError, clean_value,
+)
+
+COL_END_DATE = '수강종료일(계산)'
+COL_RESULT = '검증결과'
+REQUIRED_COLUMNS = (COL_NAME, COL_EMAIL, COL_PASSWORD)
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+EMAIL_LOOKUP_CHUNK = 500
+
+
+class ValidationReport:
+    """검증 결과: 원본 DataFrame(index = 엑셀 행 번호) + 행별 [(컬럼, 메시지)]"""
+
+    def __init__(self, frame, errors):
+        self.frame = frame
+        self.errors = errors
+
+    @property
+    def total(self):
+        return len(self.frame)
+
+    @property
+    def error_rows(self):
+        return len(self.errors)
+
+    def summary(self):
+        """오류 메시지 종류별 건수"""
+        counter = Counter()
+        for row_errors in self.errors.values():
+            for column, message in row_errors:
+                counter[f'{column}: {message.split(" (")[0]}'] += 1
+        return counter
+
+    def workbook_bytes(self):
+        return write_error_workbook(self)
+
+
+# ----------------------------------------------------
+# 읽기
+# ----------------------------------------------------
+def read_roster_frame(stream, filename):
+    """업로드 파일 → 정리된 DataFrame (index 는 엑셀 행 번호, 완전히 빈 행 제외)"""
+    filename = (filename or '').lower()
+    if filename.endswith('.csv'):
+        frame = pd.read_csv(stream, dtype=object, encoding='utf-8-sig', keep_default_na=False)
+    elif filename.endswith('.xls'):
+        raise ValueError("xls 형식은 지원하지 않습니다. xlsx 형식으로 저장 후 업로드해주세요.")
+    else:
+        frame = pd.read_excel(stream, dtype=object, engine='openpyxl')
+
+    frame.columns = [str(c).strip() for c in frame.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"필수 컬럼이 없습니다: {', '.join(missing)}")
+
+    frame.index = frame.index + 2  # 1행은 헤더
+    frame = frame.apply(lambda column: column.map(clean_value)).astype(object)
+    frame = frame.where(frame.notna(), None)
+    return frame.dropna(how='all')
+
+
+def text_column(frame, name):
+    """컬럼을 문자열 Series 로 (없는 컬럼/빈 칸은 None, 시간 셀은 HH:MM)"""
+    if name not in frame.columns:
+        return pd.Series(None, index=frame.index, dtype=object)
+
+    def to_text(value):
+        if value is None:
+            return None
+        if isinstance(value, dt_time):
+            return value.strftime('%H:%M')
+        return str(value)
+
+    return frame[name].map(to_text).astype(object)
+
+
+# ----------------------------------------------------
+# 검증
+# ----------------------------------------------------
+def add_months(start, months):
+    """start + months 개월 (relativedelta 와 같이 말일 보정), 벡터 연산"""
+    total = start.dt.year * 12 + (start.dt.month - 1) + months.astype(int)
+    years = total // 12
+    month_numbers = total % 12 + 1
+    first_days = pd.to_datetime(pd.DataFrame({'year': years, 'month': month_numbers, 'day': 1}))
+    days = np.minimum(start.dt.day, first_days.dt.days_in_month)
+    return pd.to_datetime(pd.DataFrame({'year': years, 'month': month_numbers, 'day': days})).dt.date
+
+
+def existing_emails(emails):
+    """이미 가입된 이메일 (EMAIL_LOOKUP_CHUNK 개씩 IN 조회)"""
+    found = set()
+    for i in range(0, len(emails), EMAIL_LOOKUP_CHUNK):
+        chunk = emails[i:i + EMAIL_LOOKUP_CHUNK]
+        found.update(email for (email,) in db.session.query(User.email).filter(User.email.in_(chunk)))
+    return found
+
+
+def load_catalog():
+    """(지점ID, 클래스명) 과 (지점ID, 클래스명, 시간대) 집합 — 시간대는 '08:00~10:00' 의 시작 시간도 허용"""
+    classes = set()
+    slots = set()
+    rows = db.session.query(Class.branch_id, Class.name, TimeSlot.time) \
+        .outerjoin(TimeSlot, TimeSlot.class_id == Class.id).all()
+    for branch_id, class_name, slot in rows:
+        classes.add((branch_id, class_name))
+        if slot:
+            slots.add((branch_id, class_name, slot))
+            slots.add((branch_id, class_name, slot.split('~')[0].strip()))
+    return classes, slots
+
+
+def validate_roster(stream, filename, current_user, mode='insert'):
+    frame = read_roster_frame(stream, filename)
+    errors = defaultdict(list)
+
+    def flag(mask, column, message):
+        """mask 가 True 인 행에 오류 추가 (message 는 문자열 또는 행별 Series)"""
+        for row_no in mask[mask].index:
+            errors[row_no].append((column, message if isinstance(message, str) else message[row_no]))
+
+    names = text_column(frame, COL_NAME)
+    emails = text_column(frame, COL_EMAIL)
+    passwords = text_column(frame, COL_PASSWORD)
+
+    # 🔹 필수값
+    flag(names.isna(), COL_NAME, '이름 누락')
+    flag(emails.isna(), COL_EMAIL, '이메일 누락')
+    flag(passwords.isna(), COL_PASSWORD, '초기비밀번호 누락')
+
+    # 🔹 이메일 형식 / 파일 내 중복 / 기존 회원
+    has_email = emails.notna()
+    flag(has_email & ~emails.str.match(EMAIL_PATTERN, na=False), COL_EMAIL, '이메일 형식 오류')
+
+    duplicated = has_email & emails.duplicated(keep='first')
+    if duplicated.any():
+        present = emails[has_email]
+        first_rows = pd.Series(present.index, index=present.values)
+        first_rows = first_rows[~first_rows.index.duplicated()]
+        flag(duplicated, COL_EMAIL, emails.map(first_rows).map(lambda row: f'파일 내 중복 이메일 ({row}행과 중복)'))
+
+    # upsert 방식에서는 기존 회원 행이 갱신 대상이므로 오류가 아님
+    if mode != 'upsert':
+        existing = existing_emails(emails[has_email].unique().tolist())
+        flag(emails.isin(existing), COL_EMAIL, '이미 가입된 이메일')
+
+    # 🔹 수강 시작일 / 기간 → 종료일
+    raw_start = frame[COL_START_DATE] if COL_START_DATE in frame.columns else pd.Series(None, index=frame.index)
+    start = pd.to_datetime(raw_start, errors='coerce', format='mixed')
+    flag(raw_start.notna() & start.isna(), COL_START_DATE, '날짜 형식 오류 (YYYY-MM-DD)')
+
+    raw_months = frame[COL_DURATION] if COL_DURATION in frame.columns else pd.Series(None, index=frame.index)
+    months = pd.to_numeric(raw_months, errors='coerce')
+    bad_months = raw_months.notna() & (months.isna() | (months < 0) | (months % 1 != 0))
+    flag(bad_months, COL_DURATION, '수강기간은 0 이상의 정수(개월)')
+
+    end_dates = pd.Series(None, index=frame.index, dtype=object)
+    computable = start.notna() & months.notna() & ~bad_months
+    if computable.any():
+        end_dates[computable] = add_months(start[computable], months[computable])
+
+    # 🔹 지점 (고유 지점명별로 한 번만 해석)
+    resolver = ImportResolver(current_user)
+    branch_names = text_column(frame, COL_BRANCH).fillna('')
+    resolved = {}
+    for name in branch_names.unique():
+        try:
+            resolved[name] = (resolver.resolve_branch(name or None)[0], None)
+        except RowError as e:
+            resolved[name] = (None, str(e))
+    branch_ids = branch_names.map(lambda n: resolved[n][0])
+    branch_errors = branch_names.map(lambda n: resolved[n][1])
+    flag(branch_errors.notna(), COL_BRANCH, branch_errors)
+
+    # 🔹 클래스 / 시간대 존재 여부 (해석된 지점 기준)
+    class_names = text_column(frame, COL_CLASS)
+    time_slots = text_column(frame, COL_TIME_SLOT)
+    catalog_classes, catalog_slots = load_catalog()
+    checkable = branch_ids.notna() & class_names.notna()
+    class_keys = pd.MultiIndex.from_arrays([branch_ids.astype(object), class_names])
+    slot_keys = pd.MultiIndex.from_arrays([branch_ids.astype(object), class_names, time_slots])
+    class_ok = pd.Series(class_keys.isin(list(catalog_classes)), index=frame.index)
+    slot_ok = pd.Series(slot_keys.isin(list(catalog_slots)), index=frame.index)
+    flag(checkable & ~class_ok, COL_CLASS, '해당 지점에 없는 클래스')
+    flag(checkable & class_ok & time_slots.notna() & ~slot_ok, COL_TIME_SLOT, '해당 클래스에 없는 시간대')
+
+    frame = frame.copy()
+    frame[COL_END_DATE] = end_dates
+    return ValidationReport(frame, dict(errors))
+
+
+# ----------------------------------------------------
+# 결과 워크북
+# ----------------------------------------------------
+def write_error_workbook(report):
+    """원본 컬럼 + 계산된 종료일 + 검증결과, 오류 셀은 빨간 배경과 메모로 표시"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = '검증결과'
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    error_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    ok_fill = PatternFill(start_color="D5E8D4", end_color="D5E8D4", fill_type="solid")
+
+    columns = [c for c in report.frame.columns if c != COL_END_DATE] + [COL_END_DATE, COL_RESULT]
+    column_index = {name: i for i, name in enumerate(columns, 1)}
+    sheet.append(columns)
+    for cell in sheet[1]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+
+    for out_row, (row_no, values) in enumerate(report.frame.iterrows(), start=2):
+        row_errors = report.errors.get(row_no, [])
+        for name in columns[:-1]:
+            value = values.get(name)
+            if isinstance(value, pd.Timestamp):
+                value = value.date()
+            cell = sheet.cell(row=out_row, column=column_index[name], value=value)
+            if isinstance(value, (date, datetime)):
+                cell.number_format = 'yyyy-mm-dd'
+
+        messages = defaultdict(list)
+        for column, message in row_errors:
+            messages[column].append(message)
+        for column, column_messages in messages.items():
+            cell = sheet.cell(row=out_row, column=column_index.get(column, column_index[COL_RESULT]))
+            cell.fill = error_fill
+            cell.comment = Comment('\n'.join(column_messages), '검증')
+
+        result_cell = sheet.cell(row=out_row, column=column_index[COL_RESULT])
+        if row_errors:
+            result_cell.value = f"{row_no}행: " + '; '.join(f'{c} - {m}' for c, m in row_errors)
+            result_cell.fill = error_fill
+        else:
+            result_cell.value = '정상'
+            result_cell.fill = ok_fill
+
+    sheet.freeze_panes = 'A2'
+    for name, idx in column_index.items():
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(idx)].width = 60 if name == COL_RESULT else 16
+
+    # 요약 시트
+    summary = workbook.create_sheet('요약')
+    summary.append(['전체 행', report.total])
+    summary.append(['오류 행', report.error_rows])
+    summary.append(['정상 행', report.total - report.error_rows])
+    summary.append([])
+    summary.append(['오류 유형', '건수'])
+    for message, count in report.summary().most_common():
+        summary.append([message, count])
+    summary.column_dimensions['A'].width = 40
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
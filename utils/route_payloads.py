@@ -0,0 +1,343 @@
+# utils/route_payloads.py
+# 설명: 기사 화면(driver_view_route)에 내려줄 (차량, 날짜)별 경로 JSON 을 미리 만들어 route_payloads 에 저장합니다.
+#       - 기사 화면은 기본키 조회 한 번으로 저장된 JSON 을 그대로 템플릿에 넣습니다 (학생/사용자 지연 로딩 없음).
+#       - DispatchResult 추가/변경/삭제, 경로에 표시되는 학생(주소)·사용자(이름/연락처)·차량(번호/기사) 변경 시
+#         flush 중에 해당 (차량, 날짜) 행을 지우고, 커밋 후 백그라운드 스레드가 다시 만듭니다.
+#       - Query.delete()/update() 같은 일괄 작업은 이벤트가 없으므로 호출하는 쪽에서 invalidate()/invalidate_students() 호출.
+#       - version 은 payload 해시라서 내용이 같으면 다시 만들어도 바뀌지 않습니다 (오프라인 동기화 기준값).
+#       - bundle(): 기사 앱이 가진 version 을 받아 바뀐 정류장만 돌려줍니다. 최근 버전의 payload 는
+#         프로세스 메모리(ROUTE_PAYLOAD_HISTORY 개)에 남겨 두고, 모르는 버전(재시작/다른 프로세스)이면 전체를 보냅니다.
+
+import hashlib
+import json
+import queue
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+from sqlalchemy import event, inspect, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import db
+from models import DispatchResult, RoutePayload, Student, User, Vehicle
+from utils import applog
+
+log = applog.get_logger('route_payloads')
+
+_DIRTY_KEY = '_route_payload_dirty'
+_REBUILD_KEY = '_route_payload_rebuild'
+MINUTES_PER_STOP = 7  # 정류장당 예상 소요시간 (경로 API 연동 전 기본값)
+
+# DispatchResult.status → 기사 화면 상태
+CLIENT_STATUS = {
+    'assigned': 'pending',
+    'pending': 'pending',
+    'in_progress': 'in-progress',
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+}
+
+_rebuild_queue = queue.Queue()
+
+# version → payload JSON (델타 계산용 최근 버전, LRU)
+_history = OrderedDict()
+_history_lock = threading.Lock()
+_history_size = 256
+
+
+# ----------------------------------------------------
+# payload 생성
+# ----------------------------------------------------
+def build_payload(vehicle_id, dispatch_date):
+    """(차량, 날짜) 경로 dict — 학생/사용자는 한 번의 조인 쿼리로 조회"""
+    vehicle = db.session.query(Vehicle.vehicle_number, User.name) \
+        .outerjoin(User, User.id == Vehicle.driver_id).filter(Vehicle.id == vehicle_id).first()
+    rows = db.session.query(
+        DispatchResult.id, DispatchResult.stop_order, DispatchResult.status,
+        DispatchResult.pickup_time, DispatchResult.arrival_time,
+        Student.id, Student.address, User.name, User.phone
+    ).join(Student, Student.id == DispatchResult.student_id) \
+        .join(User, User.id == Student.user_id) \
+        .filter(DispatchResult.vehicle_id == vehicle_id, DispatchResult.dispatch_date == dispatch_date) \
+        .order_by(DispatchResult.stop_order, DispatchResult.id).all()
+
+    stops = [
+        {
+            'dispatch_id': dispatch_id,
+            'id': student_id,
+            'name': name,
+            'address': address or '주소 미등록',
+            'phone': phone or '연락처 미등록',
+            'status': CLIENT_STATUS.get(status, 'pending'),
+            'pickupOrder': stop_order or 0,
+            'estimatedTime': MINUTES_PER_STOP,
+            'pickupTime': pickup_time.strftime('%H:%M') if pickup_time else None,
+            'arrivalTime': arrival_time.strftime('%H:%M') if arrival_time else None,
+        }
+        for dispatch_id, stop_order, status, pickup_time, arrival_time, student_id, address, name, phone in rows
+    ]
+    return {
+        'vehicle_id': vehicle_id,
+        'date': dispatch_date.strftime('%Y-%m-%d'),
+        'vehicle': vehicle.vehicle_number if vehicle else '',
+        'driver': (vehicle.name if vehicle else None) or '',
+        'students': stops,
+    }
+
+
+def encode(payload):
+    """HTML <script> 안에 그대로 넣어도 안전한 JSON 문자열 + 버전 해시"""
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    text = text.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], text
+
+
+def rebuild(vehicle_id, dispatch_date):
+    """다시 만들어 저장하고 (version, JSON) 반환"""
+    version, text = encode(build_payload(vehicle_id, dispatch_date))
+    row = db.session.get(RoutePayload, (vehicle_id, dispatch_date))
+    if row is None:
+        db.session.add(RoutePayload(vehicle_id=vehicle_id, dispatch_date=dispatch_date,
+                                    version=version, payload=text))
+    else:
+        row.version = version
+        row.payload = text
+        row.built_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 다른 요청/스레드가 먼저 저장함 — 내용은 같으므로 무시
+        db.session.rollback()
+    _remember(version, text)
+    return version, text
+
+
+def get(vehicle_id, dispatch_date):
+    """(version, JSON) — 저장된 값이 있으면 기본키 조회 한 번, 없으면 만들어 저장"""
+    row = db.session.query(RoutePayload.version, RoutePayload.payload) \
+        .filter_by(vehicle_id=vehicle_id, dispatch_date=dispatch_date).first()
+    if row is not None:
+        _remember(row.version, row.payload)
+        return row.version, row.payload
+    return rebuild(vehicle_id, dispatch_date)
+
+
+# ----------------------------------------------------
+# 오프라인 번들: 전체 / 바뀐 정류장만 / 변경 없음
+# ----------------------------------------------------
+def _remember(version, text):
+    with _history_lock:
+        _history[version] = text
+        _history.move_to_end(version)
+        while len(_history) > _history_size:
+            _history.popitem(last=False)
+
+
+def _recall(version):
+    with _history_lock:
+        return _history.get(version)
+
+
+def bundle(vehicle_id, dispatch_date, since=None):
+    """기사 앱 동기화 응답 dict
+
+    - mode='unchanged': since 가 현재 버전과 같음 (본문 없음)
+    - mode='delta'    : since 버전 대비 바뀐/추가된 정류장(changed)과 빠진 배차 ID(removed)
+    - mode='full'     : 처음 요청이거나 since 버전을 모를 때 전체 경로(route)
+    """
+    version, text = get(vehicle_id, dispatch_date)
+    if since == version:
+        return {'mode': 'unchanged', 'version': version}
+
+    payload = json.loads(text)
+    previous = _recall(since) if since else None
+    if previous is not None:
+        previous = json.loads(previous)
+        if (previous['vehicle_id'], previous['date']) != (payload['vehicle_id'], payload['date']):
+            previous = None
+    if previous is None:
+        return {'mode': 'full', 'version': version, 'route': payload}
+
+    old_stops = {stop['dispatch_id']: stop for stop in previous['students']}
+    new_ids = {stop['dispatch_id'] for stop in payload['students']}
+    return {
+        'mode': 'delta',
+        'version': version,
+        'base': since,
+        'vehicle': payload['vehicle'],
+        'driver': payload['driver'],
+        'changed': [stop for stop in payload['students'] if old_stops.get(stop['dispatch_id']) != stop],
+        'removed': [dispatch_id for dispatch_id in old_stops if dispatch_id not in new_ids],
+    }
+
+
+# ----------------------------------------------------
+# 무효화: ORM 이벤트 → flush 중 삭제 → 커밋 후 재생성 예약
+# ----------------------------------------------------
+def _pending(session):
+    return session.info.setdefault(_DIRTY_KEY, {'keys': set(), 'students': set(), 'users': set(), 'vehicles': set()})
+
+
+def _history_values(target, name):
+    history = inspect(target).attrs[name].history
+    values = set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+    return values or {getattr(target, name)}
+
+
+def _attrs_changed(target, names):
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _record_dispatch(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    keys = _pending(session)['keys']
+    for vehicle_id in _history_values(target, 'vehicle_id'):
+        for dispatch_date in _history_values(target, 'dispatch_date'):
+            if vehicle_id is not None and dispatch_date is not None:
+                keys.add((vehicle_id, dispatch_date))
+
+
+event.listen(DispatchResult, 'after_insert', _record_dispatch)
+event.listen(DispatchResult, 'after_delete', _record_dispatch)
+
+
+@event.listens_for(DispatchResult, 'after_update')
+def _dispatch_updated(mapper, connection, target):
+    if _attrs_changed(target, ('vehicle_id', 'dispatch_date', 'stop_order', 'status', 'student_id',
+                               'pickup_time', 'arrival_time')):
+        _record_dispatch(mapper, connection, target)
+
+
+@event.listens_for(Student, 'after_update')
+def _student_updated(mapper, connection, target):
+    if _attrs_changed(target, ('address', 'user_id')):
+        session = Session.object_session(target)
+        if session is not None:
+            _pending(session)['students'].add(target.id)
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    if _attrs_changed(target, ('name', 'phone')):
+        session = Session.object_session(target)
+        if session is not None:
+            _pending(session)['users'].add(target.id)
+
+
+@event.listens_for(Vehicle, 'after_update')
+def _vehicle_updated(mapper, connection, target):
+    if _attrs_changed(target, ('vehicle_number', 'driver_id')):
+        session = Session.object_session(target)
+        if session is not None:
+            _pending(session)['vehicles'].add(target.id)
+
+
+def _affected_keys(connection, students=(), users=(), vehicles=()):
+    """오늘 이후 경로 중 해당 학생/사용자/차량이 들어간 (차량, 날짜)"""
+    dispatch = DispatchResult.__table__
+    student = Student.__table__
+    vehicle = Vehicle.__table__
+    today = date.today()
+    keys = set()
+    base = select(dispatch.c.vehicle_id, dispatch.c.dispatch_date).where(dispatch.c.dispatch_date >= today).distinct()
+    if students:
+        keys.update(connection.execute(base.where(dispatch.c.student_id.in_(students))).all())
+    if users:
+        # 학생 본인 이름/연락처 또는 기사 이름
+        keys.update(connection.execute(base.join(student, student.c.id == dispatch.c.student_id)
+                                       .where(student.c.user_id.in_(users))).all())
+        keys.update(connection.execute(base.join(vehicle, vehicle.c.id == dispatch.c.vehicle_id)
+                                       .where(vehicle.c.driver_id.in_(users))).all())
+    if vehicles:
+        keys.update(connection.execute(base.where(dispatch.c.vehicle_id.in_(vehicles))).all())
+    return {tuple(key) for key in keys}
+
+
+def _delete_keys(connection, keys):
+    if not keys:
+        return
+    table = RoutePayload.__table__
+    connection.execute(table.delete().where(tuple_(table.c.vehicle_id, table.c.dispatch_date).in_(list(keys))))
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_pending(session, flush_context):
+    pending = session.info.pop(_DIRTY_KEY, None)
+    if not pending:
+        return
+    connection = session.connection()
+    keys = set(pending['keys'])
+    if pending['students'] or pending['users'] or pending['vehicles']:
+        keys |= _affected_keys(connection, pending['students'], pending['users'], pending['vehicles'])
+    _mark_stale(session, connection, keys)
+
+
+def _mark_stale(session, connection, keys):
+    _delete_keys(connection, keys)
+    session.info.setdefault(_REBUILD_KEY, set()).update(keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _schedule_rebuild(session):
+    for key in session.info.pop(_REBUILD_KEY, ()):
+        _rebuild_queue.put(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_REBUILD_KEY, None)
+
+
+def invalidate(session, keys):
+    """일괄 작업용: [(차량ID, 날짜)] 경로를 지우고 커밋 후 재생성 예약"""
+    _mark_stale(session, session.connection(), {tuple(key) for key in keys})
+
+
+def invalidate_students(session, student_ids):
+    """일괄 작업용: 학생 정보가 바뀐 경로(오늘 이후)를 지우고 커밋 후 재생성 예약"""
+    connection = session.connection()
+    _mark_stale(session, connection, _affected_keys(connection, students=set(student_ids)))
+
+
+# ----------------------------------------------------
+# 백그라운드 재생성
+# ----------------------------------------------------
+def init_app(app):
+    global _history_size
+    _history_size = app.config.get('ROUTE_PAYLOAD_HISTORY', _history_size)
+
+
+def start_builder(app):
+    """커밋 후 예약된 (차량, 날짜) 경로를 다시 만드는 데몬 스레드 (과거 날짜는 요청 시 생성)"""
+
+    def run():
+        while True:
+            key = _rebuild_queue.get()
+            keys = {key}
+            # 한 번에 들어온 예약은 모아서 중복 제거
+            while True:
+                try:
+                    keys.add(_rebuild_queue.get_nowait())
+                except queue.Empty:
+                    break
+            with app.app_context():
+                try:
+                    today = date.today()
+                    for vehicle_id, dispatch_date in sorted(keys):
+                        if dispatch_date >= today:
+                            rebuild(vehicle_id, dispatch_date)
+                    log.debug('route_payloads.rebuilt', count=len(keys))
+                except Exception as e:
+                    db.session.rollback()
+                    log.exception('route_payloads.rebuild_failed', '경로 데이터 재생성 실패: %s', e)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='route-payload-builder', daemon=True)
+    thread.start()
+    return thread
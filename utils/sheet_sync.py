@@ -0,0 +1,341 @@
+# utils/sheet_sync.py
+# 설명: 구글 시트 쓰기(회원/기사/경로 시트)를 요청과 분리해 묶음으로 보내는 대기열입니다.
+#       - 쓰는 쪽은 enqueue_rows()/enqueue_update() 로 sheet_sync_outbox 에 INSERT 만 합니다 (시트 API 호출 없음).
+#       - 워커는 notifications 와 같이 DB 테이블을 큐로 사용: 조건부 UPDATE 로 묶음을 선점하고,
+#         (스프레드시트, 워크시트)별로 행 추가는 append_rows 한 번, 범위 수정은 batch_update 한 번으로 보냅니다.
+#         → 하루 경로 수백 행도 API 호출 몇 번.
+#       - 스프레드시트/워크시트는 워커가 열어 둔 것을 재사용합니다 (매번 open_by_url 하지 않음).
+#       - 실패하면 지수 백오프로 재시도, 할당량 초과(429) 등 일시 오류면 SHEETS_QUOTA_COOLDOWN 동안 전체 호출을 쉽니다.
+#         시트 쓰기는 "적어도 한 번" — 호출은 성공했는데 결과 기록 전에 워커가 멈추면 같은 행이 다시 나갈 수 있습니다.
+#       - 클라이언트는 SHEETS_CLIENT 로 교체: 'gspread'(실제 API), 'fake'(메모리, 개발/테스트), 'module:callable'.
+
+import importlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+
+from database import db
+from models import SheetSyncOutbox
+from utils import applog
+
+log = applog.get_logger('sheet_sync')
+
+RETRY_STATUSES = (429, 500, 502, 503)  # 잠시 후 다시 하면 되는 오류 (할당량 초과 / 일시 장애)
+MAX_BACKOFF = 3600  # 재시도 간격 상한 (초)
+
+
+# ----------------------------------------------------
+# 대기열에 넣기 (요청 스레드, 커밋은 호출하는 쪽에서)
+# ----------------------------------------------------
+def enqueue_rows(session, spreadsheet, worksheet, rows, dedup_keys=None):
+    """행 목록 추가 예약 → 새로 쌓인 행 수 (dedup_keys 를 주면 이미 예약된 키의 행은 건너뜀)"""
+    if not rows:
+        return 0
+    keys = dedup_keys or [None] * len(rows)
+    now = datetime.utcnow()
+    return _insert(session, [
+        {'spreadsheet': spreadsheet, 'worksheet': worksheet, 'op': 'append',
+         'payload': json.dumps(list(row), ensure_ascii=False, default=str), 'dedup_key': key,
+         'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+        for row, key in zip(rows, keys)
+    ])
+
+
+def enqueue_update(session, spreadsheet, worksheet, cell_range, values, dedup_key=None):
+    """범위 수정 예약 (cell_range 는 A1 표기, values 는 2차원 목록)"""
+    now = datetime.utcnow()
+    return _insert(session, [{
+        'spreadsheet': spreadsheet, 'worksheet': worksheet, 'op': 'update',
+        'payload': json.dumps({'range': cell_range, 'values': values}, ensure_ascii=False, default=str),
+        'dedup_key': dedup_key, 'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now
+    }])
+
+
+def _insert(session, rows):
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+        stmt = dialect_insert(SheetSyncOutbox.__table__).on_conflict_do_nothing(index_elements=['dedup_key'])
+        result = session.execute(stmt, rows)
+        return result.rowcount if result.rowcount >= 0 else len(rows)
+    # 그 외 DB: 이미 있는 키를 먼저 걸러냄
+    keys = [row['dedup_key'] for row in rows if row['dedup_key']]
+    existing = set()
+    if keys:
+        existing = {k for (k,) in session.query(SheetSyncOutbox.dedup_key).filter(SheetSyncOutbox.dedup_key.in_(keys))}
+    rows = [row for row in rows if row['dedup_key'] not in existing]
+    if rows:
+        session.execute(insert(SheetSyncOutbox.__table__), rows)
+    return len(rows)
+
+
+# ----------------------------------------------------
+# 시트 클라이언트 — worksheet(스프레드시트, 이름) 이 append_rows / batch_update 를 가진 객체를 돌려주면 됨
+# (forget(스프레드시트, 이름) 은 선택: 오류 난 워크시트 캐시 비우기)
+# ----------------------------------------------------
+class GspreadClient:
+    """gspread 클라이언트 (인증은 처음 만들 때 한 번, 열어 본 워크시트는 재사용)"""
+
+    SCOPE = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive.file",
+        "https://www.googleapis.com/auth/drive"
+    ]
+
+    def __init__(self, credentials_path):
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_path, self.SCOPE)
+        self._client = gspread.authorize(creds)
+        self._worksheets = {}
+
+    def worksheet(self, spreadsheet, name):
+        key = (spreadsheet, name)
+        if key not in self._worksheets:
+            if spreadsheet.startswith('http'):
+                book = self._client.open_by_url(spreadsheet)
+            else:
+                book = self._client.open_by_key(spreadsheet)
+            self._worksheets[key] = book.worksheet(name) if name else book.sheet1
+        return self._worksheets[key]
+
+    def forget(self, spreadsheet, name):
+        """오류가 난 워크시트는 다음에 다시 열기 (삭제/이름 변경 대비)"""
+        self._worksheets.pop((spreadsheet, name), None)
+
+
+class FakeApiError(Exception):
+    """FakeSheetsClient 가 흉내 내는 API 오류 (status_code 429 = 할당량 초과)"""
+
+    def __init__(self, status_code=429, message='Quota exceeded'):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class FakeWorksheet:
+    def __init__(self, client, key):
+        self._client = client
+        self._key = key
+
+    @property
+    def rows(self):
+        return self._client.sheets[self._key]
+
+    def append_rows(self, values, value_input_option=None):
+        self._client.record('append_rows', self._key, len(values))
+        self.rows.extend([list(row) for row in values])
+
+    def batch_update(self, data, value_input_option=None):
+        self._client.record('batch_update', self._key, len(data))
+        for item in data:
+            row0, col0 = a1_start(item['range'])
+            for r, values in enumerate(item['values']):
+                while len(self.rows) <= row0 + r:
+                    self.rows.append([])
+                line = self.rows[row0 + r]
+                for c, value in enumerate(values):
+                    while len(line) <= col0 + c:
+                        line.append('')
+                    line[col0 + c] = value
+
+
+class FakeSheetsClient:
+    """개발/테스트용: 메모리 시트 + API 호출 기록 (calls), fail_next 에 예외를 넣으면 다음 호출에서 발생"""
+
+    def __init__(self, config=None):
+        self.sheets = defaultdict(list)  # (스프레드시트, 워크시트) → 행 목록
+        self.calls = []
+        self.fail_next = []
+        self._lock = threading.Lock()
+
+    def worksheet(self, spreadsheet, name):
+        return FakeWorksheet(self, (spreadsheet, name or 'sheet1'))
+
+    def forget(self, spreadsheet, name):
+        pass
+
+    def record(self, method, key, count):
+        with self._lock:
+            if self.fail_next:
+                raise self.fail_next.pop(0)
+            self.calls.append((method, key, count))
+        log.info('sheet_sync.fake_call', '[시트] %s %s/%s (%d건)', method, key[0], key[1], count)
+
+
+def a1_start(cell_range):
+    """'시트!B3:D4' → 시작 칸 (행, 열) 0부터"""
+    match = re.match(r"([A-Z]+)(\d+)", cell_range.split('!')[-1].upper())
+    if not match:
+        raise ValueError(f"범위 형식 오류: {cell_range}")
+    col = 0
+    for ch in match.group(1):
+        col = col * 26 + ord(ch) - ord('A') + 1
+    return int(match.group(2)) - 1, col - 1
+
+
+def get_client(config):
+    """SHEETS_CLIENT 설정으로 클라이언트 생성 ('module:callable' 은 config 를 받아 클라이언트 반환)"""
+    name = config.get('SHEETS_CLIENT', 'gspread')
+    if name == 'gspread':
+        return GspreadClient(config['GOOGLE_CREDENTIALS_PATH'])
+    if name == 'fake':
+        return FakeSheetsClient(config)
+    module_name, _, attr = name.partition(':')
+    if not attr:
+        raise ValueError(f"알 수 없는 시트 클라이언트 설정입니다: {name}")
+    return getattr(importlib.import_module(module_name), attr)(config)
+
+
+def is_retryable(error):
+    """할당량 초과 / 일시 장애 여부 (gspread APIError 는 response.status_code)"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None) or getattr(error, 'status_code', None)
+    return status in RETRY_STATUSES
+
+
+# ----------------------------------------------------
+# 워커
+# ----------------------------------------------------
+def requeue_stale(stale_seconds):
+    """보내는 중에 멈춘(워커 중단) 행을 다시 대기로"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    count = SheetSyncOutbox.query.filter(
+        SheetSyncOutbox.status == 'sending', SheetSyncOutbox.claimed_at < cutoff
+    ).update({'status': 'pending', 'claim_token': None}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        log.warning('sheet_sync.requeued', '시트 전송 중단 %d건 재시도', count)
+    return count
+
+
+def claim_batch(limit):
+    """보낼 차례인 행을 최대 limit 건 선점 (다른 워커가 먼저 가져간 행은 제외)"""
+    now = datetime.utcnow()
+    ids = [i for (i,) in db.session.query(SheetSyncOutbox.id).filter(
+        SheetSyncOutbox.status == 'pending', SheetSyncOutbox.next_attempt_at <= now
+    ).order_by(SheetSyncOutbox.id).limit(limit)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    SheetSyncOutbox.query.filter(
+        SheetSyncOutbox.id.in_(ids), SheetSyncOutbox.status == 'pending'
+    ).update({'status': 'sending', 'claim_token': token, 'claimed_at': now}, synchronize_session=False)
+    db.session.commit()
+    return SheetSyncOutbox.query.filter_by(claim_token=token, status='sending') \
+        .order_by(SheetSyncOutbox.id).all()
+
+
+def deliver(rows, client, max_attempts=8, quota_cooldown=60):
+    """선점한 행을 (스프레드시트, 워크시트, 종류)별 API 호출 한 번씩으로 전송 → (보낸 행 수, 쉬어야 할 초)
+
+    할당량 초과 등 일시 오류가 나면 남은 묶음은 호출하지 않고 quota_cooldown 뒤로 미룹니다.
+    """
+    now = datetime.utcnow()
+    groups = OrderedDict()
+    for row in rows:
+        groups.setdefault((row.spreadsheet, row.worksheet, row.op), []).append(row)
+
+    updates = []
+    sent = 0
+    cooldown = 0
+    for (spreadsheet, worksheet, op), items in groups.items():
+        if cooldown:
+            # 할당량을 기다리는 동안은 시도 횟수를 늘리지 않고 돌려놓음
+            updates.extend({'id': item.id, 'status': 'pending', 'claim_token': None,
+                            'next_attempt_at': now + timedelta(seconds=cooldown)} for item in items)
+            continue
+        try:
+            target = client.worksheet(spreadsheet, worksheet)
+            payloads = [json.loads(item.payload) for item in items]
+            if op == 'append':
+                target.append_rows(payloads, value_input_option='USER_ENTERED')
+            else:
+                target.batch_update(payloads, value_input_option='USER_ENTERED')
+        except Exception as e:
+            retryable = is_retryable(e)
+            if retryable:
+                cooldown = quota_cooldown
+            elif hasattr(client, 'forget'):
+                client.forget(spreadsheet, worksheet)
+            for item in items:
+                attempts = item.attempts + 1
+                # 재시도 간격: 30초, 1분, 2분, ... (최대 1시간), 할당량 초과면 최소 cooldown
+                delay = max(min(30 * 2 ** (attempts - 1), MAX_BACKOFF), cooldown)
+                updates.append({
+                    'id': item.id, 'attempts': attempts, 'last_error': str(e)[:500], 'claim_token': None,
+                    'status': 'failed' if attempts >= max_attempts else 'pending',
+                    'next_attempt_at': now + timedelta(seconds=delay)
+                })
+            log.warning('sheet_sync.send_failed', '시트 전송 실패 (%s, %d행): %s', op, len(items), e,
+                        worksheet=worksheet, retryable=retryable)
+            continue
+        updates.extend({'id': item.id, 'status': 'sent', 'sent_at': now, 'attempts': item.attempts + 1,
+                        'claim_token': None} for item in items)
+        sent += len(items)
+
+    # executemany 는 같은 컬럼 조합끼리 묶어서 실행
+    by_columns = defaultdict(list)
+    for params in updates:
+        by_columns[tuple(sorted(params))].append(params)
+    for params in by_columns.values():
+        db.session.execute(update(SheetSyncOutbox), params)
+    db.session.commit()
+    log.debug('sheet_sync.delivered', rows=len(rows), sent=sent, calls=len(groups), cooldown=cooldown)
+    return sent, cooldown
+
+
+def worker_loop(app, stop_event=None, client=None):
+    """대기 행을 묶음으로 계속 전송 (별도 프로세스 또는 데몬 스레드에서 실행)"""
+    poll_interval = app.config.get('SHEETS_POLL_INTERVAL', 5)
+    batch_size = app.config.get('SHEETS_BATCH_SIZE', 1000)
+    max_attempts = app.config.get('SHEETS_MAX_ATTEMPTS', 8)
+    stale_seconds = app.config.get('SHEETS_STALE_SECONDS', 300)
+    quota_cooldown = app.config.get('SHEETS_QUOTA_COOLDOWN', 60)
+
+    while not (stop_event and stop_event.is_set()):
+        if client is None:
+            # 인증 실패 / 패키지 없음: 행은 대기로 두고 잠시 뒤 다시 시도
+            try:
+                client = get_client(app.config)
+            except Exception as e:
+                log.warning('sheet_sync.client_unavailable', '시트 클라이언트를 만들 수 없습니다: %s', e)
+                time.sleep(max(poll_interval, quota_cooldown))
+                continue
+        rows = []
+        wait = poll_interval
+        with app.app_context():
+            try:
+                requeue_stale(stale_seconds)
+                rows = claim_batch(batch_size)
+                if rows:
+                    _, cooldown = deliver(rows, client, max_attempts, quota_cooldown)
+                    wait = max(cooldown, 0 if len(rows) >= batch_size else poll_interval)
+            except Exception as e:
+                db.session.rollback()
+                log.exception('sheet_sync.worker_error', '시트 워커 오류: %s', e)
+            finally:
+                db.session.remove()
+        # 가득 찬 묶음이면 바로 다음 묶음
+        if wait:
+            time.sleep(wait)
+
+
+def start_embedded_worker(app):
+    """웹 프로세스 안에서 시트 워커를 데몬 스레드로 실행 (SHEETS_WORKER_EMBEDDED=False 면 비활성)"""
+    if not app.config.get('SHEETS_WORKER_EMBEDDED'):
+        return None
+    credentials = app.config.get('GOOGLE_CREDENTIALS_PATH')
+    if app.config.get('SHEETS_CLIENT', 'gspread') == 'gspread' and not os.path.exists(credentials):
+        # 인증 파일 없이 켜 두면 주기마다 클라이언트 생성 실패 경고만 남으므로 한 번 알리고 시작하지 않음
+        log.warning('sheet_sync.worker_disabled', '인증 파일이 없어 시트 워커를 시작하지 않습니다: %s', credentials)
+        return None
+    thread = threading.Thread(target=worker_loop, args=(app,), name='sheet-sync-worker', daemon=True)
+    thread.start()
+    return thread
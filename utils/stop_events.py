@@ -0,0 +1,251 @@
+# utils/stop_events.py
+# 설명: 기사 앱의 정류장 이벤트(픽업 / 미탑승 / 하차)를 메모리에 모았다가 DispatchResult 에 일괄 반영합니다.
+#       - 요청은 검증(내 차량 배차인지) 후 버퍼에 넣고 바로 202 응답 — 탭마다 UPDATE/커밋하지 않습니다.
+#       - 이벤트마다 기사 앱이 만든 idempotency_key 가 있어, 네트워크 재시도로 같은 이벤트가 여러 번 와도 한 번만 반영합니다
+#         (버퍼/최근 반영 키는 메모리에서, 재시작·다른 프로세스는 dispatch_stop_events 의 유니크 키로 걸러냄).
+#       - 응답의 pending 은 아직 메모리 버퍼에만 있는 키, confirmed 는 DB 에 저장된 키입니다.
+#         기사 앱은 confirmed 로 돌아올 때까지 이벤트를 보관함에 두고 다시 보내므로, 플러시 전에 서버가 내려가도 잃지 않습니다.
+#       - 플러시 스레드가 STOP_EVENT_FLUSH_INTERVAL 마다(또는 STOP_EVENT_FLUSH_ROWS 이상이면 즉시)
+#         이벤트 INSERT 한 번 + DispatchResult 기본키 UPDATE 한 번(executemany) + 커밋 한 번으로 저장합니다.
+#       - 일괄 UPDATE 는 ORM 이벤트가 없으므로 기사 경로 JSON 무효화와 배차 변경 알림('statuses')을 직접 처리합니다.
+#       - 반영된 픽업/하차는 같은 트랜잭션에서 보호자 알림 대기열(utils/notifications.py)에 쌓입니다.
+
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from database import db
+from models import DispatchResult, DispatchStopEvent
+from utils import applog, dispatch_events, notifications, route_payloads
+
+log = applog.get_logger('stop_events')
+
+EVENT_TYPES = ('picked_up', 'no_show', 'dropped_off')
+MAX_KEY_LENGTH = 64
+RECENT_KEYS = 10000  # 반영 완료 키를 메모리에 기억할 개수
+NOTIFY_KINDS = {'picked_up': 'picked_up', 'dropped_off': 'arrived'}  # 이벤트 → 보호자 알림 종류
+
+
+def parse_event(raw):
+    """{'key', 'dispatch_id', 'type', 'ts'} → 이벤트 dict, 잘못된 값은 ValueError
+
+    ts 는 기기에서 누른 시각 (epoch 밀리초), 서버 현지 시각으로 변환해 pickup_time/arrival_time 에 씁니다.
+    """
+    key = raw.get('key')
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError('이벤트 키(key) 형식 오류')
+    event_type = raw.get('type')
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"알 수 없는 이벤트 종류: {event_type}")
+    dispatch_id = raw.get('dispatch_id')
+    if isinstance(dispatch_id, bool) or not isinstance(dispatch_id, int):
+        raise ValueError('배차 ID(dispatch_id) 형식 오류')
+    ts = raw.get('ts')
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)):
+        raise ValueError('발생 시각(ts) 형식 오류')
+    return {
+        'idempotency_key': key, 'dispatch_id': dispatch_id, 'event_type': event_type,
+        'occurred_at': datetime.fromtimestamp(ts / 1000)
+    }
+
+
+def apply_event(state, evt):
+    """배차 한 건의 상태 dict 에 이벤트 하나를 적용 (적용했으면 True)"""
+    at = evt['occurred_at']
+    if evt['event_type'] == 'picked_up':
+        if state['status'] == 'completed':
+            return False
+        state['pickup_time'] = at.time().replace(microsecond=0)
+        state['status'] = 'in_progress'
+    elif evt['event_type'] == 'no_show':
+        if state['status'] == 'completed' or state['pickup_time'] is not None:
+            return False
+        state['status'] = 'cancelled'
+        note = f"미탑승 ({at.strftime('%H:%M')})"
+        state['notes'] = f"{state['notes']}\n{note}" if state['notes'] else note
+    elif evt['event_type'] == 'dropped_off':
+        if state['status'] == 'cancelled':
+            return False
+        state['arrival_time'] = at.time().replace(microsecond=0)
+        state['status'] = 'completed'
+    return True
+
+
+class StopEventBuffer:
+    """프로세스 내 정류장 이벤트 버퍼 (idempotency_key → 이벤트)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = OrderedDict()
+        self._recent = OrderedDict()
+        self.flush_rows = 500
+        self.buffer_max = 50000
+        self.max_batch = 100
+        self.wakeup = threading.Event()
+
+    def configure(self, config):
+        self.flush_rows = config.get('STOP_EVENT_FLUSH_ROWS', self.flush_rows)
+        self.buffer_max = config.get('STOP_EVENT_BUFFER_MAX', self.buffer_max)
+        self.max_batch = config.get('STOP_EVENT_MAX_BATCH', self.max_batch)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def add(self, vehicle_id, raw_events):
+        """한 차량의 이벤트 묶음 접수 → (저장 대기 키, 저장 완료 키, [{'key', 'error'}]) — 배차 소유 확인은 IN 쿼리 한 번
+
+        버퍼가 가득 차 받지 못한 이벤트도 저장 대기로 돌려줘 기사 앱이 다시 보내게 합니다.
+        """
+        if len(raw_events) > self.max_batch:
+            raise ValueError(f"한 번에 최대 {self.max_batch}개까지 보낼 수 있습니다.")
+
+        parsed, rejected = [], []
+        for raw in raw_events:
+            try:
+                parsed.append(parse_event(raw))
+            except (AttributeError, TypeError, ValueError, OverflowError, OSError) as e:
+                key = raw.get('key') if isinstance(raw, dict) else None
+                rejected.append({'key': key, 'error': str(e)})
+
+        dispatch_ids = {evt['dispatch_id'] for evt in parsed}
+        owned = set()
+        if dispatch_ids:
+            owned = {d for (d,) in db.session.query(DispatchResult.id).filter(
+                DispatchResult.id.in_(dispatch_ids), DispatchResult.vehicle_id == vehicle_id)}
+
+        for evt in parsed:
+            if evt['dispatch_id'] not in owned:
+                rejected.append({'key': evt['idempotency_key'], 'error': '이 차량의 배차가 아닙니다.'})
+        pending, confirmed, full = self.add_parsed(vehicle_id, [evt for evt in parsed if evt['dispatch_id'] in owned])
+        return pending + full, confirmed, rejected
+
+    def add_parsed(self, vehicle_id, events):
+        """검증이 끝난 이벤트 dict 목록 접수 (서버 내부용: 지오펜스 등) → (버퍼에 있는 키, 저장 완료 키, 버퍼가 차서 못 받은 키)"""
+        pending, confirmed, full = [], [], []
+        with self._lock:
+            for evt in events:
+                key = evt['idempotency_key']
+                if key in self._recent:
+                    confirmed.append(key)
+                elif key in self._events:
+                    pending.append(key)
+                elif len(self._events) >= self.buffer_max:
+                    full.append(key)
+                else:
+                    self._events[key] = dict(evt, vehicle_id=vehicle_id, received_at=datetime.utcnow())
+                    pending.append(key)
+            should_flush = len(self._events) >= self.flush_rows
+
+        if should_flush:
+            self.wakeup.set()
+        return pending, confirmed, full
+
+    def _remember(self, keys):
+        with self._lock:
+            for key in keys:
+                self._recent[key] = True
+            while len(self._recent) > RECENT_KEYS:
+                self._recent.popitem(last=False)
+
+    def flush(self):
+        """버퍼 전체를 한 트랜잭션으로 반영 (앱 컨텍스트 안에서 호출), 반영한 이벤트 수 반환"""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events.values())
+            if not events:
+                return 0
+            try:
+                applied = self._apply(events)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                log.exception('stop_events.flush_failed', '이벤트 %d개 반영 실패 (다음 주기에 재시도): %s', len(events), e)
+                return 0
+            keys = [evt['idempotency_key'] for evt in events]
+            with self._lock:
+                for key in keys:
+                    self._events.pop(key, None)
+            self._remember(keys)
+            log.debug('stop_events.flushed', events=len(events), applied=applied)
+            return applied
+
+    def _apply(self, events):
+        # 다른 프로세스/재시작 전에 이미 저장된 키는 제외
+        keys = [evt['idempotency_key'] for evt in events]
+        stored = {k for (k,) in db.session.query(DispatchStopEvent.idempotency_key)
+                  .filter(DispatchStopEvent.idempotency_key.in_(keys))}
+        events = sorted((evt for evt in events if evt['idempotency_key'] not in stored),
+                        key=lambda evt: evt['occurred_at'])
+        if not events:
+            return 0
+
+        rows = db.session.query(
+            DispatchResult.id, DispatchResult.vehicle_id, DispatchResult.dispatch_date,
+            DispatchResult.status, DispatchResult.pickup_time, DispatchResult.arrival_time, DispatchResult.notes
+        ).filter(DispatchResult.id.in_({evt['dispatch_id'] for evt in events})).all()
+        states = {
+            row.id: {'id': row.id, 'status': row.status, 'pickup_time': row.pickup_time,
+                     'arrival_time': row.arrival_time, 'notes': row.notes}
+            for row in rows
+        }
+        originals = {dispatch_id: dict(state) for dispatch_id, state in states.items()}
+        routes = {row.id: (row.vehicle_id, row.dispatch_date) for row in rows}
+
+        # 배차가 이미 삭제된 이벤트는 기록하지 않음
+        events = [evt for evt in events if evt['dispatch_id'] in states]
+        notify = {'picked_up': {}, 'arrived': {}}
+        for evt in events:
+            if apply_event(states[evt['dispatch_id']], evt) and evt['event_type'] in NOTIFY_KINDS:
+                notify[NOTIFY_KINDS[evt['event_type']]][evt['dispatch_id']] = evt['occurred_at']
+        changed = [state for dispatch_id, state in states.items() if state != originals[dispatch_id]]
+
+        if events:
+            db.session.execute(insert(DispatchStopEvent), [
+                {k: evt[k] for k in ('idempotency_key', 'dispatch_id', 'vehicle_id', 'event_type',
+                                     'occurred_at', 'received_at')}
+                for evt in events
+            ])
+        if changed:
+            db.session.execute(update(DispatchResult), changed)
+            route_payloads.invalidate(db.session, {routes[state['id']] for state in changed})
+            dispatch_events.queue_status_changes(db.session, [(routes[state['id']], state) for state in changed])
+        # 보호자 알림은 대기열 INSERT 만 (발송은 utils/notifications.py 워커)
+        for kind, times in notify.items():
+            notifications.enqueue(db.session, kind, times, at=times)
+        return len(events)
+
+
+buffer = StopEventBuffer()
+
+
+def init_app(app):
+    buffer.configure(app.config)
+
+
+def start_flusher(app):
+    """STOP_EVENT_FLUSH_INTERVAL 마다(또는 버퍼가 차면 즉시) 반영하는 데몬 스레드, 종료 시 남은 이벤트 반영"""
+    interval = app.config.get('STOP_EVENT_FLUSH_INTERVAL', 1)
+
+    def flush_now():
+        with app.app_context():
+            try:
+                buffer.flush()
+            finally:
+                db.session.remove()
+
+    def run():
+        while True:
+            buffer.wakeup.wait(interval)
+            buffer.wakeup.clear()
+            flush_now()
+
+    atexit.register(flush_now)
+    thread = threading.Thread(target=run, name='stop-event-flusher', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,159 @@
+# utils/template_cache.py
+# 설명: 회원명부 업로드 양식(xlsx)과 드롭다운 목록을 (지점, 클래스/시간대 목록 버전) 단위로 캐시합니다.
+#       - Class/TimeSlot 의 insert/update/delete 이벤트에서 바뀐 지점을 모아 flush 직후
+#         catalog_versions 의 해당 지점과 전체(0) 버전을 1씩 올립니다 (같은 트랜잭션, 롤백 시 함께 취소).
+#       - 요청마다 버전 한 줄만 조회하고, 같은 버전이면 저장해 둔 바이트를 그대로 돌려줍니다.
+#         버전은 DB 에 있으므로 웹 프로세스가 여러 개여도 변경 즉시 모든 프로세스의 캐시가 무효화됩니다.
+#       - Query.delete() 로 시간대를 지우는 곳은 같은 flush 에서 Class 도 삭제하므로 별도 처리가 필요 없습니다.
+
+import importlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from database import db
+from models import CatalogVersion, Class, TimeSlot
+from utils import applog
+
+log = applog.get_logger('template_cache')
+
+ALL_BRANCHES = 0
+_DIRTY_KEY = '_catalog_dirty_branches'
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_max_size = 64
+
+
+def init_app(app):
+    """TEMPLATE_CACHE_SIZE 설정 반영"""
+    global _max_size
+    _max_size = app.config.get('TEMPLATE_CACHE_SIZE', _max_size)
+
+
+# ----------------------------------------------------
+# 이벤트 → 바뀐 지점 기록
+# ----------------------------------------------------
+def _mark(target, *branch_ids):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    dirty = session.info.setdefault(_DIRTY_KEY, set())
+    dirty.update(b for b in branch_ids if b is not None)
+
+
+def _old_and_new(target, name):
+    history = inspect(target).attrs[name].history
+    old = history.deleted[0] if history.deleted else getattr(target, name)
+    return old, getattr(target, name)
+
+
+def _class_branch(connection, class_id):
+    if class_id is None:
+        return None
+    table = Class.__table__
+    return connection.execute(select(table.c.branch_id).where(table.c.id == class_id)).scalar()
+
+
+@event.listens_for(Class, 'after_insert')
+@event.listens_for(Class, 'after_delete')
+def _class_changed(mapper, connection, target):
+    _mark(target, *_old_and_new(target, 'branch_id'))
+
+
+@event.listens_for(Class, 'after_update')
+def _class_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('name', 'branch_id')):
+        _mark(target, *_old_and_new(target, 'branch_id'))
+
+
+@event.listens_for(TimeSlot, 'after_insert')
+@event.listens_for(TimeSlot, 'after_delete')
+def _slot_changed(mapper, connection, target):
+    # 시간대는 클래스를 통해 지점이 결정됨 (삭제 시에도 클래스 행보다 먼저 처리되므로 조회 가능)
+    _mark(target, _class_branch(connection, target.class_id))
+
+
+@event.listens_for(TimeSlot, 'after_update')
+def _slot_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('time', 'class_id')):
+        old_class, new_class = _old_and_new(target, 'class_id')
+        _mark(target, _class_branch(connection, old_class), _class_branch(connection, new_class))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_pending(session, flush_context):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        bump(session.connection(), dirty)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def bump(connection, branch_ids):
+    """지점과 전체(0)의 목록 버전을 1 올림 (행이 없으면 생성)"""
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    dialect = connection.dialect.name
+    for branch_id in sorted(set(branch_ids) | {ALL_BRANCHES}):
+        if dialect in ('sqlite', 'postgresql'):
+            # 첫 수정이 동시에 들어와도 기본키 충돌 없이 한 문장으로 생성/증가
+            dialect_insert = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+            stmt = dialect_insert(table).values(branch_id=branch_id, version=1, updated_at=now)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['branch_id'],
+                set_={'version': table.c.version + 1, 'updated_at': now}
+            ))
+            continue
+        updated = connection.execute(
+            table.update().where(table.c.branch_id == branch_id)
+            .values(version=table.c.version + 1, updated_at=now)
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(branch_id=branch_id, version=1, updated_at=now))
+    log.debug('template_cache.invalidated', branches=sorted(branch_ids))
+
+
+# ----------------------------------------------------
+# 조회
+# ----------------------------------------------------
+def current_version(branch_id=None):
+    """지점(None 이면 전체)의 현재 목록 버전"""
+    version = db.session.query(CatalogVersion.version).filter_by(
+        branch_id=branch_id or ALL_BRANCHES
+    ).scalar()
+    return version or 0
+
+
+def get_or_build(kind, branch_id, build, extra=()):
+    """(종류, 지점, 목록 버전, extra) 가 같으면 캐시된 값을, 아니면 build() 결과를 저장 후 반환
+
+    extra 에는 지점명처럼 결과에 들어가지만 목록 버전에 포함되지 않는 값을 넣습니다.
+    """
+    key = (kind, branch_id or ALL_BRANCHES, current_version(branch_id), extra)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    value = build()
+    with _lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > _max_size:
+            _cache.popitem(last=False)
+    log.debug('template_cache.built', kind=kind, branch_id=key[1], version=key[2])
+    return value
+
+
+def clear():
+    with _lock:
+        _cache.clear()